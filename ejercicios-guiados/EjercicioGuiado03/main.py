@@ -1,5 +1,6 @@
 from flask import Flask, request, Response
 import MySQLdb
+import os
 import xml.etree.ElementTree as ET
 
 app = Flask(__name__)
@@ -124,5 +125,5 @@ def get_books_by_author(author_id):
 # MAIN
 # ------------------------------
 if __name__ == "__main__":
-    app.run(debug=True, port=5000)
+    app.run(debug=os.getenv("FLASK_DEBUG") == "1", port=5000)
 
@@ -0,0 +1,105 @@
+# -------------------------------------------------------
+# CLIENTE HTTP DEL GATEWAY HACIA LIBROS
+# Una sola requests.Session por proceso, compartida por todos los hilos:
+# las conexiones TCP a LIBROS_HOST se reutilizan (keep-alive) en lugar de
+# abrir una nueva por petición. El pool tiene tantas conexiones como
+# hilos atienden peticiones; si se llena, se cuenta como saturación.
+# -------------------------------------------------------
+import os
+import threading
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class LibrosClient:
+
+    def __init__(self, base_url, pool_size=None, connect_timeout=2, read_timeout=5):
+        """pool_size: por defecto LIBROS_POOL_SIZE o DB_POOL_SIZE (= hilos de gunicorn)."""
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size or int(os.getenv("LIBROS_POOL_SIZE",
+                                                    os.getenv("DB_POOL_SIZE", 10)))
+        self.timeout = (connect_timeout, read_timeout)
+
+        # Sin reintentos ni cookies: la sesión no guarda estado mutable
+        # entre hilos, sólo el pool de urllib3 (que sí es thread-safe)
+        self.session = requests.Session()
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.saturated = 0
+
+    def get(self, path, **kwargs):
+        """GET a Libros; lanza las excepciones de requests igual que requests.get.
+
+        Con stream=True la conexión sigue ocupada hasta que se lee el cuerpo:
+        cuenta como en curso hasta que el llamador cierra la respuesta.
+        """
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            # Más peticiones simultáneas que conexiones: urllib3 abre una
+            # conexión extra que se descarta al terminar (sin keep-alive)
+            if self.in_flight > self.pool_size:
+                self.saturated += 1
+        resp = None
+        try:
+            kwargs.setdefault("timeout", self.timeout)
+            resp = self.session.get(f"{self.base_url}{path}", **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            if resp is None or not kwargs.get("stream"):
+                self._release()
+        if kwargs.get("stream"):
+            self._release_on_close(resp)
+        return resp
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _release_on_close(self, resp):
+        # close() puede llamarse varias veces (with + finally): se descuenta una
+        close = resp.close
+        released = threading.Event()
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                with self._lock:
+                    first = not released.is_set()
+                    released.set()
+                if first:
+                    self._release()
+
+        resp.close = close_and_release
+
+    def stats(self):
+        # num_connections cuenta las conexiones TCP abiertas desde el inicio:
+        # con keep-alive crece mucho más despacio que el número de peticiones
+        pool = self.adapter.poolmanager.connection_from_url(self.base_url)
+        return {
+            "pool_size": self.pool_size,
+            "requests": self.calls,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "saturated": self.saturated,
+            "connections_opened": pool.num_connections
+        }
+
+    def close(self):
+        self.session.close()
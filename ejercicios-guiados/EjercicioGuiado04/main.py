@@ -1,5 +1,6 @@
 from flask import Flask, Response, request
 import MySQLdb
+import os
 import xml.etree.ElementTree as ET
 
 app = Flask(__name__)
@@ -61,4 +62,4 @@ def get_books():
     return xml_response(root)
 
 if __name__ == "__main__":
-    app.run(debug=True, port=5001)
+    app.run(debug=os.getenv("FLASK_DEBUG") == "1", port=5001)
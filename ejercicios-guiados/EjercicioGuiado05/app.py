@@ -9,6 +9,7 @@ from datetime import datetime, timedelta
 
 from flask_cors import CORS
 
+import os
 import requests
 import xml.etree.ElementTree as ET
 from flask import Response
@@ -164,5 +165,5 @@ def log_request():
     print(f"[{datetime.utcnow()}] {request.method} {request.path}")
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=5000, debug=os.getenv("FLASK_DEBUG") == "1")
 
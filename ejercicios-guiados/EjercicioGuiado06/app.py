@@ -9,11 +9,18 @@ from datetime import datetime, timedelta
 
 from flask_cors import CORS
 
+import json
+import os
 import requests
 import xml.etree.ElementTree as ET
-from flask import Response
+from flask import Response, stream_with_context
+from libros_client import LibrosClient
 
 LIBROS_HOST = "http://34.71.199.168:5001"
+# Sesión compartida con keep-alive hacia Libros (una conexión por hilo)
+libros = LibrosClient(LIBROS_HOST)
+# Tamaño de los trozos en que se lee y parsea el XML de Libros
+LIBROS_STREAM_CHUNK = 64 * 1024
 
 
 app = Flask(__name__)
@@ -117,52 +124,76 @@ def refresh():
     return jsonify(access_token=new_access_token), 200
 
 
+def iter_libros_books(chunks):
+    # Parser incremental: cada <book> se convierte al cerrarse y se quita
+    # del árbol, así nunca está el catálogo completo en memoria
+    parser = ET.XMLPullParser(events=("start", "end"))
+    root = None
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, el in parser.read_events():
+            if event == "start":
+                root = el if root is None else root
+            elif el.tag == "book":
+                yield {
+                    "isbn":   (el.findtext("isbn") or ""),
+                    "title":  (el.findtext("title") or ""),
+                    "author": (el.findtext("author") or ""),
+                    "year":   (el.findtext("year") or ""),
+                    "genre":  (el.findtext("genre") or ""),
+                    "price":  (el.findtext("price") or ""),
+                    "stock":  (el.findtext("stock") or ""),
+                    "format": (el.findtext("format") or "")
+                }
+                root.clear()
+    parser.close()
+
+
 def libros_xml_to_json(xml_bytes):
-    root = ET.fromstring(xml_bytes)
-    out = []
-    for book_el in root.findall("book"):
-        row = {
-            "isbn":   (book_el.findtext("isbn") or ""),
-            "title":  (book_el.findtext("title") or ""),
-            "author": (book_el.findtext("author") or ""),
-            "year":   (book_el.findtext("year") or ""),
-            "genre":  (book_el.findtext("genre") or ""),
-            "price":  (book_el.findtext("price") or ""),
-            "stock":  (book_el.findtext("stock") or ""),
-            "format": (book_el.findtext("format") or "")
-        }
-        out.append(row)
-    return out
+    return list(iter_libros_books([xml_bytes]))
+
+
+def stream_books_json(resp):
+    # Arreglo JSON emitido libro a libro; un error a mitad del XML corta la
+    # respuesta (el estado 200 ya se envió)
+    try:
+        yield "["
+        for i, row in enumerate(iter_libros_books(resp.iter_content(LIBROS_STREAM_CHUNK))):
+            yield ("," if i else "") + json.dumps(row)
+        yield "]"
+    finally:
+        resp.close()
 
 @app.route('/books', methods=['GET'])
 @jwt_required()  # <- protegido con JWT
 def books_proxy():
     # Soporta búsqueda ?q=
     q = request.args.get("q", "").strip()
-    url = f"{LIBROS_HOST}/api/books"
+    path = "/api/books"
     if q:
-        url += f"?q={requests.utils.quote(q)}"  # solo si luego implementas filtro en libros
+        path += f"?q={requests.utils.quote(q)}"  # solo si luego implementas filtro en libros
 
     try:
-        r = requests.get(url, timeout=5)
+        r = libros.get(path, stream=True)
     except Exception as e:
         return jsonify({"error":"no se pudo contactar el microservicio de Libros", "detail": str(e)}), 502
 
     if r.status_code != 200:
+        r.close()
         return jsonify({"error": "Libros devolvió error", "status": r.status_code}), 502
 
-    # Convierte el XML de Libros a JSON para el cliente
-    try:
-        rows = libros_xml_to_json(r.content)
-    except Exception as e:
-        return jsonify({"error":"no se pudo parsear XML de Libros", "detail": str(e)}), 500
+    # Convierte el XML de Libros a JSON mientras llega, sin guardarlo completo
+    return Response(stream_with_context(stream_books_json(r)), mimetype="application/json")
 
-    return jsonify(rows), 200
+@app.route('/libros/pool', methods=['GET'])
+def libros_pool():
+    # Conexiones abiertas vs peticiones y saturación del pool hacia Libros
+    return jsonify(libros.stats()), 200
 
 @app.before_request
 def log_request():
     print(f"[{datetime.utcnow()}] {request.method} {request.path}")
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=5000, debug=os.getenv("FLASK_DEBUG") == "1")
 
@@ -1,8 +1,10 @@
+import os
+import json
 import time
 import logging
 from math import isfinite
 from datetime import datetime, timedelta
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_mysqldb import MySQL
 import redis
 import requests
@@ -10,11 +12,16 @@ import xml.etree.ElementTree as ET
 from flask_cors import CORS
 from passlib.hash import sha256_crypt
 import jwt
+from libros_client import LibrosClient
+from books_cache import BooksCache, normalize_query
+from token_cache import VerifiedTokenCache
 
 # -----------------------
 # CONFIGURACIÓN
 # -----------------------
 LIBROS_HOST = "http://34.71.199.168:5001"
+# Sesión compartida con keep-alive hacia Libros (una conexión por hilo)
+libros = LibrosClient(LIBROS_HOST)
 
 app = Flask(__name__)
 CORS(app)
@@ -30,6 +37,13 @@ mysql = MySQL(app)
 # Config Redis
 r = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
 
+# Caché de /books (JSON ya parseado) por búsqueda normalizada
+# (BOOKS_CACHE_TTL=0 la desactiva: la respuesta se transmite en streaming)
+books_cache = BooksCache(r, ttl=int(os.getenv("BOOKS_CACHE_TTL", 30)))
+
+# Tamaño de los trozos en que se lee y parsea el XML de Libros
+LIBROS_STREAM_CHUNK = 64 * 1024
+
 # Config JWT
 SECRET_KEY = "super_secret_jwt_key"
 ALGORITHM = "HS256"
@@ -66,7 +80,7 @@ def create_token(username, expires_in):
     }
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
-def decode_token(token):
+def verify_token(token):
     try:
         return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except jwt.ExpiredSignatureError:
@@ -74,6 +88,39 @@ def decode_token(token):
     except jwt.InvalidTokenError:
         return None
 
+def token_revoked(digest, payload):
+    """Lista negra compartida por los workers: tokens sueltos y usuarios
+    completos (revoked_sub:<sub> = iat mínimo aceptado)."""
+    try:
+        token_flag, cutoff = r.mget(f"revoked:{digest}", f"revoked_sub:{payload.get('sub')}")
+    except redis.RedisError as e:
+        # Sin Redis no se bloquea el acceso: quedan las revocaciones locales
+        log.warning(f"No se pudo consultar la lista de revocados: {e}")
+        return False
+    return bool(token_flag) or (cutoff is not None and payload.get("iat", 0) < int(cutoff))
+
+# Payload verificado por token hasta su exp: las peticiones repetidas no
+# vuelven a verificar la firma
+verified_tokens = VerifiedTokenCache(verify_token, is_revoked=token_revoked)
+
+def decode_token(token):
+    return verified_tokens.decode(token)
+
+def revoke_token(token, payload):
+    digest = verified_tokens.revoke(token, payload["exp"])
+    try:
+        r.setex(f"revoked:{digest}", max(1, int(payload["exp"] - time.time()) + 1), 1)
+    except redis.RedisError as e:
+        log.warning(f"No se pudo publicar la revocación: {e}")
+
+def revoke_user_tokens(username):
+    # Ningún token dura más que el refresh: la marca puede expirar después
+    cutoff = verified_tokens.revoke_subject(username)
+    try:
+        r.setex(f"revoked_sub:{username}", REFRESH_EXPIRES_MIN * 60, cutoff)
+    except redis.RedisError as e:
+        log.warning(f"No se pudo publicar la revocación: {e}")
+
 # -----------------------
 # OPERACIONES MARIADB
 # -----------------------
@@ -248,6 +295,29 @@ def refresh():
     new_access = create_token(payload["sub"], ACCESS_EXPIRES_MIN)
     return jsonify({"ok": True, "access_token": new_access})
 
+@app.route("/logout", methods=["POST"])
+def logout():
+    """Revoca el access token (y el refresh_token del cuerpo); all=true revoca
+    todos los tokens del usuario emitidos hasta ahora."""
+    auth = request.headers.get("Authorization", "")
+    if not auth.startswith("Bearer "):
+        return jsonify({"ok": False, "error": "Token requerido"}), 401
+    token = auth.split(" ", 1)[1]
+    payload = decode_token(token)
+    if not payload:
+        return jsonify({"ok": False, "error": "Token inválido o expirado"}), 401
+
+    revoke_token(token, payload)
+    data = request.get_json(silent=True) or {}
+    refresh_token = data.get("refresh_token")
+    if refresh_token:
+        refresh_payload = decode_token(refresh_token)
+        if refresh_payload and refresh_payload.get("sub") == payload["sub"]:
+            revoke_token(refresh_token, refresh_payload)
+    if data.get("all"):
+        revoke_user_tokens(payload["sub"])
+    return jsonify({"ok": True, "message": "Sesión cerrada"})
+
 # -----------------------
 # USUARIO / LIBROS
 # -----------------------
@@ -274,24 +344,56 @@ def get_user(username):
 # -----------------------
 # LIBROS XML → JSON (versión Redis vs MariaDB con JWT)
 # -----------------------
-def libros_xml_to_json(xml_bytes):
-    """Convierte XML del microservicio Libros en una lista JSON."""
-    root = ET.fromstring(xml_bytes)
-    out = []
-    for book_el in root.findall("book"):
-        row = {
-            "isbn":   (book_el.findtext("isbn") or ""),
-            "title":  (book_el.findtext("title") or ""),
-            "author": (book_el.findtext("author") or ""),
-            "publisher": (book_el.findtext("publisher") or ""),
-            "year":   (book_el.findtext("year") or ""),
-            "genre":  (book_el.findtext("genre") or ""),
-            "price":  (book_el.findtext("price") or ""),
-            "stock":  (book_el.findtext("stock") or ""),
-            "format": (book_el.findtext("format") or "")
-        }
-        out.append(row)
-    return out
+def iter_libros_books(chunks):
+    """Recorre el XML de Libros por trozos y genera un dict por <book>.
+
+    Cada <book> se quita del árbol en cuanto se convierte: la memoria no
+    depende del tamaño del catálogo.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    root = None
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, el in parser.read_events():
+            if event == "start":
+                root = el if root is None else root
+            elif el.tag == "book":
+                yield {
+                    "isbn":   (el.findtext("isbn") or ""),
+                    "title":  (el.findtext("title") or ""),
+                    "author": (el.findtext("author") or ""),
+                    "publisher": (el.findtext("publisher") or ""),
+                    "year":   (el.findtext("year") or ""),
+                    "genre":  (el.findtext("genre") or ""),
+                    "price":  (el.findtext("price") or ""),
+                    "stock":  (el.findtext("stock") or ""),
+                    "format": (el.findtext("format") or "")
+                }
+                root.clear()
+    parser.close()
+
+
+def libros_xml_to_json(xml):
+    """Convierte XML del microservicio Libros (bytes o trozos) en una lista JSON."""
+    return list(iter_libros_books([xml] if isinstance(xml, bytes) else xml))
+
+
+def stream_books_json(resp, t0):
+    """Respuesta de /books emitida libro a libro mientras llega el XML.
+
+    Un error a mitad del XML corta la respuesta: el estado 200 ya se envió.
+    """
+    count = 0
+    try:
+        yield '{"ok": true, "cache": "stream", "books": ['
+        for row in iter_libros_books(resp.iter_content(LIBROS_STREAM_CHUNK)):
+            yield ("," if count else "") + json.dumps(row)
+            count += 1
+        duration = time.time() - t0
+        yield f'], "timing": {duration}}}'
+        log.info(f"📚 [Libros] GET {resp.url} ({duration:.3f}s, streaming) → {count} resultados")
+    finally:
+        resp.close()
 
 
 @app.route("/books", methods=["GET"])
@@ -307,29 +409,50 @@ def books_proxy():
     if not payload:
         return jsonify({"ok": False, "error": "Token inválido o expirado"}), 401
 
-    # --- Construcción de URL con parámetro ?q= ---
-    q = request.args.get("q", "").strip()
-    url = f"{LIBROS_HOST}/api/books"
+    # --- Construcción de URL con parámetro ?q= (normalizado: es también la clave de caché) ---
+    q = normalize_query(request.args.get("q"))
+    path = "/api/books"
     if q:
-        url += f"?q={requests.utils.quote(q)}"
+        path += f"?q={requests.utils.quote(q)}"
+    url = f"{LIBROS_HOST}{path}"
+
+    # --- Llamada al microservicio (conexión reutilizada del pool) + parseo
+    #     incremental: el cuerpo XML nunca se guarda completo ---
+    def fetch_books():
+        with libros.get(path, stream=True) as resp:
+            resp.raise_for_status()
+            return libros_xml_to_json(resp.iter_content(LIBROS_STREAM_CHUNK))
 
-    # --- Llamada al microservicio ---
     t0 = time.time()
+
+    # --- Sin caché: el JSON se transmite según llega el XML ---
+    if books_cache.ttl <= 0:
+        resp = None
+        try:
+            resp = libros.get(path, stream=True)
+            resp.raise_for_status()
+        except requests.RequestException as e:
+            if resp is not None:
+                resp.close()
+            log.error(f"❌ [Libros] Error al conectar con {url} → {e}")
+            return jsonify({
+                "ok": False,
+                "error": "No se pudo contactar el microservicio Libros",
+                "detail": str(e)
+            }), 502
+        return Response(stream_with_context(stream_books_json(resp, t0)),
+                        mimetype="application/json")
+
+    # --- Caché: sólo el primer fallo por búsqueda llega a Libros ---
     try:
-        r = requests.get(url, timeout=5)
-        r.raise_for_status()
-    except Exception as e:
+        rows, source = books_cache.get_or_load(q, fetch_books)
+    except (requests.RequestException, TimeoutError) as e:
         log.error(f"❌ [Libros] Error al conectar con {url} → {e}")
         return jsonify({
             "ok": False,
             "error": "No se pudo contactar el microservicio Libros",
             "detail": str(e)
         }), 502
-    t1 = time.time()
-
-    # --- Parseo del XML ---
-    try:
-        rows = libros_xml_to_json(r.content)
     except Exception as e:
         log.error(f"❌ [Libros] Error parseando XML → {e}")
         return jsonify({
@@ -337,19 +460,28 @@ def books_proxy():
             "error": "No se pudo parsear XML de Libros",
             "detail": str(e)
         }), 500
+    t1 = time.time()
 
     # --- Métricas y logs visuales ---
     duration = t1 - t0
-    log.info(f"📚 [Libros] GET {url} ({duration:.3f}s) → {len(rows)} resultados")
-    print("\033[94m📖 LIBROS:\033[0m", f"{len(rows)} libros | Tiempo {duration:.3f}s\n")
+    log.info(f"📚 [Libros] GET {url} ({duration:.3f}s, caché {source}) → {len(rows)} resultados")
+    print("\033[94m📖 LIBROS:\033[0m", f"{len(rows)} libros | Tiempo {duration:.3f}s | caché {source}\n")
 
     return jsonify({
         "ok": True,
         "timing": duration,
+        "cache": source,
         "books": rows
     }), 200
 
 
+@app.route("/libros/pool", methods=["GET"])
+def libros_pool():
+    """Métricas del pool HTTP hacia Libros (conexiones reutilizadas y saturación)."""
+    return jsonify({"ok": True, **libros.stats(), "cache": books_cache.stats(),
+                    "tokens": verified_tokens.stats()}), 200
+
+
 # -----------------------
 # LOG GLOBAL DE PETICIONES
 # -----------------------
@@ -366,4 +498,4 @@ def log_request():
 if __name__ == "__main__":
     log.info("Servidor Flask ejecutándose en http://0.0.0.0:5000")
     log.info("Conectando Redis, MariaDB y Libros XML→JSON...")
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    app.run(host="0.0.0.0", port=5000, debug=os.getenv("FLASK_DEBUG") == "1")
@@ -0,0 +1,109 @@
+# -------------------------------------------------------
+# CACHÉ DE /books EN EL GATEWAY
+# La lista de libros ya convertida a JSON se guarda en Redis por `q`
+# normalizado, con TTL: todos los workers la comparten. Dentro de cada
+# proceso, las peticiones que fallan a la vez en la misma clave esperan
+# a la primera (single-flight), así que al expirar una entrada bajo carga
+# sólo una petición por worker va a Libros.
+# -------------------------------------------------------
+import json
+import threading
+
+import redis
+
+
+def normalize_query(q):
+    """Forma canónica de `q`: "Python ", "python" y "  PYTHON" son la misma búsqueda.
+
+    El gateway normaliza `q` una sola vez y usa el resultado tanto para la
+    clave de caché como para la petición a Libros (LIKE sin distinguir
+    mayúsculas), así lo cacheado es justo lo que se pidió.
+    """
+    return " ".join((q or "").lower().split())
+
+
+class _Flight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class BooksCache:
+
+    def __init__(self, redis_client, ttl=30, prefix="books:q:", wait_timeout=10):
+        self.r = redis_client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.wait_timeout = wait_timeout
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def key(self, q):
+        return self.prefix + normalize_query(q)
+
+    def _get(self, key):
+        # Si Redis falla, la petición sigue como fallo de caché
+        try:
+            raw = self.r.get(key)
+        except redis.RedisError:
+            return None
+        return json.loads(raw) if raw else None
+
+    def _set(self, key, value):
+        try:
+            self.r.setex(key, self.ttl, json.dumps(value))
+        except redis.RedisError:
+            pass
+
+    def get_or_load(self, q, load):
+        """(valor, origen): origen es "hit", "miss" o "coalesced".
+
+        `load()` se ejecuta como mucho una vez por clave y proceso a la vez;
+        sus excepciones llegan también a los que esperaban y no se cachean.
+        """
+        key = self.key(q)
+        value = self._get(key)
+        if value is not None:
+            self.hits += 1
+            return value, "hit"
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            if not flight.done.wait(self.wait_timeout):
+                raise TimeoutError(f"Sin respuesta de Libros para {key}")
+            if flight.error is not None:
+                raise flight.error
+            self.coalesced += 1
+            return flight.value, "coalesced"
+
+        try:
+            flight.value = load()
+            self._set(key, flight.value)
+            self.misses += 1
+            return flight.value, "miss"
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def stats(self):
+        return {
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._flights)
+        }
@@ -0,0 +1,134 @@
+# -------------------------------------------------------
+# CACHÉ DE JWT VERIFICADOS
+# Verificar un token (HMAC + JSON) en cada petición protegida es trabajo
+# repetido: el mismo access token llega cientos de veces por minuto. Aquí
+# se guarda el payload ya verificado, indexado por el SHA-256 del token,
+# hasta su `exp` exacto. Las revocaciones locales se aplican al instante;
+# las de otros workers (hook `is_revoked`, p. ej. Redis) se consultan como
+# mucho cada `recheck_interval` segundos por token, nunca con criptografía.
+# -------------------------------------------------------
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def token_digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class VerifiedTokenCache:
+
+    def __init__(self, verify, max_entries=10000, is_revoked=None, recheck_interval=5):
+        """verify(token) -> payload o None; is_revoked(digest, payload) -> bool."""
+        self.verify = verify
+        self.max_entries = max_entries
+        self.is_revoked = is_revoked
+        self.recheck_interval = recheck_interval
+        self._entries = OrderedDict()   # digest -> [payload, exp, revisado_en]
+        self._revoked = {}              # digest -> exp (lista negra local)
+        self._subject_cutoff = {}       # sub -> tokens con iat anterior no valen
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def decode(self, token):
+        """Payload del token, o None si es inválido, expiró o fue revocado."""
+        digest = token_digest(token)
+        now = time.time()
+        recheck = None
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                payload, exp, checked_at = entry
+                # Misma regla que PyJWT: el token vale mientras now < exp
+                if now >= exp:
+                    del self._entries[digest]
+                elif now - checked_at < self.recheck_interval:
+                    self._entries.move_to_end(digest)
+                    self.hits += 1
+                    return payload
+                else:
+                    recheck = payload
+
+        # Entrada vigente pero vieja: sólo se vuelve a mirar la revocación
+        if recheck is not None:
+            if self._revoked_elsewhere(digest, recheck):
+                self._forget(digest)
+                return None
+            with self._lock:
+                if digest in self._entries:
+                    self._entries[digest][2] = now
+                self.hits += 1
+            return recheck
+
+        self.misses += 1
+        payload = self.verify(token)
+        if payload is None or self._revoked_elsewhere(digest, payload):
+            return None
+
+        # Sin exp el token no caduca: se verifica siempre en lugar de cachearlo
+        exp = payload.get("exp")
+        if not isinstance(exp, (int, float)):
+            return payload
+        with self._lock:
+            if digest not in self._revoked:
+                self._entries[digest] = [payload, exp, now]
+                self._entries.move_to_end(digest)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return payload
+
+    def _revoked_elsewhere(self, digest, payload):
+        with self._lock:
+            if digest in self._revoked:
+                return True
+            cutoff = self._subject_cutoff.get(payload.get("sub"))
+        if cutoff is not None and payload.get("iat", 0) < cutoff:
+            return True
+        return bool(self.is_revoked and self.is_revoked(digest, payload))
+
+    def _forget(self, digest):
+        with self._lock:
+            self._entries.pop(digest, None)
+
+    # -------- Hooks de revocación --------
+    def revoke(self, token, exp):
+        """Rechaza este token desde ya en este proceso (hasta su `exp`)."""
+        digest = token_digest(token)
+        now = time.time()
+        with self._lock:
+            self._entries.pop(digest, None)
+            self._revoked[digest] = exp
+            for d, until in list(self._revoked.items()):
+                if until <= now:
+                    del self._revoked[d]
+        return digest
+
+    def revoke_subject(self, sub, cutoff=None):
+        """Rechaza los tokens de `sub` emitidos antes de `cutoff`.
+
+        `iat` tiene resolución de segundos: por defecto el corte es el
+        segundo siguiente, para que también caigan los tokens emitidos en el
+        mismo segundo que la revocación. Un login en ese mismo segundo queda
+        rechazado y debe repetirse.
+        """
+        cutoff = int(time.time()) + 1 if cutoff is None else cutoff
+        with self._lock:
+            self._subject_cutoff[sub] = max(cutoff, self._subject_cutoff.get(sub, 0))
+            for digest in [d for d, e in self._entries.items() if e[0].get("sub") == sub]:
+                del self._entries[digest]
+        return cutoff
+
+    def clear(self):
+        """Vacía la caché (p. ej. al rotar SECRET_KEY)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "revoked": len(self._revoked),
+            "hits": self.hits,
+            "misses": self.misses
+        }
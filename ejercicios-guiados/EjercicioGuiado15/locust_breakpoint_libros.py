@@ -0,0 +1,42 @@
+import os
+from locust import HttpUser, task, constant, LoadTestShape
+
+# === 1. CONFIGURACIÓN ===
+# Mismo escalonado que locust_breakpoint.py, contra el microservicio Libros (18).
+# Comparar ambos modos de arranque:
+#   python main.py                                  (servidor de desarrollo)
+#   gunicorn -c ../gunicorn.conf.py main:app        (pre-fork + pools)
+# y ejecutar: locust -f locust_breakpoint_libros.py --headless --csv libros_<modo>
+TARGET_HOST = os.getenv("TARGET_HOST", "http://localhost:5001")
+
+# === 2. CONTROLADOR DE CARGA (STEP LOAD) ===
+class StepLoadShape(LoadTestShape):
+    step_time = 30  # Duración del escalón (segundos)
+    step_load = 10  # Usuarios nuevos por escalón
+    spawn_rate = 5
+    time_limit = 600
+
+    def tick(self):
+        run_time = self.get_run_time()
+        if run_time > self.time_limit:
+            return None
+
+        current_step = run_time // self.step_time + 1
+        return (current_step * self.step_load, self.spawn_rate)
+
+# === 3. USUARIO DE PRUEBA ===
+class Lector(HttpUser):
+    host = TARGET_HOST
+    wait_time = constant(1)
+
+    @task(5)
+    def catalogo(self):
+        self.client.get("/api/books", name="/api/books")
+
+    @task(3)
+    def sugerencias(self):
+        self.client.get("/api/books/suggest?prefix=ga", name="/api/books/suggest")
+
+    @task(1)
+    def metricas(self):
+        self.client.get("/metrics", name="/metrics")
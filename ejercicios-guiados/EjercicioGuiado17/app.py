@@ -4,14 +4,24 @@
 # Autor: Pablo Celedón Cabriales
 # ------------------------------------------
 
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, send_from_directory, stream_with_context
 from flask_mysqldb import MySQL
+import MySQLdb.cursors
 from werkzeug.utils import secure_filename
-from google.cloud import storage
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_content_range_header
+from werkzeug.wsgi import wrap_file
+from storage_backend import create_storage, LocalStorage, ObjectNotFound, CHUNK_SIZE, RESUMABLE_ALIGN
+from signed_url_cache import SignedURLCache
+from object_cache import DiskLRUCache
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import xml.etree.ElementTree as ET
+import base64
 import datetime
+import hashlib
+import importlib.util
 import os
 import uuid
 
@@ -25,15 +35,64 @@ load_dotenv()
 # -----------------------------
 app = Flask(__name__)
 
-from flasgger import Swagger, swag_from
+# Con la especificación ya generada (python3 build_openapi.py) no se importa
+# Flasgger ni se procesan los @swag_from al arrancar: se sirve el JSON
+# estático. SWAGGER_LIVE=1 vuelve a generarla en cada arranque.
+OPENAPI_SPEC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "openapi.json")
 
-app.config['SWAGGER'] = {
-    'title': 'API de Imágenes GCS',
-    'uiversion': 3,
-    'specs_route': '/api/docs/'
 
-}
-swagger = Swagger(app)
+def openapi_spec_is_fresh():
+    # Un openapi.json anterior al último cambio de app.py ya no describe la API
+    return (os.path.exists(OPENAPI_SPEC)
+            and os.path.getmtime(OPENAPI_SPEC) >= os.path.getmtime(os.path.abspath(__file__)))
+
+
+SWAGGER_LIVE = os.getenv("SWAGGER_LIVE", "0") == "1" or not openapi_spec_is_fresh()
+if SWAGGER_LIVE and os.path.exists(OPENAPI_SPEC) and os.getenv("SWAGGER_LIVE") != "1":
+    app.logger.warning("openapi.json es anterior a app.py: se usa Flasgger (python3 build_openapi.py)")
+
+if SWAGGER_LIVE:
+    from flasgger import Swagger, swag_from
+
+    app.config['SWAGGER'] = {
+        'title': 'API de Imágenes GCS',
+        'uiversion': 3,
+        'specs_route': '/api/docs/'
+
+    }
+    swagger = Swagger(app)
+else:
+    def swag_from(specs):
+        return lambda f: f
+
+    @app.route("/apispec_1.json", methods=["GET"])
+    def openapi_spec():
+        return send_from_directory(os.path.dirname(OPENAPI_SPEC), os.path.basename(OPENAPI_SPEC),
+                                   mimetype="application/json")
+
+    @app.route("/api/docs/", methods=["GET"])
+    def openapi_docs():
+        return Response(SWAGGER_UI_HTML, mimetype="text/html")
+
+    # Swagger UI se sirve desde los archivos que ya trae Flasgger (misma
+    # ruta que en modo vivo); find_spec localiza el paquete sin importarlo
+    _flasgger = importlib.util.find_spec("flasgger")
+    SWAGGER_UI_STATIC = (os.path.join(os.path.dirname(_flasgger.origin), "ui3", "static")
+                         if _flasgger else None)
+
+    @app.route("/flasgger_static/<path:filename>", methods=["GET"])
+    def swagger_ui_static(filename):
+        if SWAGGER_UI_STATIC is None:
+            return make_error("Flasgger no está instalado", 404)
+        return send_from_directory(SWAGGER_UI_STATIC, filename)
+
+    SWAGGER_UI_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>API de Imágenes GCS</title>
+<link rel="stylesheet" href="/flasgger_static/swagger-ui.css"></head>
+<body><div id="swagger-ui"></div>
+<script src="/flasgger_static/swagger-ui-bundle.js"></script>
+<script>SwaggerUIBundle({url: "/apispec_1.json", dom_id: "#swagger-ui"});</script>
+</body></html>"""
 
 
 app.config["MYSQL_HOST"] = os.getenv("MYSQL_HOST")
@@ -44,15 +103,32 @@ app.config["MYSQL_CURSORCLASS"] = "DictCursor"
 mysql = MySQL(app)
 
 # -----------------------------
-# Configuración GCS
+# Configuración almacenamiento (GCS o disco local)
 # -----------------------------
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "gcs")
 GCS_BUCKET = os.getenv("GCS_BUCKET")
 GCS_PUBLIC = os.getenv("GCS_PUBLIC", "0") == "1"
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "./storage")
+LOCAL_STORAGE_URL = os.getenv("LOCAL_STORAGE_URL", "http://localhost:5000/storage")
 API_TOKEN = os.getenv("API_TOKEN")
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+# Firma de las URLs de subida del backend local. Se fija al importar para
+# que todos los workers (gunicorn --preload) acepten las mismas URLs
+LOCAL_STORAGE_SECRET = os.getenv("LOCAL_STORAGE_SECRET") or uuid.uuid4().hex
+if os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+
+storage = create_storage(STORAGE_BACKEND, bucket=GCS_BUCKET, root=LOCAL_STORAGE_DIR,
+                         base_url=LOCAL_STORAGE_URL, secret=LOCAL_STORAGE_SECRET)
+
 
-gcs_client = storage.Client()
-bucket = gcs_client.bucket(GCS_BUCKET)
+def init_worker():
+    """Cliente de almacenamiento propio de cada worker (gunicorn post_fork).
+
+    La sesión HTTP del cliente de GCS no debe compartirse entre procesos.
+    """
+    global storage
+    storage = create_storage(STORAGE_BACKEND, bucket=GCS_BUCKET, root=LOCAL_STORAGE_DIR,
+                             base_url=LOCAL_STORAGE_URL, secret=LOCAL_STORAGE_SECRET)
 
 # -----------------------------
 # Configuración general
@@ -60,9 +136,135 @@ bucket = gcs_client.bucket(GCS_BUCKET)
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
 MAX_SIZE = 16 * 1024 * 1024  # 16 MB
 
+# Paginación de /images
+PAGE_DEFAULT = 100
+PAGE_MAX = 1000
+
+# Subida directa al almacenamiento: vigencia de la URL de PUT. Un PUT que
+# empieza justo antes de que venza puede terminar después, así que la subida
+# se acepta (y no se purga) hasta UPLOAD_COMPLETE_GRACE tras expires_at
+UPLOAD_URL_TTL = datetime.timedelta(minutes=int(os.getenv("UPLOAD_URL_TTL_MIN", 15)))
+UPLOAD_COMPLETE_GRACE = datetime.timedelta(minutes=int(os.getenv("UPLOAD_COMPLETE_GRACE_MIN", 60)))
+
+# Subida resumible: bloque sugerido y máximo por PUT (múltiplos de 256 KB)
+RESUMABLE_CHUNK = 4 * RESUMABLE_ALIGN       # 1 MB
+RESUMABLE_CHUNK_MAX = 32 * RESUMABLE_ALIGN  # 8 MB
+RESUMABLE_TTL = datetime.timedelta(days=1)
+
+# Caché en disco de los objetos servidos por /images/<filename>/content:
+# cada worker usa IMAGE_CACHE_DIR/<pid> con hasta IMAGE_CACHE_MB propios
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "./cache")
+IMAGE_CACHE_MB = int(os.getenv("IMAGE_CACHE_MB", 512))
+IMAGE_MAX_AGE = 3600
+
+# Borrado por lotes: máximo de archivos por petición y borrados simultáneos
+BATCH_DELETE_MAX = 1000
+DELETE_WORKERS = int(os.getenv("DELETE_WORKERS", 16))
+
+# Werkzeug corta la petición completa antes de parsear el multipart
+# (margen de 1 MB para las cabeceras del formulario).
+app.config["MAX_CONTENT_LENGTH"] = MAX_SIZE + 1024 * 1024
+
 # -----------------------------
 # Funciones auxiliares
 # -----------------------------
+class FileTooLarge(Exception):
+    pass
+
+
+class LimitedStream:
+    """Envuelve un stream, cuenta los bytes leídos y aborta al superar el límite.
+
+    Los bytes fluyen por bloques hacia el bucket, así que la memoria por
+    subida no depende del tamaño del archivo. También calcula el SHA-256
+    de lo leído.
+    """
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.limit = limit
+        self.bytes_read = 0
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.limit - self.bytes_read + 1
+        chunk = self.stream.read(size)
+        self.bytes_read += len(chunk)
+        if self.bytes_read > self.limit:
+            raise FileTooLarge(f"El archivo supera {self.limit // (1024 * 1024)} MB")
+        self.sha256.update(chunk)
+        return chunk
+
+    def tell(self):
+        return self.bytes_read
+
+    def seek(self, offset, whence=0):
+        # GCS sólo rebobina al reintentar un bloque ya contado
+        pos = self.stream.seek(offset, whence)
+        self.bytes_read = pos
+        return pos
+
+
+def hash_upload(stream, limit):
+    """Primera pasada por bloques sobre el temporal de Werkzeug: (sha256, tamaño)."""
+    counted = LimitedStream(stream, limit)
+    while counted.read(CHUNK_SIZE):
+        pass
+    stream.seek(0)
+    return counted.sha256.hexdigest(), counted.bytes_read
+
+
+def blob_name_for(sha256):
+    return f"blobs/{sha256}"
+
+
+def add_blob_ref(cursor, sha256, mime, size_bytes):
+    """Suma una referencia al blob y devuelve su nombre.
+
+    El upsert bloquea la fila de image_blob hasta el commit, así que un
+    borrado concurrente del mismo contenido no puede eliminar el blob
+    entre la comprobación y la inserción de la imagen.
+    """
+    cursor.execute("""
+        INSERT INTO image_blob (sha256, mime_type, size_bytes, ref_count)
+        VALUES (%s, %s, %s, 1)
+        ON DUPLICATE KEY UPDATE ref_count = ref_count + 1
+    """, (sha256, mime, size_bytes))
+    return blob_name_for(sha256)
+
+
+def store_blob(cursor, stream, sha256, mime, size_bytes):
+    """Suma una referencia al blob y sólo lo sube si aún no existe.
+
+    Devuelve (nombre, subido): `subido` indica que esta llamada creó el blob.
+    Si la subida falla a medias, el objeto parcial se borra antes de relanzar.
+    """
+    name = add_blob_ref(cursor, sha256, mime, size_bytes)
+    if storage.exists(name):
+        return name, False
+    try:
+        storage.put(name, LimitedStream(stream, MAX_SIZE), content_type=mime)
+    except Exception:
+        try:
+            storage.delete(name)
+        except Exception:
+            pass
+        raise
+    return name, True
+
+
+def release_blob(cursor, sha256):
+    """Resta una referencia; devuelve el blob a borrar si quedó sin referencias."""
+    cursor.execute("SELECT ref_count FROM image_blob WHERE sha256 = %s FOR UPDATE", (sha256,))
+    row = cursor.fetchone()
+    if row and row["ref_count"] > 1:
+        cursor.execute("UPDATE image_blob SET ref_count = ref_count - 1 WHERE sha256 = %s", (sha256,))
+        return None
+    cursor.execute("DELETE FROM image_blob WHERE sha256 = %s", (sha256,))
+    return blob_name_for(sha256)
+
+
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -97,18 +299,31 @@ def make_ok(payload):
     return Response(ET.tostring(root), mimetype="application/xml")
 
 
-def object_signed_url(blob_name, mime):
-    blob = bucket.blob(blob_name)
-    return blob.generate_signed_url(
-        expiration=datetime.timedelta(hours=1),
-        version="v4",
-        method="GET",
-        response_type=mime
-    )
+def object_signed_url(blob_name, mime, expires=datetime.timedelta(hours=1)):
+    return storage.url(blob_name, expires=expires, content_type=mime)
 
 
 def object_public_url(blob_name):
-    return f"https://storage.googleapis.com/{GCS_BUCKET}/{blob_name}"
+    return storage.url(blob_name)
+
+
+# Las URLs firmadas se generan al leer (nunca se sirven las guardadas en la
+# BD, que caducan) y se reutilizan mientras les quede vigencia
+signed_urls = SignedURLCache(object_signed_url)
+
+# Copias locales de los objetos que se descargan a través del servicio
+object_cache = DiskLRUCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MB * 1024 * 1024)
+
+
+def image_url(blob_name, mime):
+    if GCS_PUBLIC:
+        return object_public_url(blob_name)
+    return signed_urls.get(blob_name, mime)
+
+
+def image_blob_name(row):
+    # Filas anteriores a la deduplicación: el blob se llama como el archivo
+    return blob_name_for(row["sha256"]) if row["sha256"] else row["filename"]
 
 
 def require_token(f):
@@ -168,6 +383,7 @@ def require_token(f):
         },
         401: {'description': 'Token ausente o inválido'},
         403: {'description': 'Token incorrecto'},
+        413: {'description': 'Archivo demasiado grande'},
         415: {'description': 'Formato no permitido'}
     }
 })
@@ -192,32 +408,490 @@ def upload_image():
     unique_name = f"{uuid.uuid4().hex}_{filename}"
     mime = file.mimetype
 
-    blob = bucket.blob(unique_name)
-    blob.upload_from_file(file.stream, content_type=mime)
+    try:
+        sha256, size_bytes = hash_upload(file.stream, MAX_SIZE)
+    except FileTooLarge as e:
+        return make_error(str(e), 413)
 
-    # Generar URL
-    if GCS_PUBLIC:
-        url = object_public_url(unique_name)
+    # Blob direccionado por contenido: si ya existe no se vuelve a subir
+    cursor = mysql.connection.cursor()
+    blob_name, uploaded = None, False
+    try:
+        blob_name, uploaded = store_blob(cursor, file.stream, sha256, mime, size_bytes)
+
+        # Insertar metadatos en la BD
+        cursor.execute("""
+            INSERT INTO image (filename, mime_type, size_bytes, storage_url, sha256)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (unique_name, mime, size_bytes, object_public_url(blob_name), sha256))
+        mysql.connection.commit()
+    except Exception as e:
+        # El blob nuevo se borra antes del rollback, mientras la fila de
+        # image_blob sigue bloqueada: otra subida del mismo contenido no
+        # puede haberlo dado por existente
+        if uploaded:
+            try:
+                storage.delete(blob_name)
+            except Exception:
+                pass
+        mysql.connection.rollback()
+        cursor.close()
+        if isinstance(e, FileTooLarge):
+            return make_error(str(e), 413)
+        return make_error(f"No se pudo guardar la imagen: {e}", 500)
+    cursor.close()
+
+    # En la BD queda la ubicación permanente; la URL firmada sólo va en la respuesta
+    url = image_url(blob_name, mime)
+
+    return make_ok({
+        "filename": unique_name,
+        "mime_type": mime,
+        "size_bytes": size_bytes,
+        "sha256": sha256,
+        "storage_url": url
+    })
+
+
+# -----------------------------
+# Subida directa al almacenamiento (URL de PUT firmada)
+# -----------------------------
+def upload_object_name(upload_id):
+    return f"uploads/{upload_id}"
+
+
+class UploadRejected(Exception):
+    """Error de una subida en dos pasos; `discard` cancela la subida y su objeto."""
+
+    def __init__(self, msg, code, discard=False):
+        super().__init__(msg)
+        self.code = code
+        self.discard = discard
+
+
+def parse_upload_request(require_size=False):
+    """(filename, mime, size_bytes) del cuerpo JSON o formulario."""
+    data = request.get_json(silent=True) or request.form
+    filename = secure_filename(data.get("filename") or "")
+    mime = (data.get("mime_type") or "").strip()
+
+    if not filename or not mime:
+        raise UploadRejected("Se requieren 'filename' y 'mime_type'", 400)
+    if not allowed_file(filename):
+        raise UploadRejected("Formato no permitido", 415)
+    try:
+        declared = int(data.get("size_bytes") or 0)
+    except ValueError:
+        raise UploadRejected("'size_bytes' inválido", 400)
+    if require_size and declared <= 0:
+        raise UploadRejected("Se requiere 'size_bytes'", 400)
+    if declared > MAX_SIZE:
+        raise UploadRejected(f"El archivo supera {MAX_SIZE // (1024 * 1024)} MB", 413)
+    return filename, mime, declared
+
+
+def lock_upload(cursor, upload_id):
+    cursor.execute("SELECT * FROM image_upload WHERE id = %s FOR UPDATE", (upload_id,))
+    upload = cursor.fetchone()
+    if not upload:
+        raise UploadRejected("La subida no existe", 404)
+    if upload["status"] != "pending":
+        raise UploadRejected("La subida ya se completó", 409)
+    if upload["expires_at"] + UPLOAD_COMPLETE_GRACE < datetime.datetime.utcnow():
+        raise UploadRejected("La subida expiró", 410, discard=True)
+    return upload
+
+
+def discard_upload(cursor, upload):
+    """Cancela la sesión resumible, borra el objeto subido y la fila (sin commit)."""
+    if upload["session"]:
+        try:
+            storage.abort_resumable(upload["object_name"], upload["session"])
+        except (IOError, ObjectNotFound):
+            pass
+    try:
+        storage.delete(upload["object_name"])
+    except ObjectNotFound:
+        pass
+    cursor.execute("DELETE FROM image_upload WHERE id = %s", (upload["id"],))
+
+
+def purge_expired_uploads(limit=20):
+    """Descarta las subidas pendientes cuyo plazo (expires_at + margen) venció.
+
+    Se llama al crear una subida nueva: así las sesiones abandonadas no se
+    acumulan en el bucket ni en image_upload sin necesidad de un cron.
+    """
+    cursor = mysql.connection.cursor()
+    cursor.execute("""
+        SELECT id FROM image_upload
+        WHERE status = 'pending' AND expires_at < %s
+        LIMIT %s
+    """, (datetime.datetime.utcnow() - UPLOAD_COMPLETE_GRACE, limit))
+    for row in cursor.fetchall():
+        # Se vuelve a leer con candado: otro worker pudo descartarla ya
+        cursor.execute("""
+            SELECT id, object_name, session FROM image_upload
+            WHERE id = %s AND status = 'pending' FOR UPDATE
+        """, (row["id"],))
+        upload = cursor.fetchone()
+        if upload:
+            discard_upload(cursor, upload)
+        mysql.connection.commit()
+    cursor.close()
+
+
+def reject_upload(cursor, upload_id, e):
+    if e.discard:
+        cursor.execute("SELECT id, object_name, session FROM image_upload WHERE id = %s",
+                       (upload_id,))
+        upload = cursor.fetchone()
+        if upload:
+            discard_upload(cursor, upload)
+        mysql.connection.commit()
+    else:
+        mysql.connection.rollback()
+    cursor.close()
+    return make_error(str(e), e.code)
+
+
+def register_upload(cursor, upload):
+    """Verifica el objeto en uploads/<id>, lo pasa a blobs/<sha256> e inserta la imagen."""
+    object_name = upload["object_name"]
+    mime = upload["mime_type"]
+    try:
+        info = storage.stat(object_name)
+    except ObjectNotFound:
+        raise UploadRejected("El archivo aún no se ha subido", 409)
+
+    if info["size"] > MAX_SIZE:
+        raise UploadRejected(f"El archivo supera {MAX_SIZE // (1024 * 1024)} MB", 413, discard=True)
+    if info["content_type"] and info["content_type"] != mime:
+        raise UploadRejected("El Content-Type subido no coincide", 415, discard=True)
+
+    # El SHA-256 se calcula leyendo del bucket (red interna, no el cliente lento)
+    try:
+        with storage.get(object_name) as src:
+            sha256, size_bytes = hash_upload(src, MAX_SIZE)
+    except ObjectNotFound:
+        raise UploadRejected("El archivo aún no se ha subido", 409)
+
+    # Si el contenido ya existía se descarta la copia; si no, pasa a blobs/
+    blob_name = add_blob_ref(cursor, sha256, mime, size_bytes)
+    if storage.exists(blob_name):
+        storage.delete(object_name)
     else:
-        url = object_signed_url(unique_name, mime)
+        storage.move(object_name, blob_name)
+
+    unique_name = f"{upload['id']}_{upload['filename']}"
+    cursor.execute("""
+        INSERT INTO image (filename, mime_type, size_bytes, storage_url, sha256)
+        VALUES (%s, %s, %s, %s, %s)
+    """, (unique_name, mime, size_bytes, object_public_url(blob_name), sha256))
+    cursor.execute("UPDATE image_upload SET status = 'complete' WHERE id = %s", (upload["id"],))
+
+    return {
+        "filename": unique_name,
+        "mime_type": mime,
+        "size_bytes": size_bytes,
+        "sha256": sha256,
+        "storage_url": image_url(blob_name, mime)
+    }
+
+
+@swag_from({
+    'tags': ['Imágenes'],
+    'summary': 'Iniciar una subida directa al bucket',
+    'description': 'Devuelve una URL firmada para subir la imagen con PUT sin pasar '
+                   'por este servicio. Después se llama a /uploads/<upload_id>/complete.',
+    'parameters': [
+        {'name': 'Authorization', 'in': 'header', 'type': 'string', 'required': True,
+         'description': 'Token Bearer. Ej: Bearer udem'},
+        {'name': 'body', 'in': 'body', 'required': True,
+         'schema': {'type': 'object', 'properties': {
+             'filename': {'type': 'string'},
+             'mime_type': {'type': 'string'},
+             'size_bytes': {'type': 'integer'}}}},
+        {'name': 'format', 'in': 'query', 'type': 'string', 'enum': ['json'], 'required': False,
+         'description': 'Si se envía format=json, la respuesta será en JSON'}
+    ],
+    'responses': {
+        200: {
+            'description': 'URL de subida',
+            'examples': {
+                'application/json': {
+                    'status': 'ok',
+                    'upload_id': '3f2a...',
+                    'upload_url': 'https://storage.googleapis.com/bucket/uploads/3f2a...?X-Goog-Signature=...',
+                    'method': 'PUT',
+                    'content_type': 'image/jpeg',
+                    'expires_at': '2025-11-12T14:48:00Z',
+                    'max_size_bytes': 16777216
+                }
+            }
+        },
+        400: {'description': 'Datos incompletos'},
+        413: {'description': 'Archivo demasiado grande'},
+        415: {'description': 'Formato no permitido'}
+    }
+})
+@app.route("/uploads", methods=["POST"])
+@require_token
+def create_upload():
+    try:
+        filename, mime, _ = parse_upload_request()
+    except UploadRejected as e:
+        return make_error(str(e), e.code)
+
+    purge_expired_uploads()
+    upload_id = uuid.uuid4().hex
+    object_name = upload_object_name(upload_id)
+    expires_at = datetime.datetime.utcnow() + UPLOAD_URL_TTL
 
-    # Insertar metadatos en la BD
     cursor = mysql.connection.cursor()
     cursor.execute("""
-        INSERT INTO image (filename, mime_type, size_bytes, storage_url)
-        VALUES (%s, %s, %s, %s)
-    """, (unique_name, mime, file.content_length or 0, url))
+        INSERT INTO image_upload (id, filename, mime_type, object_name, expires_at)
+        VALUES (%s, %s, %s, %s, %s)
+    """, (upload_id, filename, mime, object_name, expires_at))
     mysql.connection.commit()
     cursor.close()
 
     return make_ok({
-        "filename": unique_name,
-        "mime_type": mime,
-        "size_bytes": file.content_length or 0,
-        "storage_url": url
+        "upload_id": upload_id,
+        "upload_url": storage.signed_put_url(object_name, UPLOAD_URL_TTL, mime),
+        "method": "PUT",
+        "content_type": mime,
+        "expires_at": expires_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "max_size_bytes": MAX_SIZE
+    })
+
+
+@swag_from({
+    'tags': ['Imágenes'],
+    'summary': 'Completar una subida directa',
+    'description': 'Verifica el objeto subido con la URL firmada y registra la imagen.',
+    'parameters': [
+        {'name': 'upload_id', 'in': 'path', 'type': 'string', 'required': True},
+        {'name': 'Authorization', 'in': 'header', 'type': 'string', 'required': True,
+         'description': 'Token Bearer. Ej: Bearer udem'},
+        {'name': 'format', 'in': 'query', 'type': 'string', 'enum': ['json'], 'required': False,
+         'description': 'Si se envía format=json, la respuesta será en JSON'}
+    ],
+    'responses': {
+        200: {'description': 'Imagen registrada (mismos campos que /upload)'},
+        404: {'description': 'Subida inexistente'},
+        409: {'description': 'El objeto no se ha subido o la subida ya se completó'},
+        410: {'description': 'La subida expiró y se descartó'},
+        413: {'description': 'Archivo demasiado grande'},
+        415: {'description': 'El Content-Type subido no coincide'}
+    }
+})
+@app.route("/uploads/<upload_id>/complete", methods=["POST"])
+@require_token
+def complete_upload(upload_id):
+    cursor = mysql.connection.cursor()
+    try:
+        upload = lock_upload(cursor, upload_id)
+        if upload["total_bytes"] is not None and upload["received_bytes"] < upload["total_bytes"]:
+            raise UploadRejected(f"Faltan bytes: recibidos {upload['received_bytes']} "
+                                 f"de {upload['total_bytes']}", 409)
+        payload = register_upload(cursor, upload)
+    except UploadRejected as e:
+        return reject_upload(cursor, upload_id, e)
+
+    mysql.connection.commit()
+    cursor.close()
+    return make_ok(payload)
+
+
+# -----------------------------
+# Subida resumible por bloques (init, PUT con Content-Range, finalize)
+# -----------------------------
+def read_body(stream, limit):
+    """Cuerpo completo de la petición (un bloque), sin pasar de `limit` bytes."""
+    parts, size = [], 0
+    while True:
+        chunk = stream.read(min(CHUNK_SIZE, limit + 1 - size))
+        if not chunk:
+            return b"".join(parts)
+        size += len(chunk)
+        if size > limit:
+            raise FileTooLarge(f"El bloque supera {limit // (1024 * 1024)} MB")
+        parts.append(chunk)
+
+
+@swag_from({
+    'tags': ['Imágenes'],
+    'summary': 'Iniciar una subida resumible',
+    'description': 'Abre una sesión resumible en el almacenamiento. Después se envían bloques con '
+                   'PUT /uploads/resumable/<upload_id> y se cierra con .../finalize.',
+    'parameters': [
+        {'name': 'Authorization', 'in': 'header', 'type': 'string', 'required': True,
+         'description': 'Token Bearer. Ej: Bearer udem'},
+        {'name': 'body', 'in': 'body', 'required': True,
+         'schema': {'type': 'object', 'properties': {
+             'filename': {'type': 'string'},
+             'mime_type': {'type': 'string'},
+             'size_bytes': {'type': 'integer'}}}},
+        {'name': 'format', 'in': 'query', 'type': 'string', 'enum': ['json'], 'required': False,
+         'description': 'Si se envía format=json, la respuesta será en JSON'}
+    ],
+    'responses': {
+        200: {
+            'description': 'Sesión creada',
+            'examples': {
+                'application/json': {
+                    'status': 'ok',
+                    'upload_id': '3f2a...',
+                    'chunk_size': 1048576,
+                    'max_chunk_size': 8388608,
+                    'received_bytes': 0,
+                    'total_bytes': 15728640
+                }
+            }
+        },
+        400: {'description': 'Datos incompletos'},
+        413: {'description': 'Archivo demasiado grande'},
+        415: {'description': 'Formato no permitido'}
+    }
+})
+@app.route("/uploads/resumable", methods=["POST"])
+@require_token
+def create_resumable_upload():
+    try:
+        filename, mime, total = parse_upload_request(require_size=True)
+    except UploadRejected as e:
+        return make_error(str(e), e.code)
+
+    purge_expired_uploads()
+    upload_id = uuid.uuid4().hex
+    object_name = upload_object_name(upload_id)
+    session = storage.start_resumable(object_name, mime, total)
+
+    cursor = mysql.connection.cursor()
+    cursor.execute("""
+        INSERT INTO image_upload
+            (id, filename, mime_type, object_name, expires_at, total_bytes, session)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """, (upload_id, filename, mime, object_name,
+          datetime.datetime.utcnow() + RESUMABLE_TTL, total, session))
+    mysql.connection.commit()
+    cursor.close()
+
+    return make_ok({
+        "upload_id": upload_id,
+        "chunk_size": RESUMABLE_CHUNK,
+        "max_chunk_size": RESUMABLE_CHUNK_MAX,
+        "received_bytes": 0,
+        "total_bytes": total
     })
 
 
+@swag_from({
+    'tags': ['Imágenes'],
+    'summary': 'Enviar un bloque de una subida resumible',
+    'description': 'Cuerpo = bytes del bloque; Content-Range: bytes <inicio>-<fin>/<total>. '
+                   'El inicio debe ser igual a received_bytes y los bloques no finales, '
+                   'múltiplos de 256 KB.',
+    'parameters': [
+        {'name': 'upload_id', 'in': 'path', 'type': 'string', 'required': True},
+        {'name': 'Content-Range', 'in': 'header', 'type': 'string', 'required': True},
+        {'name': 'Authorization', 'in': 'header', 'type': 'string', 'required': True,
+         'description': 'Token Bearer. Ej: Bearer udem'}
+    ],
+    'responses': {
+        200: {'description': 'Bloque guardado; devuelve received_bytes'},
+        400: {'description': 'Content-Range o tamaño de bloque inválido'},
+        404: {'description': 'Subida inexistente'},
+        409: {'description': 'El inicio no coincide con lo recibido (consultar con GET)'},
+        410: {'description': 'La subida expiró y se descartó'},
+        413: {'description': 'Bloque demasiado grande'}
+    }
+})
+@app.route("/uploads/resumable/<upload_id>", methods=["PUT"])
+@require_token
+def put_upload_chunk(upload_id):
+    content_range = parse_content_range_header(request.headers.get("Content-Range"))
+    if content_range is None or content_range.units != "bytes":
+        return make_error("Se requiere Content-Range: bytes <inicio>-<fin>/<total>", 400)
+    # "bytes */N" (sin rango) y "bytes a-b/*" (sin total) son válidos en HTTP,
+    # pero un bloque necesita ambos
+    if content_range.start is None or content_range.length is None:
+        return make_error("Se requiere Content-Range: bytes <inicio>-<fin>/<total>", 400)
+    start, stop, total = content_range.start, content_range.stop, content_range.length
+
+    # El bloque se recibe completo antes de tocar la BD: la fila queda
+    # bloqueada sólo mientras se escribe en el almacenamiento
+    try:
+        data = read_body(request.stream, RESUMABLE_CHUNK_MAX)
+    except FileTooLarge as e:
+        return make_error(str(e), 413)
+    if len(data) != stop - start:
+        return make_error("El cuerpo no coincide con Content-Range", 400)
+    if stop < total and len(data) % RESUMABLE_ALIGN:
+        return make_error(f"Los bloques no finales deben ser múltiplos de {RESUMABLE_ALIGN} bytes", 400)
+
+    cursor = mysql.connection.cursor()
+    try:
+        upload = lock_upload(cursor, upload_id)
+        if upload["total_bytes"] is None or upload["total_bytes"] != total:
+            raise UploadRejected("El total no coincide con la subida", 400)
+        if start != upload["received_bytes"]:
+            raise UploadRejected(f"Se esperaba el byte {upload['received_bytes']}", 409)
+    except UploadRejected as e:
+        return reject_upload(cursor, upload_id, e)
+
+    try:
+        received = storage.write_chunk(upload["object_name"], upload["session"], start, data, total)
+    except (IOError, ObjectNotFound) as e:
+        # received_bytes no avanza: el cliente reintenta el mismo bloque
+        mysql.connection.rollback()
+        cursor.close()
+        return make_error(f"Error del almacenamiento: {e}", 502)
+    # Se guarda lo que el almacenamiento confirma, que puede ser menos que
+    # `stop`: el cliente reanuda desde received_bytes
+    cursor.execute("UPDATE image_upload SET received_bytes = %s WHERE id = %s",
+                   (received, upload_id))
+    mysql.connection.commit()
+    cursor.close()
+
+    return make_ok({"upload_id": upload_id, "received_bytes": received, "total_bytes": total})
+
+
+@swag_from({
+    'tags': ['Imágenes'],
+    'summary': 'Progreso de una subida resumible',
+    'description': 'Devuelve received_bytes para reanudar tras un corte.',
+    'parameters': [
+        {'name': 'upload_id', 'in': 'path', 'type': 'string', 'required': True},
+        {'name': 'Authorization', 'in': 'header', 'type': 'string', 'required': True,
+         'description': 'Token Bearer. Ej: Bearer udem'}
+    ],
+    'responses': {
+        200: {'description': 'Progreso'},
+        404: {'description': 'Subida inexistente'}
+    }
+})
+@app.route("/uploads/resumable/<upload_id>", methods=["GET"])
+@require_token
+def get_upload_progress(upload_id):
+    cursor = mysql.connection.cursor()
+    cursor.execute("""
+        SELECT status AS upload_status, received_bytes, total_bytes
+        FROM image_upload WHERE id = %s
+    """, (upload_id,))
+    upload = cursor.fetchone()
+    cursor.close()
+    if not upload:
+        return make_error("La subida no existe", 404)
+    return make_ok({"upload_id": upload_id, **upload})
+
+
+# POST /uploads/resumable/<id>/finalize es complete_upload: exige todos los bytes
+app.add_url_rule("/uploads/resumable/<upload_id>/finalize", "finalize_upload",
+                 complete_upload, methods=["POST"])
+
+
 @swag_from({
     'tags': ['Imágenes'],
     'summary': 'Listar imágenes almacenadas',
@@ -237,11 +911,25 @@ def upload_image():
             'enum': ['json'],
             'required': False,
             'description': 'Formato JSON si se especifica format=json'
+        },
+        {
+            'name': 'limit',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'description': f'Imágenes por página (por defecto {PAGE_DEFAULT}, máximo {PAGE_MAX})'
+        },
+        {
+            'name': 'cursor',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'Valor de `next` de la página anterior'
         }
     ],
     'responses': {
         200: {
-            'description': 'Listado de imágenes',
+            'description': 'Listado de imágenes (más recientes primero)',
             'examples': {
                 'application/json': {
                     'status': 'ok',
@@ -253,10 +941,12 @@ def upload_image():
                             'uploaded_at': '2025-11-12 14:33:00',
                             'storage_url': 'https://...'
                         }
-                    ]
+                    ],
+                    'next': 'MjAyNS0xMS0xMiAxNDozMzowMHw0Mg'
                 }
             }
         },
+        400: {'description': 'Cursor o límite inválido'},
         401: {'description': 'Token ausente o inválido'},
         403: {'description': 'Token incorrecto'},
     }
@@ -266,11 +956,163 @@ def upload_image():
 @app.route("/images", methods=["GET"])
 @require_token
 def list_images():
+    try:
+        limit = int(request.args.get("limit", PAGE_DEFAULT))
+        after = decode_page_cursor(request.args.get("cursor"))
+    except ValueError:
+        return make_error("Parámetros de paginación inválidos", 400)
+    limit = min(max(limit, 1), PAGE_MAX)
+
+    # Recorre idx_uploaded_at (uploaded_at + id implícito) hacia atrás
+    # desde el cursor: el costo no depende de cuántas páginas hay antes
+    sql = "SELECT id, filename, mime_type, size_bytes, uploaded_at, sha256 FROM image"
+    params = []
+    if after:
+        sql += " WHERE uploaded_at < %s OR (uploaded_at = %s AND id < %s)"
+        params = [after[0], after[0], after[1]]
+    sql += " ORDER BY uploaded_at DESC, id DESC LIMIT %s"
+    params.append(limit + 1)
+
+    # Cursor sin buffer: las filas se serializan según llegan del servidor
+    cursor = mysql.connection.cursor(MySQLdb.cursors.SSDictCursor)
+    cursor.execute(sql, params)
+
+    if wants_json():
+        body, mimetype = iter_images_json(cursor, limit), "application/json"
+    else:
+        body, mimetype = iter_images_xml(cursor, limit), "application/xml"
+    return Response(stream_with_context(body), mimetype=mimetype)
+
+
+def encode_page_cursor(row):
+    raw = f"{row['uploaded_at']:%Y-%m-%d %H:%M:%S}|{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_page_cursor(value):
+    """(uploaded_at, id) de un cursor, o None; ValueError si está mal formado."""
+    if not value:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode()
+        uploaded_at, image_id = raw.split("|")
+        return datetime.datetime.strptime(uploaded_at, "%Y-%m-%d %H:%M:%S"), int(image_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(str(e))
+
+
+def iter_page(cursor, limit):
+    """(imagen, next) por fila; `next` sólo se conoce al terminar la página.
+
+    Se pide una fila de más para saber si existe una página siguiente.
+    """
+    last = None
+    try:
+        for n, row in enumerate(cursor):
+            if n == limit:
+                yield None, encode_page_cursor(last)
+                return
+            last = row
+            # Con el mismo contenido en varias filas, la firma además se comparte
+            yield {
+                "filename": row["filename"],
+                "mime_type": row["mime_type"],
+                "size_bytes": row["size_bytes"],
+                "uploaded_at": row["uploaded_at"],
+                "storage_url": image_url(image_blob_name(row), row["mime_type"])
+            }, None
+        yield None, ""
+    finally:
+        cursor.close()
+
+
+def iter_images_json(cursor, limit):
+    yield '{"status": "ok", "images": ['
+    sep = ""
+    for image, next_cursor in iter_page(cursor, limit):
+        if image is None:
+            yield f'], "next": {app.json.dumps(next_cursor or None)}}}'
+            return
+        yield sep + app.json.dumps(image)
+        sep = ", "
+
+
+def iter_images_xml(cursor, limit):
+    yield "<response><status>ok</status><images>"
+    for image, next_cursor in iter_page(cursor, limit):
+        if image is None:
+            next_el = ET.Element("next")
+            next_el.text = next_cursor
+            yield "</images>" + ET.tostring(next_el, encoding="unicode") + "</response>"
+            return
+        item_el = ET.Element("item")
+        for k, v in image.items():
+            ET.SubElement(item_el, k).text = str(v)
+        yield ET.tostring(item_el, encoding="unicode")
+
+
+@swag_from({
+    'tags': ['Imágenes'],
+    'summary': 'Descargar una imagen a través del servicio',
+    'description': 'Para clientes sin acceso directo al bucket. Admite Range (206) e '
+                   'If-None-Match (304); el ETag es el SHA-256 del contenido. Los objetos '
+                   'populares se sirven desde una caché LRU en el disco del servicio.',
+    'produces': ['image/png', 'image/jpeg', 'image/gif'],
+    'parameters': [
+        {'name': 'filename', 'in': 'path', 'type': 'string', 'required': True},
+        {'name': 'Range', 'in': 'header', 'type': 'string', 'required': False,
+         'description': 'Ej: bytes=0-1023'},
+        {'name': 'Authorization', 'in': 'header', 'type': 'string', 'required': True,
+         'description': 'Token Bearer. Ej: Bearer udem'}
+    ],
+    'responses': {
+        200: {'description': 'Contenido completo'},
+        206: {'description': 'Rango solicitado'},
+        304: {'description': 'No modificado (If-None-Match)'},
+        404: {'description': 'Imagen no encontrada'},
+        416: {'description': 'Rango no satisfacible'}
+    }
+})
+@app.route("/images/<filename>/content", methods=["GET"])
+@require_token
+def image_content(filename):
     cursor = mysql.connection.cursor()
-    cursor.execute("SELECT filename, mime_type, size_bytes, uploaded_at, storage_url FROM image ORDER BY uploaded_at DESC")
-    data = cursor.fetchall()
+    cursor.execute("SELECT filename, mime_type, sha256 FROM image WHERE filename = %s", (filename,))
+    row = cursor.fetchone()
     cursor.close()
-    return make_ok({"images": data})
+    if not row:
+        return make_error("La imagen no existe en la base de datos", 404)
+
+    # Las filas anteriores a la deduplicación no tienen hash: su blob
+    # tampoco cambia nunca, así que el nombre sirve de ETag
+    blob_name = image_blob_name(row)
+    etag = row["sha256"] or hashlib.sha256(blob_name.encode()).hexdigest()
+
+    # Revalidación sin tocar el bucket ni el disco
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        return resp
+
+    try:
+        f = object_cache.open(blob_name, storage.get)
+    except ObjectNotFound:
+        return make_error("El archivo no existe en el bucket", 404)
+
+    # Lo mismo que hace send_file, pero con el archivo ya abierto: el
+    # rango (206/416) lo resuelve make_conditional sobre el descriptor
+    size = os.fstat(f.fileno()).st_size
+    resp = Response(wrap_file(request.environ, f, CHUNK_SIZE), mimetype=row["mime_type"],
+                    direct_passthrough=True)
+    resp.set_etag(etag)
+    resp.cache_control.private = True
+    resp.cache_control.max_age = IMAGE_MAX_AGE
+    try:
+        return resp.make_conditional(request, accept_ranges=True, complete_length=size)
+    except Exception:
+        # 416 u otro error: la respuesta nunca se envía, el archivo se cierra aquí
+        f.close()
+        raise
 
 
 @swag_from({
@@ -324,19 +1166,23 @@ def list_images():
 def delete_image(filename):
     # 1) Verificar si existe en la base de datos
     cursor = mysql.connection.cursor()
-    cursor.execute("SELECT id, filename FROM image WHERE filename = %s", (filename,))
+    cursor.execute("SELECT id, filename, sha256 FROM image WHERE filename = %s", (filename,))
     row = cursor.fetchone()
 
     if not row:
         cursor.close()
         return make_error("La imagen no existe en la base de datos", 404)
 
-    # 2) Eliminar el archivo del bucket
-    blob = bucket.blob(filename)
-
+    # 2) Eliminar el archivo del bucket (sólo si ninguna otra imagen lo usa;
+    #    las filas anteriores a la deduplicación guardan el blob con su filename)
+    blob_name = release_blob(cursor, row["sha256"]) if row["sha256"] else filename
     try:
-        blob.delete()
+        if blob_name:
+            storage.delete(blob_name)
+            signed_urls.discard(blob_name)
+            object_cache.discard(blob_name)
     except Exception as e:
+        mysql.connection.rollback()
         cursor.close()
         return make_error(f"No se pudo eliminar el archivo del bucket: {str(e)}", 500)
 
@@ -352,11 +1198,189 @@ def delete_image(filename):
     })
 
 
+def delete_objects(names):
+    """Borra varios objetos en paralelo; {nombre: None o mensaje de error}."""
+    def delete_one(name):
+        try:
+            storage.delete(name)
+        except ObjectNotFound:
+            pass   # ya no estaba: el objetivo se cumple
+        except Exception as e:
+            return str(e)
+        signed_urls.discard(name)
+        object_cache.discard(name)
+        return None
+
+    names = list(names)
+    if not names:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(DELETE_WORKERS, len(names))) as pool:
+        return dict(zip(names, pool.map(delete_one, names)))
+
+
+def lock_blob_refs(cursor, shas):
+    """Bloquea las filas de image_blob en orden de sha256; {sha256: ref_count}."""
+    shas = sorted(set(shas))
+    if not shas:
+        return {}
+    marks = ",".join(["%s"] * len(shas))
+    cursor.execute(f"SELECT sha256, ref_count FROM image_blob WHERE sha256 IN ({marks}) "
+                   f"ORDER BY sha256 FOR UPDATE", shas)
+    return {r["sha256"]: r["ref_count"] for r in cursor.fetchall()}
+
+
+@swag_from({
+    'tags': ['Imágenes'],
+    'summary': 'Eliminar varias imágenes',
+    'description': 'Resuelve todos los archivos con una consulta, borra los blobs en paralelo '
+                   'y elimina los registros con un solo DELETE. Devuelve el estado de cada archivo.',
+    'parameters': [
+        {'name': 'Authorization', 'in': 'header', 'type': 'string', 'required': True,
+         'description': 'Token Bearer. Ej: Bearer udem'},
+        {'name': 'body', 'in': 'body', 'required': True,
+         'schema': {'type': 'object', 'properties': {
+             'filenames': {'type': 'array', 'items': {'type': 'string'}}}}},
+        {'name': 'format', 'in': 'query', 'type': 'string', 'enum': ['json'], 'required': False,
+         'description': 'Formato JSON si se especifica format=json'}
+    ],
+    'responses': {
+        200: {
+            'description': 'Resultado por archivo (deleted, not_found o error)',
+            'examples': {
+                'application/json': {
+                    'status': 'ok',
+                    'deleted': 1,
+                    'results': [
+                        {'filename': 'abc123_foto.jpg', 'status': 'deleted', 'message': ''},
+                        {'filename': 'nope.jpg', 'status': 'not_found', 'message': ''}
+                    ]
+                }
+            }
+        },
+        400: {'description': 'Lista inválida o demasiado grande'},
+        401: {'description': 'Token ausente o inválido'},
+        403: {'description': 'Token incorrecto'}
+    }
+})
+@app.route("/images/delete", methods=["POST"])
+@require_token
+def delete_images():
+    data = request.get_json(silent=True) or {}
+    filenames = data.get("filenames")
+    if not isinstance(filenames, list) or not all(isinstance(f, str) for f in filenames):
+        return make_error("Se requiere 'filenames': lista de nombres", 400)
+    filenames = list(dict.fromkeys(filenames))
+    if len(filenames) > BATCH_DELETE_MAX:
+        return make_error(f"Máximo {BATCH_DELETE_MAX} archivos por petición", 400)
+    if not filenames:
+        return make_ok({"deleted": 0, "results": []})
+
+    # 1) Mismo orden de candados que upload_image y delete_image: primero
+    #    image_blob (por sha256), después image. El sha256 de una fila no
+    #    cambia, así que se averigua con una lectura sin candados
+    cursor = mysql.connection.cursor()
+    marks = ",".join(["%s"] * len(filenames))
+    cursor.execute(f"SELECT DISTINCT sha256 FROM image WHERE filename IN ({marks}) "
+                   f"AND sha256 IS NOT NULL", filenames)
+    ref_counts = lock_blob_refs(cursor, [r["sha256"] for r in cursor.fetchall()])
+
+    cursor.execute(f"SELECT id, filename, sha256 FROM image WHERE filename IN ({marks}) FOR UPDATE",
+                   filenames)
+    rows = cursor.fetchall()
+
+    # 2) Referencias que se liberan por blob; un blob se borra sólo si
+    #    todas sus referencias están en el lote
+    per_sha = {}
+    for row in rows:
+        if row["sha256"]:
+            per_sha[row["sha256"]] = per_sha.get(row["sha256"], 0) + 1
+    missing = [sha for sha in per_sha if sha not in ref_counts]
+    if missing:
+        ref_counts.update(lock_blob_refs(cursor, missing))
+
+    def blob_to_delete(row):
+        if not row["sha256"]:
+            return row["filename"]   # fila anterior a la deduplicación
+        if ref_counts.get(row["sha256"], 0) <= per_sha[row["sha256"]]:
+            return blob_name_for(row["sha256"])
+        return None
+
+    # 3) Blobs en paralelo
+    errors = delete_objects({blob_to_delete(r) for r in rows} - {None})
+
+    # 4) Sólo se eliminan las filas cuyo blob se borró (o sigue en uso)
+    done = [r for r in rows if not errors.get(blob_to_delete(r))]
+    if done:
+        marks = ",".join(["%s"] * len(done))
+        cursor.execute(f"DELETE FROM image WHERE id IN ({marks})", [r["id"] for r in done])
+
+        released = {}
+        for r in done:
+            if r["sha256"]:
+                released[r["sha256"]] = released.get(r["sha256"], 0) + 1
+        gone = [sha for sha, n in released.items() if ref_counts.get(sha, 0) <= n]
+        kept = [(sha, n) for sha, n in released.items() if ref_counts.get(sha, 0) > n]
+        if gone:
+            marks = ",".join(["%s"] * len(gone))
+            cursor.execute(f"DELETE FROM image_blob WHERE sha256 IN ({marks})", gone)
+        if kept:
+            case_whens = " ".join(["WHEN %s THEN %s"] * len(kept))
+            marks = ",".join(["%s"] * len(kept))
+            params = [v for pair in kept for v in pair] + [sha for sha, _ in kept]
+            cursor.execute(f"UPDATE image_blob SET ref_count = ref_count - CASE sha256 {case_whens} END "
+                           f"WHERE sha256 IN ({marks})", params)
+    mysql.connection.commit()
+    cursor.close()
+
+    # 5) Estado por archivo, en el orden recibido
+    by_name = {r["filename"]: r for r in rows}
+    results = []
+    for filename in filenames:
+        row = by_name.get(filename)
+        if row is None:
+            results.append({"filename": filename, "status": "not_found", "message": ""})
+            continue
+        error = errors.get(blob_to_delete(row))
+        if error:
+            results.append({"filename": filename, "status": "error",
+                            "message": f"No se pudo eliminar el archivo del bucket: {error}"})
+        else:
+            results.append({"filename": filename, "status": "deleted", "message": ""})
+
+    return make_ok({"deleted": len(done), "results": results})
+
+
+if isinstance(storage, LocalStorage):
+    @app.route("/storage/<path:name>", methods=["GET"])
+    def local_storage_object(name):
+        """Sirve los objetos del backend local (sólo desarrollo / pruebas)."""
+        return send_from_directory(storage.root, name)
+
+    @app.route("/storage/<path:name>", methods=["PUT"])
+    def local_storage_put(name):
+        """Recibe subidas con URL firmada: el equivalente local del PUT a GCS."""
+        if not storage.verify_put(name, request.args.get("expires"),
+                                  request.args.get("signature"), request.mimetype):
+            return make_error("Firma inválida o expirada", 403)
+        try:
+            storage.put(name, LimitedStream(request.stream, MAX_SIZE))
+        except FileTooLarge as e:
+            return make_error(str(e), 413)
+        return "", 200
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    return make_error(f"La petición supera {MAX_SIZE // (1024 * 1024)} MB", 413)
+
+
 @app.route("/", methods=["GET"])
 def root():
     return make_ok({
         "message": "Microservicio Flask GCS funcionando correctamente",
-        "routes": ["/upload (POST)", "/images (GET)"],
+        "routes": ["/upload (POST)", "/uploads (POST)", "/uploads/<id>/complete (POST)",
+                   "/uploads/resumable (POST, PUT, GET)", "/images (GET)",
+                   "/images/<filename>/content (GET)", "/images/delete (POST)"],
         "auth": "Authorization: Bearer <token>",
         "format": "XML por defecto, JSON con ?format=json"
     })
@@ -366,6 +1390,7 @@ def root():
 # MAIN
 # -----------------------------
 if __name__ == "__main__":
+    # Producción: BIND=0.0.0.0:5000 gunicorn -c ../gunicorn.conf.py app:app
     port = int(os.getenv("PORT", 5000))
-    app.run(host="0.0.0.0", port=port)
+    app.run(host="0.0.0.0", port=port, threaded=True)
 
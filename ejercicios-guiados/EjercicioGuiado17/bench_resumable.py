@@ -0,0 +1,160 @@
+# ------------------------------------------
+# Benchmark de subida sobre un enlace lento que se corta
+# Compara POST /upload (un solo cuerpo: cada corte obliga a empezar de
+# cero) con la subida resumible por bloques (tras un corte se pregunta
+# received_bytes y se sigue desde ahí). El enlace se simula en el cliente:
+# se limita la velocidad de envío y se cierra el socket cada N MB.
+# Sólo usa la biblioteca estándar.
+#
+#   STORAGE_BACKEND=local python3 app.py
+#   python3 bench_resumable.py --size-mb 12 --rate-kb 2048 --drop-every-mb 5 --drops 2
+# ------------------------------------------
+
+import argparse
+import http.client
+import json
+import os
+import time
+import uuid
+from urllib.parse import urlsplit
+
+SEND_PIECE = 16 * 1024
+
+
+class LinkDropped(Exception):
+    pass
+
+
+class ThrottledLink:
+    """Envía a `rate` bytes/s y corta la conexión cada `drop_every` bytes,
+    como máximo `drops` veces (contando todos los intentos)."""
+
+    def __init__(self, rate, drop_every, drops):
+        self.rate = rate
+        self.drop_every = drop_every
+        self.drops_left = drops
+        self.until_drop = drop_every
+        self.sent = 0
+
+    def send(self, conn, data):
+        view = memoryview(data)
+        for i in range(0, len(view), SEND_PIECE):
+            piece = view[i:i + SEND_PIECE]
+            if self.drops_left and len(piece) >= self.until_drop:
+                conn.sock.sendall(piece[:self.until_drop])
+                self.sent += self.until_drop
+                self.drops_left -= 1
+                self.until_drop = self.drop_every
+                conn.close()
+                raise LinkDropped()
+            conn.sock.sendall(piece)
+            self.sent += len(piece)
+            if self.drops_left:
+                self.until_drop -= len(piece)
+            time.sleep(len(piece) / self.rate)
+
+
+class Client:
+
+    def __init__(self, base_url, token, link):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.token = token
+        self.link = link
+
+    def request(self, method, path, body=b"", headers=None):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            conn.putrequest(method, path)
+            for k, v in {"Authorization": f"Bearer {self.token}",
+                         "Content-Length": str(len(body)), **(headers or {})}.items():
+                conn.putheader(k, v)
+            conn.endheaders()
+            if body:
+                self.link.send(conn, body)
+            resp = conn.getresponse()
+            return resp.status, json.loads(resp.read() or b"{}")
+        finally:
+            conn.close()
+
+    def post_json(self, path, payload):
+        return self.request("POST", path, json.dumps(payload).encode(),
+                            {"Content-Type": "application/json"})
+
+
+def single_upload(client, payload):
+    """POST /upload multipart; tras un corte se reenvía el archivo entero."""
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="image"; filename="bench.png"\r\n'
+            "Content-Type: image/png\r\n\r\n").encode() + payload + f"\r\n--{boundary}--\r\n".encode()
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            status, _ = client.request("POST", "/upload?format=json", body, {
+                "Content-Type": f"multipart/form-data; boundary={boundary}"})
+            return status, attempts
+        except (LinkDropped, ConnectionError):
+            continue
+
+
+def resumable_upload(client, payload, chunk_size):
+    """init + PUT por bloques; tras un corte se consulta el progreso y se sigue."""
+    total = len(payload)
+    status, data = client.post_json("/uploads/resumable?format=json", {
+        "filename": "bench.png", "mime_type": "image/png", "size_bytes": total})
+    if status != 200:
+        return status, 1
+    upload_id = data["upload_id"]
+    chunk_size = chunk_size or data["chunk_size"]
+    path = f"/uploads/resumable/{upload_id}?format=json"
+
+    attempts, offset = 1, 0
+    while offset < total:
+        stop = min(offset + chunk_size, total)
+        try:
+            status, data = client.request("PUT", path, payload[offset:stop], {
+                "Content-Type": "application/octet-stream",
+                "Content-Range": f"bytes {offset}-{stop - 1}/{total}"})
+        except (LinkDropped, ConnectionError):
+            attempts += 1
+            status, data = client.request("GET", path)
+            offset = data["received_bytes"]
+            continue
+        if status != 200:
+            return status, attempts
+        offset = data["received_bytes"]
+
+    status, _ = client.request("POST", f"/uploads/resumable/{upload_id}/finalize?format=json")
+    return status, attempts
+
+
+def run(label, upload, args, payload):
+    link = ThrottledLink(args.rate_kb * 1024, int(args.drop_every_mb * 1024 * 1024), args.drops)
+    client = Client(args.url, args.token, link)
+    t0 = time.perf_counter()
+    status, attempts = upload(client, payload)
+    elapsed = time.perf_counter() - t0
+    mb = len(payload) / (1024 * 1024)
+    print(f"{label:<10} | status {status} | {elapsed:7.2f}s | intentos {attempts:>2} | "
+          f"enviados {link.sent / (1024 * 1024):6.1f} MB para {mb:.1f} MB | "
+          f"{mb / elapsed:5.2f} MB/s efectivos")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--token", default=os.getenv("API_TOKEN", "udem"))
+    parser.add_argument("--size-mb", type=float, default=12)
+    parser.add_argument("--rate-kb", type=int, default=2048, help="velocidad del enlace (KB/s)")
+    parser.add_argument("--drop-every-mb", type=float, default=5)
+    parser.add_argument("--drops", type=int, default=2, help="cortes antes de estabilizarse")
+    parser.add_argument("--chunk-kb", type=int, default=0,
+                        help="bloque resumible (múltiplo de 256); 0 = el que sugiere el servidor")
+    args = parser.parse_args()
+
+    payload = os.urandom(int(args.size_mb * 1024 * 1024))
+    chunk_size = args.chunk_kb * 1024
+    run("single", single_upload, args, payload)
+    run("resumible", lambda client, data: resumable_upload(client, data, chunk_size), args, payload)
@@ -0,0 +1,57 @@
+# ------------------------------------------
+# Benchmark de subida / eliminación contra el backend de almacenamiento
+# Por defecto usa el backend local en un directorio temporal: no requiere
+# credenciales de GCS ni red.
+#
+#   python3 bench_storage.py --files 500 --size-kb 256 --workers 8
+#   STORAGE_BACKEND=gcs GCS_BUCKET=mi-bucket python3 bench_storage.py
+# ------------------------------------------
+
+import argparse
+import io
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from storage_backend import create_storage
+
+
+def run(storage, files, size, workers):
+    payload = os.urandom(size)
+    names = [f"bench/{uuid.uuid4().hex}.bin" for _ in range(files)]
+
+    def upload(name):
+        storage.put(name, io.BytesIO(payload), content_type="application/octet-stream")
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(upload, names))
+    t_up = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(storage.delete, names))
+    t_del = time.perf_counter() - t0
+
+    mb = files * size / (1024 * 1024)
+    print(f"📤 Subida    → {files} objetos en {t_up:.3f}s | "
+          f"{files / t_up:.1f} obj/s | {mb / t_up:.1f} MB/s")
+    print(f"🗑️  Borrado   → {files} objetos en {t_del:.3f}s | {files / t_del:.1f} obj/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--size-kb", type=int, default=512)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    kind = os.getenv("STORAGE_BACKEND", "local")
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = create_storage(kind, bucket=os.getenv("GCS_BUCKET"),
+                                 root=tmp, base_url="http://localhost/storage")
+        print(f"Backend: {kind} | {args.files} archivos de {args.size_kb} KB | "
+              f"{args.workers} hilos")
+        run(storage, args.files, args.size_kb * 1024, args.workers)
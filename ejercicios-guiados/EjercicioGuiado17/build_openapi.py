@@ -0,0 +1,20 @@
+# ------------------------------------------
+# Genera openapi.json a partir de los @swag_from de app.py
+# Se ejecuta al construir/desplegar el servicio; con el archivo presente,
+# app.py lo sirve tal cual y arranca sin importar Flasgger.
+#
+#   python3 build_openapi.py
+# ------------------------------------------
+
+import json
+import os
+
+os.environ["SWAGGER_LIVE"] = "1"
+
+import app  # noqa: E402
+
+if __name__ == "__main__":
+    spec = app.app.test_client().get("/apispec_1.json").get_json()
+    with open(app.OPENAPI_SPEC, "w", encoding="utf-8") as f:
+        json.dump(spec, f, ensure_ascii=False, indent=1)
+    print(f"📘 {len(spec.get('paths', {}))} rutas → {app.OPENAPI_SPEC}")
@@ -12,3 +12,17 @@ MYSQL_DB=Images
 GCS_BUCKET=pablocc-img
 GCS_PUBLIC=0
 GOOGLE_APPLICATION_CREDENTIALS=/home/pablocomputer23/Microservices/buckets/key-gcs.json
+
+# Almacenamiento: gcs (por defecto) o local para pruebas sin credenciales
+STORAGE_BACKEND=gcs
+LOCAL_STORAGE_DIR=./storage
+LOCAL_STORAGE_URL=http://localhost:5000/storage
+# Firma HMAC de las URLs de subida locales (fijar si hay varios procesos)
+LOCAL_STORAGE_SECRET=
+UPLOAD_URL_TTL_MIN=15
+# Margen para llamar a /complete después de que vence la URL de subida
+UPLOAD_COMPLETE_GRACE_MIN=60
+
+# Caché en disco de /images/<filename>/content (tamaño máximo por worker)
+IMAGE_CACHE_DIR=./cache
+IMAGE_CACHE_MB=512
@@ -11,7 +11,46 @@ CREATE TABLE IF NOT EXISTS image (
   size_bytes      BIGINT UNSIGNED  NOT NULL,
   uploaded_at     DATETIME         NOT NULL DEFAULT CURRENT_TIMESTAMP,
   storage_url      TEXT             NOT NULL,
+  sha256          CHAR(64)         DEFAULT NULL,
   PRIMARY KEY (id),
   KEY idx_uploaded_at (uploaded_at),
-  KEY idx_filename (filename)
+  KEY idx_filename (filename),
+  KEY idx_sha256 (sha256)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Blobs direccionados por contenido (blobs/<sha256> en el bucket).
+-- ref_count = número de filas de `image` que apuntan al blob.
+CREATE TABLE IF NOT EXISTS image_blob (
+  sha256          CHAR(64)         NOT NULL,
+  mime_type       VARCHAR(100)     NOT NULL,
+  size_bytes      BIGINT UNSIGNED  NOT NULL,
+  ref_count       INT UNSIGNED     NOT NULL DEFAULT 1,
+  created_at      DATETIME         NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (sha256)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Subidas directas al bucket con URL de PUT firmada (POST /uploads).
+-- El objeto vive en uploads/<id> hasta /uploads/<id>/complete, que lo
+-- mueve a blobs/<sha256>. Conviene una regla de ciclo de vida en el bucket
+-- que borre uploads/ con más de un día (subidas abandonadas).
+CREATE TABLE IF NOT EXISTS image_upload (
+  id              CHAR(32)         NOT NULL,
+  filename        VARCHAR(255)     NOT NULL,
+  mime_type       VARCHAR(100)     NOT NULL,
+  object_name     VARCHAR(255)     NOT NULL,
+  status          ENUM('pending', 'complete') NOT NULL DEFAULT 'pending',
+  created_at      DATETIME         NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  expires_at      DATETIME         NOT NULL,
+  -- Sólo subidas resumibles (POST /uploads/resumable): tamaño total,
+  -- bytes ya escritos en el bucket y sesión del backend (URL en GCS)
+  total_bytes     BIGINT UNSIGNED  DEFAULT NULL,
+  received_bytes  BIGINT UNSIGNED  NOT NULL DEFAULT 0,
+  session         TEXT             DEFAULT NULL,
+  PRIMARY KEY (id),
+  KEY idx_status_created (status, created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Instalaciones existentes:
+-- ALTER TABLE image ADD COLUMN IF NOT EXISTS sha256 CHAR(64) DEFAULT NULL, ADD KEY idx_sha256 (sha256);
+-- ALTER TABLE image_upload ADD COLUMN total_bytes BIGINT UNSIGNED DEFAULT NULL,
+--   ADD COLUMN received_bytes BIGINT UNSIGNED NOT NULL DEFAULT 0, ADD COLUMN session TEXT DEFAULT NULL;
@@ -0,0 +1,166 @@
+# ------------------------------------------
+# Caché en disco de objetos del bucket
+# Descripción: copia local (LRU acotada en bytes) de los objetos que se
+#              sirven por el microservicio; los populares se leen del disco
+#              en lugar de volver a descargarse del bucket
+# Autor: Pablo Celedón Cabriales
+# ------------------------------------------
+
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+
+from storage_backend import CHUNK_SIZE
+
+
+class DiskLRUCache:
+    """Objetos del bucket guardados como archivos bajo `root/<pid>`.
+
+    Cada proceso (worker de gunicorn) usa su propio subdirectorio y su
+    propio índice LRU, así que `max_bytes` es el límite POR WORKER: en disco
+    se ocupan hasta workers × max_bytes. Con un directorio compartido, un
+    worker borraría al desalojar archivos que los demás creen tener.
+    Los blobs/<sha256> son inmutables, así que una copia nunca queda
+    desactualizada; al borrar una imagen se llama a `discard`.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pid = None
+        self._reset()
+
+    def _reset(self):
+        # Tras un fork el hijo empieza con índice y subdirectorio propios
+        self._pid = os.getpid()
+        self.dir = os.path.join(self.root, str(self._pid))
+        self.size = 0
+        self._entries = OrderedDict()   # nombre -> bytes
+        self._loading = {}              # nombre -> candado de la descarga en curso
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        shutil.rmtree(self.dir, ignore_errors=True)
+        os.makedirs(self.dir, exist_ok=True)
+        self._remove_orphans()
+
+    def _remove_orphans(self):
+        # Subdirectorios de workers que ya terminaron (reciclados por max_requests)
+        for entry in os.listdir(self.root):
+            if not entry.isdigit() or int(entry) == self._pid:
+                continue
+            try:
+                os.kill(int(entry), 0)
+            except ProcessLookupError:
+                shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
+            except PermissionError:
+                pass
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+    def _path(self, name, folder=None):
+        return os.path.join(folder or self.dir, hashlib.sha256(name.encode()).hexdigest())
+
+    def open(self, name, fetch):
+        """Archivo binario abierto con el objeto; `fetch(name)` lo descarga si falta.
+
+        Se devuelve el archivo ya abierto: aunque otro hilo lo desaloje
+        mientras se envía, el descriptor sigue siendo válido.
+        """
+        self._check_pid()
+        path = self._path(name)
+        with self._lock:
+            if name in self._entries:
+                try:
+                    f = open(path, "rb")
+                    self._entries.move_to_end(name)
+                    self.hits += 1
+                    return f
+                except FileNotFoundError:
+                    self.size -= self._entries.pop(name)
+            loading = self._loading.setdefault(name, threading.Lock())
+
+        # Una sola descarga por objeto: los demás hilos esperan y leen el archivo
+        with loading:
+            try:
+                try:
+                    f = open(path, "rb")
+                    hit = True
+                except FileNotFoundError:
+                    self._download(name, path, fetch)
+                    f = open(path, "rb")
+                    hit = False
+            finally:
+                with self._lock:
+                    self._loading.pop(name, None)
+            size = os.fstat(f.fileno()).st_size
+
+            with self._lock:
+                if name not in self._entries:
+                    self._entries[name] = size
+                    self.size += size
+                self._entries.move_to_end(name)
+                if hit:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                self._evict()
+        return f
+
+    def _download(self, name, path, fetch):
+        # Temporal + rename: un lector nunca ve un objeto a medias
+        tmp = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            with fetch(name) as src, open(tmp, "wb") as out:
+                shutil.copyfileobj(src, out, CHUNK_SIZE)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _evict(self):
+        # El más reciente se conserva aunque por sí solo supere el límite
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+
+    def discard(self, name):
+        """Borra el objeto de este worker y las copias de los demás.
+
+        Los otros workers lo descubren al abrirlo (FileNotFoundError) y
+        corrigen su índice.
+        """
+        self._check_pid()
+        with self._lock:
+            size = self._entries.pop(name, None)
+            if size is not None:
+                self.size -= size
+        for entry in os.listdir(self.root):
+            try:
+                os.remove(self._path(name, os.path.join(self.root, entry)))
+            except (FileNotFoundError, NotADirectoryError):
+                pass
+
+    def stats(self):
+        return {
+            "dir": self.dir,
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
@@ -0,0 +1,64 @@
+# ------------------------------------------
+# Caché de URLs firmadas
+# Descripción: firmar (RSA) es caro; cada URL se firma una vez por blob y
+#              se reutiliza hasta que le queda poco para expirar
+# Autor: Pablo Celedón Cabriales
+# ------------------------------------------
+
+import datetime
+import threading
+import time
+from collections import OrderedDict
+
+
+class SignedURLCache:
+    """URL firmada por (nombre de blob, mime), renovada sólo cerca de su expiración.
+
+    El mime forma parte de la clave porque la firma fija el Content-Type
+    de la respuesta: el mismo blob pedido con otro tipo es otra URL.
+
+    `sign(name, mime, expires)` genera la URL; `ttl` es su vigencia y
+    `margin` el tiempo mínimo de vida que debe quedarle a una URL para
+    entregarla (un cliente que la recibe debe alcanzar a usarla).
+    """
+
+    def __init__(self, sign, ttl=datetime.timedelta(hours=1),
+                 margin=datetime.timedelta(minutes=10), max_entries=10000):
+        self.sign = sign
+        self.ttl = ttl
+        self.margin = margin.total_seconds()
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # (nombre, mime) -> (url, expira_en)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.signs = 0
+
+    def get(self, name, mime=None):
+        key = (name, mime)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] - now > self.margin:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        # Se firma fuera del candado: dos hilos pueden firmar el mismo blob
+        # a la vez, lo cual es inofensivo
+        url = self.sign(name, mime, self.ttl)
+        with self._lock:
+            self._entries[key] = (url, now + self.ttl.total_seconds())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.signs += 1
+        return url
+
+    def discard(self, name):
+        """Olvida las URLs de `name` con cualquier mime."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == name]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
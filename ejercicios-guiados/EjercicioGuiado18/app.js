@@ -51,7 +51,20 @@ function setTokens(access, refresh) {
 }
 
 function authHeaders() {
-    return { "Authorization": "Bearer " + accessToken };
+    const headers = { "Authorization": "Bearer " + accessToken };
+    // Tras subir/borrar imágenes, leer de la BD primaria para ver el cambio
+    // (sólo mientras la marca esté vigente; vencida, se olvida)
+    if (readPrimaryUntil && Number(readPrimaryUntil) <= Date.now() / 1000) readPrimaryUntil = null;
+    if (readPrimaryUntil) headers["X-Read-Primary-Until"] = readPrimaryUntil;
+    return headers;
+}
+
+// Marca devuelta por Libros en cada escritura (segundos epoch)
+let readPrimaryUntil = null;
+
+function rememberWrite(res) {
+    const until = res.headers.get("X-Read-Primary-Until");
+    if (until) readPrimaryUntil = until;
 }
 
 // ================================================================
@@ -195,6 +208,36 @@ document.getElementById("btnClearTokens").addEventListener("click", () => {
     log("Tokens borrados.");
 });
 
+// =====================================================================
+//  AUTOCOMPLETADO (índice en memoria de main.py, sin pasar por /books)
+// =====================================================================
+let suggestTimer = null;
+
+document.getElementById("searchText").addEventListener("input", e => {
+    clearTimeout(suggestTimer);
+    const prefix = e.target.value.trim();
+    if (prefix.length < 2) return;
+    suggestTimer = setTimeout(() => loadSuggestions(prefix), 150);
+});
+
+async function loadSuggestions(prefix) {
+    const url = `${librosBase()}/api/books/suggest?prefix=${encodeURIComponent(prefix)}&limit=8`;
+    try {
+        const res = await fetch(url);
+        const xml = new DOMParser().parseFromString(await res.text(), "application/xml");
+        const list = document.getElementById("searchSuggestions");
+        list.innerHTML = "";
+        xml.querySelectorAll("suggestion").forEach(s => {
+            const opt = document.createElement("option");
+            opt.value = s.querySelector("title").textContent;
+            opt.label = s.querySelector("author").textContent;
+            list.appendChild(opt);
+        });
+    } catch (err) {
+        log("Error autocompletado → " + err);
+    }
+}
+
 // =====================================================================
 //  LISTAR LIBROS
 // =====================================================================
@@ -299,8 +342,16 @@ function renderBookImages(images) {
     images.forEach(imgObj => {
         const div = document.createElement("div");
         div.className = "imgBox";
+        // Miniatura WebP/JPEG si ya se generó; si no, la imagen original
+        const original = imgObj.url || imgObj.image_url;
+        const thumb = imgObj.thumb_url || original;
+        const webp = imgObj.thumb_webp_url
+            ? `<source srcset="${imgObj.thumb_webp_url}" type="image/webp" />`
+            : "";
         div.innerHTML = `
-            <img src="${imgObj.url || imgObj.image_url}" />
+            <a href="${original}" target="_blank">
+                <picture>${webp}<img src="${thumb}" loading="lazy" /></picture>
+            </a>
             <button class="btn danger small" onclick="deleteImage(${imgObj.image_id})">
                 Borrar
             </button>
@@ -344,6 +395,7 @@ async function uploadImages() {
             body: form
         });
 
+        rememberWrite(res);
         const text = await res.text();
         log("Upload XML: " + text);
 
@@ -368,6 +420,7 @@ async function deleteImage(imageId) {
             method: "DELETE"
         });
 
+        rememberWrite(res);
         const text = await res.text();
         log("DELETE XML → " + text);
 
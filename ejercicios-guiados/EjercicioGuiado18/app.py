@@ -1,7 +1,9 @@
+import os
+import json
 import time
 import logging
 from datetime import datetime, timedelta
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_mysqldb import MySQL
 import redis
 import requests
@@ -9,14 +11,19 @@ import xml.etree.ElementTree as ET
 from flask_cors import CORS
 from passlib.hash import sha256_crypt
 import jwt
+from libros_client import LibrosClient
+from books_cache import BooksCache, normalize_query
+from token_cache import VerifiedTokenCache
 
 # ===========================
 # CONFIGURACIÓN
 # ===========================
 LIBROS_HOST = "http://34.45.141.126:5001"  # microservicio Libros
+# Sesión compartida con keep-alive hacia Libros (una conexión por hilo)
+libros = LibrosClient(LIBROS_HOST)
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["Server-Timing", "X-Cache"])
 
 # MariaDB: autenticación JWT
 app.config['MYSQL_HOST'] = 'localhost'
@@ -29,6 +36,27 @@ mysql = MySQL(app)
 # Redis
 r = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
 
+# Caché de /books (JSON ya parseado) por búsqueda normalizada
+# (BOOKS_CACHE_TTL=0 la desactiva: la respuesta se transmite en streaming)
+BOOKS_CACHE_TTL = int(os.getenv("BOOKS_CACHE_TTL", 30))
+books_cache = BooksCache(r, ttl=BOOKS_CACHE_TTL)
+
+# Tamaño de los trozos en que se lee y parsea el XML de Libros
+LIBROS_STREAM_CHUNK = 64 * 1024
+
+
+def init_worker():
+    """Pools de Redis y de HTTP a Libros propios del worker, del tamaño del
+    número de hilos (gunicorn post_fork)."""
+    global r, libros, books_cache
+    pool = redis.BlockingConnectionPool(
+        host='localhost', port=6379, db=0, decode_responses=True,
+        max_connections=int(os.getenv("DB_POOL_SIZE", 8)), timeout=2
+    )
+    r = redis.Redis(connection_pool=pool)
+    libros = LibrosClient(LIBROS_HOST)
+    books_cache = BooksCache(r, ttl=BOOKS_CACHE_TTL)
+
 # JWT
 SECRET_KEY = "super_secret_jwt_key"
 ALGORITHM = "HS256"
@@ -50,12 +78,45 @@ def create_token(username, expires_minutes):
     }
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
-def decode_token(token):
+def verify_token(token):
     try:
         return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except:
         return None
 
+def token_revoked(digest, payload):
+    """Lista negra compartida por los workers: tokens sueltos y usuarios
+    completos (revoked_sub:<sub> = iat mínimo aceptado)."""
+    try:
+        token_flag, cutoff = r.mget(f"revoked:{digest}", f"revoked_sub:{payload.get('sub')}")
+    except redis.RedisError as e:
+        # Sin Redis no se bloquea el acceso: quedan las revocaciones locales
+        log.warning(f"No se pudo consultar la lista de revocados: {e}")
+        return False
+    return bool(token_flag) or (cutoff is not None and payload.get("iat", 0) < int(cutoff))
+
+# Payload verificado por token hasta su exp: las peticiones repetidas no
+# vuelven a verificar la firma
+verified_tokens = VerifiedTokenCache(verify_token, is_revoked=token_revoked)
+
+def decode_token(token):
+    return verified_tokens.decode(token)
+
+def revoke_token(token, payload):
+    digest = verified_tokens.revoke(token, payload["exp"])
+    try:
+        r.setex(f"revoked:{digest}", max(1, int(payload["exp"] - time.time()) + 1), 1)
+    except redis.RedisError as e:
+        log.warning(f"No se pudo publicar la revocación: {e}")
+
+def revoke_user_tokens(username):
+    # Ningún token dura más que el refresh: la marca puede expirar después
+    cutoff = verified_tokens.revoke_subject(username)
+    try:
+        r.setex(f"revoked_sub:{username}", REFRESH_EXPIRES_MIN * 60, cutoff)
+    except redis.RedisError as e:
+        log.warning(f"No se pudo publicar la revocación: {e}")
+
 # ===========================
 # MARIA DB
 # ===========================
@@ -178,47 +239,142 @@ def refresh():
     new_access = create_token(payload["sub"], ACCESS_EXPIRES_MIN)
     return jsonify({"ok": True, "access_token": new_access})
 
+# ===========================
+# LOGOUT (revocación)
+# ===========================
+@app.route("/logout", methods=["POST"])
+def logout():
+    """Revoca el access token (y el refresh_token del cuerpo); all=true revoca
+    todos los tokens del usuario emitidos hasta ahora."""
+    auth = request.headers.get("Authorization", "")
+    if not auth.startswith("Bearer "):
+        return jsonify({"ok": False, "error": "Token requerido"}), 401
+    token = auth.split(" ", 1)[1]
+    payload = decode_token(token)
+    if not payload:
+        return jsonify({"ok": False, "error": "Token inválido"}), 401
+
+    revoke_token(token, payload)
+    data = request.get_json(silent=True) or {}
+    refresh_token = data.get("refresh_token")
+    if refresh_token:
+        refresh_payload = decode_token(refresh_token)
+        if refresh_payload and refresh_payload.get("sub") == payload["sub"]:
+            revoke_token(refresh_token, refresh_payload)
+    if data.get("all"):
+        revoke_user_tokens(payload["sub"])
+    return jsonify({"ok": True, "message": "Sesión cerrada"})
+
 # ===========================
 # PARSEAR XML DE LIBROS (CON IMÁGENES)
 # ===========================
-def libros_xml_to_json(xml_bytes):
-    root = ET.fromstring(xml_bytes)
-    out = []
-
-    for book in root.findall("book"):
-
-        row = {
-            "book_id": book.findtext("book_id", ""),
-            "isbn": book.findtext("isbn", ""),
-            "title": book.findtext("title", ""),
-            "author": book.findtext("author", ""),
-            "publisher": book.findtext("publisher", ""),
-            "year": book.findtext("year", ""),
-            "genre": book.findtext("genre", ""),
-            "price": book.findtext("price", ""),
-            "stock": book.findtext("stock", ""),
-            "format": book.findtext("format", "")
-        }
+def book_row(book):
+    row = {
+        "book_id": book.findtext("book_id", ""),
+        "isbn": book.findtext("isbn", ""),
+        "title": book.findtext("title", ""),
+        "author": book.findtext("author", ""),
+        "publisher": book.findtext("publisher", ""),
+        "year": book.findtext("year", ""),
+        "genre": book.findtext("genre", ""),
+        "price": book.findtext("price", ""),
+        "stock": book.findtext("stock", ""),
+        "format": book.findtext("format", "")
+    }
 
-        # -------- NUEVO: procesar imágenes --------
-        images = []
-        images_parent = book.find("images")
+    # -------- NUEVO: procesar imágenes --------
+    images = []
+    images_parent = book.find("images")
 
-        if images_parent is not None:
-            for img in images_parent.findall("image"):
-                images.append({
-                    "image_id": img.findtext("image_id", ""),
-                    "url": img.findtext("image_url", ""),
-                    "is_primary": img.findtext("is_primary", "0") == "1",
-                    "sort_order": img.findtext("sort_order", "0")
-                })
+    if images_parent is not None:
+        for img in images_parent.findall("image"):
+            images.append({
+                "image_id": img.findtext("image_id", ""),
+                "url": img.findtext("image_url", ""),
+                "is_primary": img.findtext("is_primary", "0") == "1",
+                "sort_order": img.findtext("sort_order", "0"),
+                "thumb_url": img.findtext("thumb_url", ""),
+                "thumb_webp_url": img.findtext("thumb_webp_url", "")
+            })
 
-        row["images"] = images
-        # ------------------------------------------
+    row["images"] = images
+    # ------------------------------------------
 
-        out.append(row)
+    return row
+
+
+def facets_dict(facets_el):
+    # Conteos por género / formato calculados por Libros
+    return {
+        group.tag: [
+            {
+                "id": value.findtext("id", ""),
+                "name": value.findtext("name", ""),
+                "count": int(value.findtext("count", "0"))
+            }
+            for value in group.findall("value")
+        ]
+        for group in facets_el
+    }
 
-    return out
+
+def iter_libros_xml(chunks):
+    """Recorre el XML de Libros por trozos: genera ("book", dict) por cada
+    <book> y ("facets", dict) al final.
+
+    Cada hijo del catálogo se quita del árbol en cuanto se convierte, así
+    la memoria no depende del número de libros.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    root = None
+    depth = 0
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, el in parser.read_events():
+            if event == "start":
+                root = el if root is None else root
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 1:
+                continue
+            if el.tag == "book":
+                yield "book", book_row(el)
+            elif el.tag == "facets":
+                yield "facets", facets_dict(el)
+            root.clear()
+    parser.close()
+
+
+def libros_xml_to_json(xml):
+    """(libros, facetas) a partir del XML de Libros (bytes o trozos)."""
+    books, facets = [], {}
+    for kind, value in iter_libros_xml([xml] if isinstance(xml, bytes) else xml):
+        if kind == "book":
+            books.append(value)
+        else:
+            facets = value
+    return books, facets
+
+
+def stream_books_json(resp):
+    """Cuerpo de /books emitido libro a libro mientras llega el XML.
+
+    Un error a mitad del XML corta la respuesta: el estado 200 ya se envió.
+    """
+    facets = {}
+    count = 0
+    try:
+        yield '{"ok": true, "books": ['
+        for kind, value in iter_libros_xml(resp.iter_content(LIBROS_STREAM_CHUNK)):
+            if kind == "book":
+                yield ("," if count else "") + json.dumps(value)
+                count += 1
+            else:
+                facets = value
+        yield '], "facets": ' + json.dumps(facets) + "}"
+    finally:
+        resp.close()
 
 # ===========================
 # ENDPOINT /books (JWT requerido)
@@ -234,32 +390,97 @@ def books():
     if not payload:
         return jsonify({"ok": False, "error": "Token inválido"}), 401
 
-    # pasar parámetro q al microservicio
-    q = request.args.get("q", "")
-    url = f"{LIBROS_HOST}/api/books"
+    # pasar parámetro q al microservicio (normalizado: es también la clave de caché)
+    q = normalize_query(request.args.get("q"))
+    path = "/api/books"
     if q:
-        url += f"?q={requests.utils.quote(q)}"
+        path += f"?q={requests.utils.quote(q)}"
 
+    # Lectura tras escritura: Libros la sirve desde la primaria, no de una réplica.
+    # Sólo mientras la marca siga vigente; después vuelve a usarse la caché
+    headers = {}
+    read_primary_until = request.headers.get("X-Read-Primary-Until")
     try:
-        resp = requests.get(url, timeout=5)
-        resp.raise_for_status()
-    except Exception as e:
+        if read_primary_until and float(read_primary_until) > time.time():
+            headers["X-Read-Primary-Until"] = read_primary_until
+    except ValueError:
+        pass
+
+    # Server-Timing: tiempos del gateway + fases reportadas por Libros
+    # (las de Libros sólo existen cuando esta petición fue quien lo llamó)
+    timing = []
+
+    def upstream_timing(resp):
+        header = resp.headers.get("Server-Timing")
+        return ["libros-" + part.strip() for part in header.split(",")] if header else []
+
+    t0 = time.perf_counter()
+
+    # Lectura tras escritura (ni se sirve ni se guarda en la caché) o caché
+    # desactivada: el JSON se transmite según llega el XML
+    if headers or books_cache.ttl <= 0:
+        source = "bypass" if headers else "stream"
+        resp = None
+        try:
+            resp = libros.get(path, headers=headers, stream=True)
+            resp.raise_for_status()
+        except requests.RequestException as e:
+            if resp is not None:
+                resp.close()
+            return jsonify({
+                "ok": False,
+                "error": "No se pudo contactar microservicio Libros",
+                "detail": str(e)
+            }), 502
+        timing = [f"cache;desc={source}", f"upstream;dur={(time.perf_counter() - t0) * 1000:.2f}"]
+        out = Response(stream_with_context(stream_books_json(resp)), mimetype="application/json")
+        out.headers["Server-Timing"] = ", ".join(timing + upstream_timing(resp))
+        out.headers["X-Cache"] = source
+        return out
+
+    def fetch_books():
+        # upstream = hasta recibir las cabeceras; parse = leer y convertir
+        # el cuerpo por trozos (nunca se guarda completo)
+        t0 = time.perf_counter()
+        with libros.get(path, headers=headers, stream=True) as resp:
+            resp.raise_for_status()
+            t1 = time.perf_counter()
+            books, facets = libros_xml_to_json(resp.iter_content(LIBROS_STREAM_CHUNK))
+        t2 = time.perf_counter()
+
+        timing.extend([f"upstream;dur={(t1 - t0) * 1000:.2f}", f"parse;dur={(t2 - t1) * 1000:.2f}"])
+        timing.extend(upstream_timing(resp))
+        return {"books": books, "facets": facets}
+
+    try:
+        data, source = books_cache.get_or_load(q, fetch_books)
+    except (requests.RequestException, TimeoutError) as e:
         return jsonify({
             "ok": False,
             "error": "No se pudo contactar microservicio Libros",
             "detail": str(e)
         }), 502
-
-    try:
-        books = libros_xml_to_json(resp.content)
-    except:
+    except Exception:
         return jsonify({"ok": False, "error": "XML inválido"}), 500
+    timing.insert(0, f"cache;desc={source};dur={(time.perf_counter() - t0) * 1000:.2f}")
+
+    out = jsonify({"ok": True, "books": data["books"], "facets": data["facets"]})
+    out.headers["Server-Timing"] = ", ".join(timing)
+    out.headers["X-Cache"] = source
+    return out
+
 
-    return jsonify({"ok": True, "books": books})
+@app.route("/libros/pool", methods=["GET"])
+def libros_pool():
+    """Métricas del pool HTTP hacia Libros (conexiones reutilizadas y saturación)."""
+    return jsonify({"ok": True, **libros.stats(), "cache": books_cache.stats(),
+                    "tokens": verified_tokens.stats()})
 
 # ===========================
 # MAIN
 # ===========================
 if __name__ == "__main__":
     log.info("Servidor Flask corriendo en http://0.0.0.0:5000")
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    log.info("Producción: BIND=0.0.0.0:5000 gunicorn -c ../gunicorn.conf.py app:app")
+    init_worker()
+    app.run(host="0.0.0.0", port=5000, debug=os.getenv("FLASK_DEBUG") == "1", threaded=True)
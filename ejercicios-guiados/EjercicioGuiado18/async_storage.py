@@ -0,0 +1,115 @@
+# ------------------------------------------
+# Backends de almacenamiento asíncronos (para main_async.py)
+# Descripción: misma interfaz que storage_backend.py pero con corrutinas.
+#              GCS usa gcloud-aio-storage (HTTP con aiohttp, sin hilos);
+#              el disco local delega en LocalStorage a través de un hilo.
+# Autor: Pablo Celedón Cabriales
+#
+#   pip install gcloud-aio-storage
+# ------------------------------------------
+
+import asyncio
+
+from storage_backend import LocalStorage, ObjectNotFound
+
+
+class AsyncStorageBackend:
+
+    async def put(self, name, stream, content_type=None):
+        raise NotImplementedError
+
+    async def delete(self, name):
+        raise NotImplementedError
+
+    async def exists(self, name):
+        raise NotImplementedError
+
+    def url(self, name, expires=None, content_type=None):
+        raise NotImplementedError
+
+    def name_from_url(self, url):
+        prefix = self.url("")
+        return url[len(prefix):] if url.startswith(prefix) else None
+
+    async def close(self):
+        pass
+
+
+# -----------------------------
+# Google Cloud Storage
+# -----------------------------
+class AsyncGCSStorage(AsyncStorageBackend):
+    """El cliente (y su sesión aiohttp) debe crearse dentro del event loop."""
+
+    def __init__(self, bucket_name):
+        from gcloud.aio.storage import Storage
+
+        self.bucket_name = bucket_name
+        self.client = Storage()
+
+    async def put(self, name, stream, content_type=None):
+        # Con un objeto archivo la librería sube por bloques (resumible
+        # a partir de 5 MB) en lugar de cargar todo en memoria
+        await self.client.upload(self.bucket_name, name, stream,
+                                 content_type=content_type)
+
+    async def delete(self, name):
+        from aiohttp import ClientResponseError
+
+        try:
+            await self.client.delete(self.bucket_name, name)
+        except ClientResponseError as e:
+            if e.status == 404:
+                raise ObjectNotFound(name)
+            raise
+
+    async def exists(self, name):
+        from aiohttp import ClientResponseError
+
+        try:
+            await self.client.download_metadata(self.bucket_name, name)
+            return True
+        except ClientResponseError as e:
+            if e.status == 404:
+                return False
+            raise
+
+    def url(self, name, expires=None, content_type=None):
+        # Las URLs firmadas las sigue generando el servicio síncrono
+        return f"https://storage.googleapis.com/{self.bucket_name}/{name}"
+
+    async def close(self):
+        await self.client.close()
+
+
+# -----------------------------
+# Disco local
+# -----------------------------
+class AsyncLocalStorage(AsyncStorageBackend):
+    """LocalStorage con la E/S de archivos fuera del event loop."""
+
+    def __init__(self, root, base_url):
+        self.sync = LocalStorage(root, base_url)
+        self.root = self.sync.root
+
+    async def put(self, name, stream, content_type=None):
+        await asyncio.to_thread(self.sync.put, name, stream, content_type)
+
+    async def delete(self, name):
+        await asyncio.to_thread(self.sync.delete, name)
+
+    async def exists(self, name):
+        return await asyncio.to_thread(self.sync.exists, name)
+
+    def url(self, name, expires=None, content_type=None):
+        return self.sync.url(name)
+
+
+def create_async_storage(kind, bucket=None, root=None, base_url=None):
+    """kind: "gcs" (por defecto) o "local"."""
+    kind = (kind or "gcs").lower()
+    if kind == "local":
+        return AsyncLocalStorage(root or "./storage", base_url or "/storage")
+    if kind == "gcs":
+        return AsyncGCSStorage(bucket)
+    raise ValueError(f"STORAGE_BACKEND desconocido: {kind}")
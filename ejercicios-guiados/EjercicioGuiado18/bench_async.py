@@ -0,0 +1,65 @@
+# ------------------------------------------
+# Benchmark WSGI vs ASGI del catálogo de Libros
+# Abre N clientes "lentos" a la vez (cada uno lee la respuesta con pausas,
+# como una conexión móvil) y mide cuántos terminan, latencia y req/s.
+# Sólo usa la biblioteca estándar.
+#
+#   gunicorn -c ../gunicorn.conf.py main:app                  (WSGI, :5001)
+#   hypercorn main_async:app --bind 0.0.0.0:5003               (ASGI, :5003)
+#   python3 bench_async.py --clients 100 500 1000 2000
+# ------------------------------------------
+
+import argparse
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+
+async def slow_get(url, read_chunk, pause, timeout):
+    """GET con lectura lenta; devuelve (status, segundos) o lanza excepción."""
+    parts = urlsplit(url)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    t0 = time.perf_counter()
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(parts.hostname, parts.port or 80), timeout)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+                     "Connection: close\r\n\r\n".encode())
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        status = int(status_line.split()[1])
+        while await asyncio.wait_for(reader.read(read_chunk), timeout):
+            await asyncio.sleep(pause)
+        return status, time.perf_counter() - t0
+    finally:
+        writer.close()
+
+
+async def run(label, url, clients, read_chunk, pause, timeout):
+    t0 = time.perf_counter()
+    results = await asyncio.gather(
+        *(slow_get(url, read_chunk, pause, timeout) for _ in range(clients)),
+        return_exceptions=True)
+    elapsed = time.perf_counter() - t0
+
+    ok = sorted(t for r in results if isinstance(r, tuple) and r[0] == 200 for t in [r[1]])
+    errors = clients - len(ok)
+    p50 = ok[len(ok) // 2] if ok else 0
+    p95 = ok[int(len(ok) * 0.95) - 1] if ok else 0
+    print(f"{label:<5} | {clients:>5} clientes | ok {len(ok):>5} | errores {errors:>5} | "
+          f"p50 {p50:6.2f}s | p95 {p95:6.2f}s | {len(ok) / elapsed:7.1f} req/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--wsgi", default="http://localhost:5001/api/books")
+    parser.add_argument("--asgi", default="http://localhost:5003/api/books")
+    parser.add_argument("--clients", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--read-chunk", type=int, default=4096, help="bytes por lectura")
+    parser.add_argument("--pause", type=float, default=0.05, help="segundos entre lecturas")
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    for n in args.clients:
+        for label, url in (("WSGI", args.wsgi), ("ASGI", args.asgi)):
+            asyncio.run(run(label, url, n, args.read_chunk, args.pause, args.timeout))
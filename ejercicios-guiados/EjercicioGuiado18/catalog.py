@@ -0,0 +1,209 @@
+# -------------------------------------------------------
+# CATÁLOGO DENORMALIZADO (catalog_view) Y SU XML
+# Compartido por main.py (WSGI) y main_async.py (ASGI) para que ambas
+# versiones del servicio respondan exactamente el mismo contrato.
+# -------------------------------------------------------
+import json
+import xml.etree.ElementTree as ET
+
+# Una fila por libro con autor/género/formato y la lista de imágenes ya
+# resueltos. Cada escritura sobre Books/Images recalcula sólo las filas de
+# los libros afectados, dentro de la misma transacción.
+CATALOG_ROW_SQL = """
+    INSERT INTO catalog_view
+        (book_id, title, publisher, year, author_first_name, author_last_name,
+         author_name, genre_id, genre_name, format_id, format_name, images_json)
+    SELECT b.book_id, b.title, b.publisher, b.year, a.first_name, a.last_name,
+           CONCAT(a.first_name,' ',a.last_name), b.genre_id, g.name,
+           b.format_id, f.name,
+           (SELECT CONCAT('[', GROUP_CONCAT(
+                       JSON_OBJECT('image_id', i.image_id,
+                                   'image_url', i.image_url,
+                                   'is_primary', i.is_primary,
+                                   'sort_order', i.sort_order,
+                                   'thumb_url', i.thumb_url,
+                                   'thumb_webp_url', i.thumb_webp_url)
+                       ORDER BY i.sort_order, i.image_id SEPARATOR ','), ']')
+            FROM Images i WHERE i.book_id = b.book_id)
+    FROM Books b
+    LEFT JOIN Authors a ON b.author_id = a.author_id
+    LEFT JOIN Genres  g ON b.genre_id  = g.genre_id
+    LEFT JOIN Formats f ON b.format_id = f.format_id
+"""
+
+# Conteo de libros por género y formato (catalog_facets). Cuando cambian
+# filas de Books se ajusta con deltas: se resta donde estaba cada libro cuyo
+# género/formato cambió (o que desapareció) y se suma donde está ahora; así
+# el conteo del catálogo completo nunca necesita recorrer catalog_view.
+FACET_GROUPS = (("genre", "genre_id", "genre_name"), ("format", "format_id", "format_name"))
+FACET_TABLES = {"genre": "Genres", "format": "Formats"}
+
+
+def facet_counts_sql(where):
+    """SELECT facet, value_id, name, book_count sobre las filas de `where`."""
+    return " UNION ALL ".join(
+        f"SELECT '{facet}' AS facet, COALESCE({id_col}, 0) AS value_id, "
+        f"MAX({name_col}) AS name, COUNT(*) AS book_count "
+        f"FROM catalog_view WHERE {where} GROUP BY COALESCE({id_col}, 0)"
+        for facet, id_col, name_col in FACET_GROUPS
+    )
+
+
+def facet_moves_sql(where):
+    """Deltas de los libros de `where` ({t} = alias) cuyo valor en Books ya
+    no coincide con catalog_view: -1 en el valor viejo, +1 en el nuevo.
+    Se calcula antes de borrar las filas de catalog_view."""
+    parts = []
+    for facet, id_col, name_col in FACET_GROUPS:
+        moved = f"NOT (cv.{id_col} <=> b.{id_col})"
+        parts.append(
+            f"SELECT '{facet}' AS facet, COALESCE(cv.{id_col}, 0) AS value_id, "
+            f"MAX(cv.{name_col}) AS name, -COUNT(*) AS book_count "
+            f"FROM catalog_view cv LEFT JOIN Books b ON b.book_id = cv.book_id "
+            f"WHERE ({where.format(t='cv.')}) AND (b.book_id IS NULL OR {moved}) "
+            f"GROUP BY COALESCE(cv.{id_col}, 0)"
+        )
+        parts.append(
+            f"SELECT '{facet}' AS facet, COALESCE(b.{id_col}, 0) AS value_id, "
+            f"MAX(x.name) AS name, COUNT(*) AS book_count "
+            f"FROM Books b LEFT JOIN catalog_view cv ON cv.book_id = b.book_id "
+            f"LEFT JOIN {FACET_TABLES[facet]} x ON x.{id_col} = b.{id_col} "
+            f"WHERE ({where.format(t='b.')}) AND (cv.book_id IS NULL OR {moved}) "
+            f"GROUP BY COALESCE(b.{id_col}, 0)"
+        )
+    return " UNION ALL ".join(parts)
+
+
+def facet_delta_sql(where):
+    # Tabla derivada: el UNION no se mezcla con ON DUPLICATE KEY UPDATE.
+    # Sin libros movidos el SELECT no devuelve filas y catalog_facets no se toca
+    return (
+        "INSERT INTO catalog_facets (facet, value_id, name, book_count) "
+        "SELECT facet, value_id, MAX(name), SUM(book_count) "
+        "FROM (" + facet_moves_sql(where) + ") AS delta "
+        "GROUP BY facet, value_id HAVING SUM(book_count) <> 0 "
+        "ON DUPLICATE KEY UPDATE "
+        "catalog_facets.book_count = catalog_facets.book_count + VALUES(book_count), "
+        "catalog_facets.name = VALUES(name)"
+    )
+
+
+FACETS_SQL = """
+    SELECT facet, value_id, name, book_count
+    FROM catalog_facets
+    WHERE book_count > 0
+    ORDER BY facet, book_count DESC, name
+"""
+
+
+def facets_query(where=None, params=()):
+    """(sql, params) de los conteos: contadores precalculados para el
+    catálogo completo, GROUP BY sólo sobre las filas que cumplen `where`."""
+    if not where:
+        return FACETS_SQL, ()
+    sql = facet_counts_sql(f"({where})") + " ORDER BY facet, book_count DESC, name"
+    return sql, tuple(params) * len(FACET_GROUPS)
+
+
+def catalog_refresh_statements(book_ids=(), since_id=None, books_changed=False):
+    """Sentencias (sql, params) que recalculan las filas de `book_ids`.
+
+    `since_id` añade todos los libros con book_id mayor, para filas recién
+    insertadas cuyo id asignó AUTO_INCREMENT. Las ejecuta el llamador con su
+    propio driver (MySQLdb o aiomysql), dentro de su transacción.
+
+    Sólo con `books_changed` (se escribieron filas de Books) se ajusta
+    catalog_facets; los cambios de imágenes no mueven ningún conteo y así no
+    bloquean sus filas, que comparte todo el catálogo. Las filas de
+    catalog_view se bloquean primero (FOR UPDATE, en orden de book_id): dos
+    refrescos del mismo libro se esperan en lugar de cruzar candados S y X.
+    """
+    book_ids = sorted(set(book_ids))
+    conds, params = [], []
+    if book_ids:
+        conds.append(f"{{t}}book_id IN ({','.join(['%s'] * len(book_ids))})")
+        params += book_ids
+    if since_id is not None:
+        conds.append("{t}book_id > %s")
+        params.append(since_id)
+    if not conds:
+        return []
+    where = " OR ".join(conds)
+    view_where = f"({where.format(t='')})"
+    statements = [
+        ("SELECT book_id FROM catalog_view WHERE " + view_where
+         + " ORDER BY book_id FOR UPDATE", params),
+    ]
+    if books_changed:
+        statements.append((facet_delta_sql(where), params * 2 * len(FACET_GROUPS)))
+    statements += [
+        ("DELETE FROM catalog_view WHERE " + view_where, params),
+        (CATALOG_ROW_SQL + " WHERE " + where.format(t="b."), params),
+    ]
+    return statements
+
+
+# -------------------------------------------------------
+# XML PARA LIBROS
+# -------------------------------------------------------
+def book_element(row):
+    """<book> de una fila de catalog_view."""
+    book_el = ET.Element("book")
+
+    ET.SubElement(book_el, "book_id").text = str(row["book_id"])
+    ET.SubElement(book_el, "title").text = row["title"] or ""
+    ET.SubElement(book_el, "author").text = row["author_name"] or ""
+    ET.SubElement(book_el, "publisher").text = row["publisher"] or ""
+    ET.SubElement(book_el, "year").text = str(row["year"] or "")
+    ET.SubElement(book_el, "genre").text = row["genre_name"] or ""
+    ET.SubElement(book_el, "format").text = row["format_name"] or ""
+
+    # Imágenes ya agregadas en catalog_view (JSON ordenado por sort_order)
+    imgs = json.loads(row["images_json"] or "[]")
+    images_el = ET.SubElement(book_el, "images")
+
+    for img in imgs:
+        img_el = ET.SubElement(images_el, "image")
+        ET.SubElement(img_el, "image_id").text = str(img["image_id"])
+        ET.SubElement(img_el, "image_url").text = img["image_url"]
+        ET.SubElement(img_el, "is_primary").text = str(img["is_primary"])
+        ET.SubElement(img_el, "sort_order").text = str(img["sort_order"])
+        ET.SubElement(img_el, "thumb_url").text = img["thumb_url"] or ""
+        ET.SubElement(img_el, "thumb_webp_url").text = img["thumb_webp_url"] or ""
+
+    return book_el
+
+
+def book_dict(row):
+    """Misma información que book_element, para NDJSON."""
+    return {
+        "book_id": row["book_id"],
+        "title": row["title"] or "",
+        "author": row["author_name"] or "",
+        "publisher": row["publisher"] or "",
+        "year": row["year"],
+        "genre": row["genre_name"] or "",
+        "format": row["format_name"] or "",
+        "images": json.loads(row["images_json"] or "[]"),
+    }
+
+
+def facets_element(rows):
+    """<facets><genre><value>…</value></genre><format>…</format></facets>"""
+    facets_el = ET.Element("facets")
+    groups = {facet: ET.SubElement(facets_el, facet) for facet, _, _ in FACET_GROUPS}
+    for row in rows:
+        value_el = ET.SubElement(groups[row["facet"]], "value")
+        ET.SubElement(value_el, "id").text = str(row["value_id"])
+        ET.SubElement(value_el, "name").text = row["name"] or ""
+        ET.SubElement(value_el, "count").text = str(row["book_count"])
+    return facets_el
+
+
+def build_books_xml(rows, facets=None):
+    root = ET.Element("catalog")
+    for row in rows:
+        root.append(book_element(row))
+    if facets is not None:
+        root.append(facets_element(facets))
+    return root
@@ -0,0 +1,70 @@
+-- ------------------------------------------------------
+-- Modelo de lectura desnormalizado del catálogo
+-- (se ejecuta después de libros.sql e images.sql sobre la base Libros)
+--
+-- /api/books lee sólo de esta tabla. main.py recalcula las filas de cada
+-- libro en la misma transacción en que modifica Books o Images; si se
+-- editan las tablas a mano, volver a ejecutar el bloque de carga inicial.
+-- ------------------------------------------------------
+
+CREATE TABLE IF NOT EXISTS `catalog_view` (
+  `book_id` int(11) NOT NULL,
+  `title` varchar(200) NOT NULL,
+  `publisher` varchar(150) DEFAULT NULL,
+  `year` int(11) DEFAULT NULL,
+  `author_first_name` varchar(100) DEFAULT NULL,
+  `author_last_name` varchar(100) DEFAULT NULL,
+  `author_name` varchar(201) DEFAULT NULL,
+  `genre_id` int(11) DEFAULT NULL,
+  `genre_name` varchar(100) DEFAULT NULL,
+  `format_id` int(11) DEFAULT NULL,
+  `format_name` varchar(100) DEFAULT NULL,
+  `images_json` mediumtext DEFAULT NULL,
+  `updated_at` timestamp NOT NULL DEFAULT current_timestamp() ON UPDATE current_timestamp(),
+  PRIMARY KEY (`book_id`),
+  KEY `title` (`title`),
+  KEY `author_last_name` (`author_last_name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Carga inicial / reconstrucción completa
+DELETE FROM `catalog_view`;
+INSERT INTO catalog_view
+    (book_id, title, publisher, year, author_first_name, author_last_name,
+     author_name, genre_id, genre_name, format_id, format_name, images_json)
+SELECT b.book_id, b.title, b.publisher, b.year, a.first_name, a.last_name,
+       CONCAT(a.first_name,' ',a.last_name), b.genre_id, g.name,
+       b.format_id, f.name,
+       (SELECT CONCAT('[', GROUP_CONCAT(
+                   JSON_OBJECT('image_id', i.image_id,
+                               'image_url', i.image_url,
+                               'is_primary', i.is_primary,
+                               'sort_order', i.sort_order,
+                               'thumb_url', i.thumb_url,
+                               'thumb_webp_url', i.thumb_webp_url)
+                   ORDER BY i.sort_order, i.image_id SEPARATOR ','), ']')
+        FROM Images i WHERE i.book_id = b.book_id)
+FROM Books b
+LEFT JOIN Authors a ON b.author_id = a.author_id
+LEFT JOIN Genres  g ON b.genre_id  = g.genre_id
+LEFT JOIN Formats f ON b.format_id = f.format_id;
+
+-- ------------------------------------------------------
+-- Conteos por género y formato para /api/books
+-- refresh_catalog los ajusta con deltas cuando cambian filas de Books; el bloque de
+-- abajo los recalcula desde cero (después de la carga de catalog_view).
+-- ------------------------------------------------------
+CREATE TABLE IF NOT EXISTS `catalog_facets` (
+  `facet` varchar(10) NOT NULL,
+  `value_id` int(11) NOT NULL,
+  `name` varchar(100) DEFAULT NULL,
+  `book_count` int(11) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`facet`, `value_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+DELETE FROM `catalog_facets`;
+INSERT INTO catalog_facets (facet, value_id, name, book_count)
+SELECT 'genre', COALESCE(genre_id, 0), MAX(genre_name), COUNT(*)
+FROM catalog_view GROUP BY COALESCE(genre_id, 0)
+UNION ALL
+SELECT 'format', COALESCE(format_id, 0), MAX(format_name), COUNT(*)
+FROM catalog_view GROUP BY COALESCE(format_id, 0);
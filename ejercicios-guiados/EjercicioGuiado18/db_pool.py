@@ -0,0 +1,107 @@
+# -------------------------------------------------------
+# POOL DE CONEXIONES MariaDB (uno por proceso/worker)
+# Las conexiones se reutilizan entre peticiones; close() devuelve la
+# conexión al pool en lugar de cerrarla.
+# -------------------------------------------------------
+import queue
+import threading
+import time
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class PooledConnection:
+    """Envuelve una conexión MySQLdb; close() la regresa al pool."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def close(self):
+        if self._conn is not None:
+            self._pool.release(self._conn)
+            self._conn = None
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __del__(self):
+        # Si un camino de error olvida close(), la conexión no se pierde
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+
+    def __init__(self, factory, size, timeout=5, max_idle=60):
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        conn = self._take_idle()
+        if conn is None:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    conn = self.factory()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    conn = self._checked(*self._idle.get(timeout=self.timeout))
+                except queue.Empty:
+                    raise PoolExhausted(f"Sin conexiones libres tras {self.timeout}s") from None
+                if conn is None:
+                    return self.acquire()
+        return PooledConnection(self, conn)
+
+    def _take_idle(self):
+        while True:
+            try:
+                item = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            conn = self._checked(*item)
+            if conn is not None:
+                return conn
+
+    def _checked(self, conn, last_used):
+        # Una conexión inactiva mucho tiempo pudo cerrarla el servidor
+        if time.time() - last_used > self.max_idle:
+            try:
+                conn.ping()
+            except Exception:
+                self._discard(conn)
+                return None
+        return conn
+
+    def release(self, conn):
+        try:
+            conn.rollback()
+            conn.autocommit(False)
+        except Exception:
+            self._discard(conn)
+            return
+        self._idle.put((conn, time.time()))
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
@@ -0,0 +1,112 @@
+# -------------------------------------------------------
+# ENRUTADOR PRIMARIA / RÉPLICAS
+# Las escrituras van siempre a la primaria. Las lecturas del catálogo se
+# reparten entre las réplicas sanas cuyo retraso (Seconds_Behind_Master)
+# no pasa de max_lag; si no queda ninguna, también van a la primaria.
+# -------------------------------------------------------
+import itertools
+import threading
+import time
+
+from db_pool import PoolExhausted
+
+
+class Replica:
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.healthy = True    # optimista hasta la primera comprobación
+        self.lag = None
+        self.error = None
+
+
+class DBRouter:
+
+    def __init__(self, primary, replicas, max_lag=5, check_interval=5):
+        """primary: ConnectionPool; replicas: {nombre: ConnectionPool}."""
+        self.primary = primary
+        self.replicas = [Replica(name, pool) for name, pool in replicas.items()]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.checked_at = 0.0
+        self._next = itertools.count()
+        self._check_lock = threading.Lock()
+
+    def writer(self):
+        return self.primary.acquire()
+
+    def reader(self):
+        """Conexión de sólo lectura: réplica sana por turnos o la primaria."""
+        self.maybe_check()
+        healthy = [r for r in self.replicas if r.healthy]
+        if healthy:
+            start = next(self._next)
+            for i in range(len(healthy)):
+                replica = healthy[(start + i) % len(healthy)]
+                try:
+                    return replica.pool.acquire()
+                except PoolExhausted:
+                    # Pool lleno por carga, no por la réplica: se prueba otra
+                    continue
+                except Exception as e:
+                    # Caída entre comprobaciones: se retira hasta la siguiente
+                    replica.healthy, replica.error = False, str(e)
+        return self.primary.acquire()
+
+    def maybe_check(self):
+        # La comprobación corre en un hilo aparte: una réplica que no
+        # responde no retiene la petición que la disparó. Mientras tanto
+        # todos siguen con el estado anterior
+        if time.time() - self.checked_at < self.check_interval:
+            return
+        if not self._check_lock.acquire(blocking=False):
+            return
+        try:
+            threading.Thread(target=self._check_in_background, name="replica-check",
+                             daemon=True).start()
+        except Exception:
+            self._check_lock.release()
+            raise
+
+    def _check_in_background(self):
+        try:
+            self.check()
+        finally:
+            self._check_lock.release()
+
+    def check(self):
+        for replica in self.replicas:
+            conn = None
+            try:
+                conn = replica.pool.acquire()
+                cursor = conn.cursor()
+                cursor.execute("SHOW SLAVE STATUS")
+                row = cursor.fetchone()
+                status = dict(zip([d[0] for d in cursor.description], row)) if row else {}
+                cursor.close()
+
+                replica.lag = status.get("Seconds_Behind_Master")
+                running = (status.get("Slave_IO_Running") == "Yes"
+                           and status.get("Slave_SQL_Running") == "Yes")
+                if not running:
+                    replica.healthy, replica.error = False, "replicación detenida"
+                elif replica.lag is None or replica.lag > self.max_lag:
+                    replica.healthy, replica.error = False, f"retraso {replica.lag}s"
+                else:
+                    replica.healthy, replica.error = True, None
+            except PoolExhausted:
+                # Sin conexión libre para comprobar: se mantiene el estado anterior
+                pass
+            except Exception as e:
+                replica.healthy, replica.error = False, str(e)
+            finally:
+                if conn is not None:
+                    conn.close()
+        self.checked_at = time.time()
+
+    def status(self):
+        return [
+            {"name": r.name, "healthy": r.healthy, "lag": r.lag, "error": r.error}
+            for r in self.replicas
+        ]
@@ -0,0 +1,36 @@
+-- ------------------------------------------------------
+-- Tablas de imágenes del microservicio Libros
+-- (se ejecuta después de libros.sql sobre la base Libros)
+-- ------------------------------------------------------
+
+CREATE TABLE IF NOT EXISTS `Images` (
+  `image_id` int(11) NOT NULL AUTO_INCREMENT,
+  `book_id` int(11) NOT NULL,
+  `image_url` varchar(500) NOT NULL,
+  `is_primary` tinyint(1) NOT NULL DEFAULT 0,
+  `sort_order` int(11) NOT NULL DEFAULT 0,
+  `sha256` char(64) DEFAULT NULL,
+  `thumb_url` varchar(500) DEFAULT NULL,
+  `thumb_webp_url` varchar(500) DEFAULT NULL,
+  PRIMARY KEY (`image_id`),
+  KEY `book_id` (`book_id`, `sort_order`),
+  KEY `sha256` (`sha256`),
+  CONSTRAINT `Images_ibfk_1` FOREIGN KEY (`book_id`) REFERENCES `Books` (`book_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1 COLLATE=latin1_swedish_ci;
+
+-- Blobs direccionados por contenido (libros/<sha256> en el bucket).
+-- ref_count = número de filas de Images que apuntan al blob.
+CREATE TABLE IF NOT EXISTS `ImageBlobs` (
+  `sha256` char(64) NOT NULL,
+  `mime_type` varchar(100) NOT NULL,
+  `size_bytes` bigint(20) unsigned NOT NULL,
+  `ref_count` int(10) unsigned NOT NULL DEFAULT 1,
+  `created_at` datetime NOT NULL DEFAULT current_timestamp(),
+  PRIMARY KEY (`sha256`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1 COLLATE=latin1_swedish_ci;
+
+-- Instalaciones existentes (Images creada antes de la deduplicación)
+ALTER TABLE `Images` ADD COLUMN IF NOT EXISTS `sha256` char(64) DEFAULT NULL;
+ALTER TABLE `Images` ADD INDEX IF NOT EXISTS `sha256` (`sha256`);
+ALTER TABLE `Images` ADD COLUMN IF NOT EXISTS `thumb_url` varchar(500) DEFAULT NULL;
+ALTER TABLE `Images` ADD COLUMN IF NOT EXISTS `thumb_webp_url` varchar(500) DEFAULT NULL;
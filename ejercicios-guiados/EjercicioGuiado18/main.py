@@ -1,47 +1,251 @@
-from flask import Flask, Response, request
+from flask import Flask, Response, request, send_from_directory, has_request_context
 from flask_cors import CORS
 import MySQLdb
 import xml.etree.ElementTree as ET
-from google.cloud import storage
+from storage_backend import create_storage, LocalStorage, CHUNK_SIZE
+from thumbnails import ThumbnailWorker, thumbnail_names
+from suggest_index import SuggestIndex
+from metrics import PhaseMetrics, init_app as init_metrics, phase
+from db_pool import ConnectionPool, PoolExhausted
+from db_router import DBRouter
+from catalog import catalog_refresh_statements, facets_query, book_element, book_dict, build_books_xml
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.wsgi import get_input_stream
+import hashlib
+import json
+import functools
+import logging
 import os
+import threading
+import time
+import zlib
 
 
 # Swagger
 from flasgger import Swagger, swag_from
 
+log = logging.getLogger(__name__)
+
 # -------------------------------------------------------
 # APP + SWAGGER
 # -------------------------------------------------------
 app = Flask(__name__)
-CORS(app)  # permitir CORS para el cliente web
+CORS(app, expose_headers=["Server-Timing", "X-Read-Primary-Until"])  # permitir CORS para el cliente web
 Swagger(app)
 
+# Server-Timing por petición + histogramas en /metrics
+init_metrics(app, PhaseMetrics("libros"))
+
 # -------------------------------------------------------
-# CONFIGURACIÓN GCS + LIMITES
+# CONFIGURACIÓN ALMACENAMIENTO + LIMITES
 # -------------------------------------------------------
-GCS_BUCKET = "pablocc23-i"
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "/home/pablocomputer23/Microservices/buckets/libros/pablocc23-i-key.json"
+# STORAGE_BACKEND=local permite correr y probar sin credenciales de GCS
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "gcs")
+GCS_BUCKET = os.getenv("GCS_BUCKET", "pablocc23-i")
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "./storage")
+LOCAL_STORAGE_URL = os.getenv("LOCAL_STORAGE_URL", "http://localhost:5001/storage")
+if STORAGE_BACKEND == "gcs":
+    os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS",
+                          "/home/pablocomputer23/Microservices/buckets/libros/pablocc23-i-key.json")
 
 ALLOWED_EXT = {"png", "jpg", "jpeg"}
 MAX_MB = 5 * 1024 * 1024     # 5MB
 MAX_IMAGES_PER_BOOK = 5
 
-gcs_client = storage.Client()
-bucket = gcs_client.bucket(GCS_BUCKET)
+# Límite de la petición completa: 5 archivos de 5MB + cabeceras multipart
+app.config["MAX_CONTENT_LENGTH"] = MAX_IMAGES_PER_BOOK * MAX_MB + 1024 * 1024
+
+# Importación masiva: filas por executemany/commit
+IMPORT_BATCH = int(os.getenv("IMPORT_BATCH", 1000))
+# Exportación: filas por consulta (keyset) y bytes por bloque enviado
+EXPORT_CHUNK = int(os.getenv("EXPORT_CHUNK", 5000))
+EXPORT_FLUSH_BYTES = 64 * 1024
+# Autocompletado: antigüedad máxima del índice antes de reconstruirlo
+# (recoge escrituras hechas por otros procesos/workers)
+SUGGEST_MAX_AGE = int(os.getenv("SUGGEST_MAX_AGE", 300))
+
+storage = create_storage(STORAGE_BACKEND, bucket=GCS_BUCKET,
+                         root=LOCAL_STORAGE_DIR, base_url=LOCAL_STORAGE_URL)
+
+# -------------------------------------------------------
+# STREAM CON LÍMITE DE TAMAÑO
+# -------------------------------------------------------
+class FileTooLarge(Exception):
+    pass
+
+
+class LimitedStream:
+    """Cuenta (y hashea) los bytes que fluyen al almacenamiento y aborta al pasar el límite."""
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.limit = limit
+        self.bytes_read = 0
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.limit - self.bytes_read + 1
+        chunk = self.stream.read(size)
+        self.bytes_read += len(chunk)
+        if self.bytes_read > self.limit:
+            raise FileTooLarge()
+        self.sha256.update(chunk)
+        return chunk
+
+    def tell(self):
+        return self.bytes_read
+
+    def seek(self, offset, whence=0):
+        pos = self.stream.seek(offset, whence)
+        self.bytes_read = pos
+        return pos
+
+
+# -------------------------------------------------------
+# BLOBS DIRECCIONADOS POR CONTENIDO (SHA-256 + ref_count)
+# -------------------------------------------------------
+def hash_upload(stream, limit):
+    """Primera pasada por bloques sobre el temporal de Werkzeug: (sha256, tamaño)."""
+    counted = LimitedStream(stream, limit)
+    while counted.read(CHUNK_SIZE):
+        pass
+    stream.seek(0)
+    return counted.sha256.hexdigest(), counted.bytes_read
+
+
+def blob_name_for(sha256):
+    return f"libros/{sha256}"
+
+
+def store_blob(cursor, stream, sha256, mime, size_bytes):
+    """Suma una referencia y sube el blob sólo si todavía no está en el bucket.
+
+    El upsert deja bloqueada la fila de ImageBlobs hasta el commit, así que un
+    borrado concurrente del mismo contenido no puede quitar el blob a mitad.
+    Devuelve (nombre, subido): `subido` indica que esta llamada creó el blob.
+    """
+    cursor.execute("""
+        INSERT INTO ImageBlobs(sha256, mime_type, size_bytes, ref_count)
+        VALUES(%s, %s, %s, 1)
+        ON DUPLICATE KEY UPDATE ref_count = ref_count + 1
+    """, (sha256, mime, size_bytes))
+    name = blob_name_for(sha256)
+    if storage.exists(name):
+        return name, False
+    storage.put(name, LimitedStream(stream, MAX_MB), content_type=mime)
+    return name, True
+
+
+def release_blob(cursor, sha256):
+    """Resta una referencia; devuelve el blob a borrar si ya nadie lo usa."""
+    cursor.execute("SELECT ref_count FROM ImageBlobs WHERE sha256=%s FOR UPDATE", (sha256,))
+    row = cursor.fetchone()
+    if row and row["ref_count"] > 1:
+        cursor.execute("UPDATE ImageBlobs SET ref_count = ref_count - 1 WHERE sha256=%s", (sha256,))
+        return None
+    cursor.execute("DELETE FROM ImageBlobs WHERE sha256=%s", (sha256,))
+    return blob_name_for(sha256)
+
 
 # -------------------------------------------------------
 # CONEXIÓN A LA BASE DE DATOS
 # -------------------------------------------------------
-def get_db_connection():
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = int(os.getenv("DB_PORT", 3306))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 8))
+db_pool = None   # se crea en init_worker(), ya dentro del proceso que atiende
+
+# Réplicas de sólo lectura para el catálogo: "host:puerto,host:puerto"
+DB_REPLICAS = [h.strip() for h in os.getenv("DB_REPLICAS", "").split(",") if h.strip()]
+DB_MAX_LAG = int(os.getenv("DB_MAX_LAG", 5))              # segundos
+DB_CHECK_INTERVAL = int(os.getenv("DB_CHECK_INTERVAL", 5))
+# Un host caído que no responde (sin RST) no debe retener un hilo minutos
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", 2))  # segundos
+db_router = None
+
+# Después de escribir, el cliente lee de la primaria mientras una réplica
+# aceptada (retraso <= DB_MAX_LAG, medido cada DB_CHECK_INTERVAL s) podría
+# no tener todavía el cambio
+READ_PRIMARY_HEADER = "X-Read-Primary-Until"
+READ_YOUR_WRITES_SECONDS = DB_MAX_LAG + DB_CHECK_INTERVAL
+
+
+def connect_db(host=DB_HOST, port=DB_PORT):
     return MySQLdb.connect(
-        host="localhost",
+        host=host,
+        port=port,
         user="libros_user",
         passwd="666",
         db="Libros",
-        charset="utf8"
+        charset="utf8",
+        connect_timeout=DB_CONNECT_TIMEOUT
     )
 
+
+def get_db_connection():
+    # Con pool, close() devuelve la conexión en lugar de cerrarla
+    with phase("pool"):
+        if db_pool is None:
+            return connect_db()
+        return db_pool.acquire()
+
+
+def reads_own_writes():
+    """El cliente escribió hace poco (cabecera X-Read-Primary-Until vigente)."""
+    if not has_request_context():
+        return False
+    try:
+        until = float(request.headers.get(READ_PRIMARY_HEADER, 0))
+    except ValueError:
+        return False
+    return until > time.time()
+
+
+def get_read_connection():
+    """Lecturas del catálogo: réplica sana, o la primaria si no hay/no conviene."""
+    if db_router is None or reads_own_writes():
+        return get_db_connection()
+    with phase("pool"):
+        return db_router.reader()
+
+
+def read_your_writes(resp):
+    # Marca la respuesta de una escritura; el cliente reenvía la cabecera
+    # en sus lecturas siguientes para verse a sí mismo
+    resp.headers[READ_PRIMARY_HEADER] = f"{time.time() + READ_YOUR_WRITES_SECONDS:.0f}"
+    return resp
+
+# -------------------------------------------------------
+# CATÁLOGO DENORMALIZADO (catalog_view)
+# -------------------------------------------------------
+def refresh_catalog(cursor, book_ids=(), since_id=None, books_changed=False):
+    """Recalcula las filas de catalog_view de `book_ids` (sin hacer commit)."""
+    for sql, params in catalog_refresh_statements(book_ids, since_id, books_changed):
+        cursor.execute(sql, params)
+
+
+# -------------------------------------------------------
+# MINIATURAS (worker en segundo plano)
+# -------------------------------------------------------
+def record_thumbnails(sha256, urls):
+    # Todas las filas con el mismo contenido comparten los derivados
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE Images SET thumb_url=%s, thumb_webp_url=%s WHERE sha256=%s
+    """, (urls["jpeg"], urls["webp"], sha256))
+    cursor.execute("SELECT DISTINCT book_id FROM Images WHERE sha256=%s", (sha256,))
+    refresh_catalog(cursor, [row[0] for row in cursor.fetchall()])
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+thumbnailer = ThumbnailWorker(storage, record_thumbnails)
+
+
 # -------------------------------------------------------
 # UTILIDADES XML
 # -------------------------------------------------------
@@ -52,49 +256,41 @@ def xml_error(msg, code=400):
 
 
 def xml_response(root):
-    xml_str = ET.tostring(root, encoding="utf-8")
+    with phase("serialize"):
+        xml_str = ET.tostring(root, encoding="utf-8")
     return Response(xml_str, mimetype="application/xml")
 
 
-# -------------------------------------------------------
-# XML PARA LIBROS
-# -------------------------------------------------------
-def build_books_xml(rows):
-    root = ET.Element("catalog")
+def iter_xml_elements(stream, tag, chunk_size=64 * 1024):
+    """Parsea el XML por bloques y entrega cada <tag> completo.
 
-    conn = get_db_connection()
-    cursor = conn.cursor(MySQLdb.cursors.DictCursor)
-
-    for row in rows:
-        book_el = ET.SubElement(root, "book")
-
-        ET.SubElement(book_el, "book_id").text = str(row["book_id"])
-        ET.SubElement(book_el, "title").text = row["title"] or ""
-        ET.SubElement(book_el, "author").text = row["author_name"] or ""
-        ET.SubElement(book_el, "publisher").text = row["publisher"] or ""
-        ET.SubElement(book_el, "year").text = str(row["year"] or "")
-        ET.SubElement(book_el, "genre").text = row["genre_name"] or ""
-        ET.SubElement(book_el, "format").text = row["format_name"] or ""
-
-        cursor.execute("""
-            SELECT image_id, image_url, is_primary, sort_order
-            FROM Images
-            WHERE book_id=%s
-            ORDER BY sort_order ASC
-        """, (row["book_id"],))
-
-        imgs = cursor.fetchall()
-        images_el = ET.SubElement(book_el, "images")
-
-        for img in imgs:
-            img_el = ET.SubElement(images_el, "image")
-            ET.SubElement(img_el, "image_id").text = str(img["image_id"])
-            ET.SubElement(img_el, "image_url").text = img["image_url"]
-            ET.SubElement(img_el, "is_primary").text = str(img["is_primary"])
-            ET.SubElement(img_el, "sort_order").text = str(img["sort_order"])
-
-    conn.close()
-    return root
+    Después de entregarlo lo separa de su padre y lo limpia, así que el árbol
+    nunca crece más allá del elemento en curso.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    stack = []
+
+    def drain():
+        for event, el in parser.read_events():
+            if event == "start":
+                stack.append(el)
+                continue
+            stack.pop()
+            if el.tag == tag:
+                yield el
+                if stack:
+                    stack[-1].remove(el)
+                el.clear()
+
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        parser.feed(chunk)
+        yield from drain()
+
+    parser.close()
+    yield from drain()
 
 
 # -------------------------------------------------------
@@ -102,7 +298,7 @@ def build_books_xml(rows):
 # -------------------------------------------------------
 @swag_from({
   "summary": "Lista todos los libros en XML",
-  "description": "Incluye las imágenes asociadas a cada libro.",
+  "description": "Incluye las imágenes asociadas a cada libro y los conteos por género y formato (<facets>).",
   "parameters": [
     {
       "name": "q",
@@ -119,35 +315,397 @@ def build_books_xml(rows):
 def get_books():
     q = (request.args.get("q") or "").strip()
 
-    conn = get_db_connection()
+    conn = get_read_connection()
     cursor = conn.cursor(MySQLdb.cursors.DictCursor)
 
+    # Lectura sobre una sola tabla: sin JOINs ni consultas por libro
     sql = """
-        SELECT b.book_id, b.title, b.publisher, b.year,
-               CONCAT(a.first_name,' ',a.last_name) AS author_name,
-               g.name AS genre_name, f.name AS format_name
-        FROM Books b
-        LEFT JOIN Authors a ON b.author_id = a.author_id
-        LEFT JOIN Genres  g ON b.genre_id  = g.genre_id
-        LEFT JOIN Formats f ON b.format_id = f.format_id
+        SELECT book_id, title, publisher, year, author_name,
+               genre_name, format_name, images_json
+        FROM catalog_view
     """
-    params = ()
+    where, params = None, ()
 
     if q:
-        sql += " WHERE b.title LIKE %s OR a.first_name LIKE %s OR a.last_name LIKE %s"
+        where = "title LIKE %s OR author_first_name LIKE %s OR author_last_name LIKE %s"
         like = f"%{q}%"
         params = (like, like, like)
+        sql += " WHERE " + where
 
-    sql += " ORDER BY b.book_id LIMIT 200"
+    sql += " ORDER BY book_id LIMIT 200"
 
-    cursor.execute(sql, params)
-    rows = cursor.fetchall()
+    with phase("query"):
+        cursor.execute(sql, params)
+    with phase("fetch"):
+        rows = cursor.fetchall()
+
+    # Catálogo completo: contadores precalculados; con q, sólo lo que coincide
+    with phase("facets"):
+        cursor.execute(*facets_query(where, params))
+        facets = cursor.fetchall()
     conn.close()
 
-    root = build_books_xml(rows)
+    with phase("serialize"):
+        root = build_books_xml(rows, facets)
     return xml_response(root)
 
 
+# -------------------------------------------------------
+# GET /api/books/suggest
+# -------------------------------------------------------
+suggest_index = SuggestIndex()
+_suggest_build_lock = threading.Lock()
+
+
+def _build_suggest_index():
+    # Se llama con _suggest_build_lock tomado y lo libera al terminar
+    try:
+        if time.time() - suggest_index.built_at < SUGGEST_MAX_AGE:
+            return
+        conn = get_read_connection()
+        cursor = conn.cursor(MySQLdb.cursors.SSCursor)
+        cursor.execute("SELECT book_id, title, author_name FROM catalog_view")
+        suggest_index.build(cursor)
+        cursor.close()
+        conn.close()
+    finally:
+        _suggest_build_lock.release()
+
+
+def _refresh_suggest_index():
+    try:
+        _build_suggest_index()
+    except Exception as e:
+        log.warning("No se pudo renovar el índice de autocompletado: %s", e)
+
+
+def ensure_suggest_index():
+    """Construye el índice la primera vez y lo renueva cada SUGGEST_MAX_AGE s.
+
+    Sólo la primera construcción bloquea. Las renovaciones corren en un
+    hilo daemon: todas las peticiones, incluida la que la dispara, siguen
+    respondiendo con el índice anterior mientras tanto.
+    """
+    if time.time() - suggest_index.built_at < SUGGEST_MAX_AGE:
+        return
+    if suggest_index.built_at == 0:
+        _suggest_build_lock.acquire()
+        _build_suggest_index()
+        return
+    if not _suggest_build_lock.acquire(blocking=False):
+        return
+    try:
+        threading.Thread(target=_refresh_suggest_index, name="suggest-refresh",
+                         daemon=True).start()
+    except Exception:
+        _suggest_build_lock.release()
+        raise
+
+
+def update_suggest_index(cursor, book_ids=(), since_id=None):
+    """Aplica al índice los libros recién escritos (después del commit)."""
+    if suggest_index.built_at == 0:
+        return
+    conds, params = [], []
+    if book_ids:
+        conds.append(f"book_id IN ({','.join(['%s'] * len(book_ids))})")
+        params += list(book_ids)
+    if since_id is not None:
+        conds.append("book_id > %s")
+        params.append(since_id)
+    if not conds:
+        return
+    cursor.execute("SELECT book_id, title, author_name FROM catalog_view WHERE "
+                   + " OR ".join(conds), params)
+    for book_id, title, author in cursor.fetchall():
+        suggest_index.upsert(book_id, title, author)
+
+
+@swag_from({
+  "summary": "Autocompletar títulos y autores",
+  "description": "Búsqueda por prefijo (sin distinguir acentos) en un índice en memoria.",
+  "parameters": [
+    {"name": "prefix", "in": "query", "required": True, "schema": {"type": "string"}},
+    {"name": "limit", "in": "query", "schema": {"type": "integer", "default": 10}}
+  ],
+  "responses": {
+    "200": {"description": "XML con las sugerencias"}
+  }
+})
+@app.route("/api/books/suggest", methods=["GET"])
+def suggest_books():
+    prefix = (request.args.get("prefix") or "").strip()
+    limit = min(max(request.args.get("limit", 10, type=int), 1), 50)
+
+    ensure_suggest_index()
+
+    root = ET.Element("suggestions")
+    for item in suggest_index.search(prefix, limit):
+        el = ET.SubElement(root, "suggestion")
+        ET.SubElement(el, "book_id").text = str(item["book_id"])
+        ET.SubElement(el, "title").text = item["title"]
+        ET.SubElement(el, "author").text = item["author"]
+
+    return xml_response(root)
+
+
+# -------------------------------------------------------
+# GET /api/books/export
+# -------------------------------------------------------
+def iter_catalog_rows():
+    """Recorre catalog_view completo por keyset con un cursor sin buffer.
+
+    Cada bloque es una consulta corta en autocommit: no se mantiene una
+    transacción (ni su snapshot) abierta mientras el cliente descarga.
+    """
+    conn = get_read_connection()
+    conn.autocommit(True)
+    try:
+        last_id = 0
+        while True:
+            cursor = conn.cursor(MySQLdb.cursors.SSDictCursor)
+            cursor.execute("""
+                SELECT book_id, title, publisher, year, author_name,
+                       genre_name, format_name, images_json
+                FROM catalog_view
+                WHERE book_id > %s
+                ORDER BY book_id
+                LIMIT %s
+            """, (last_id, EXPORT_CHUNK))
+            n = 0
+            for row in cursor:
+                n += 1
+                last_id = row["book_id"]
+                yield row
+            cursor.close()
+            if n < EXPORT_CHUNK:
+                break
+    finally:
+        conn.close()
+
+
+def iter_export_chunks(fmt, gzip_out):
+    """Serializa fila por fila y agrupa la salida en bloques de ~64KB."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip_out else None
+    parts, size = [], 0
+
+    def pieces():
+        if fmt == "xml":
+            yield b'<?xml version="1.0" encoding="utf-8"?>\n<catalog>'
+            for row in iter_catalog_rows():
+                yield ET.tostring(book_element(row), encoding="utf-8", xml_declaration=False)
+            yield b"</catalog>\n"
+        else:
+            for row in iter_catalog_rows():
+                yield json.dumps(book_dict(row), ensure_ascii=False).encode("utf-8") + b"\n"
+
+    for piece in pieces():
+        parts.append(piece)
+        size += len(piece)
+        if size >= EXPORT_FLUSH_BYTES:
+            data = b"".join(parts)
+            parts, size = [], 0
+            yield compressor.compress(data) if compressor else data
+
+    data = b"".join(parts)
+    yield compressor.compress(data) + compressor.flush() if compressor else data
+
+
+@swag_from({
+  "summary": "Exportar el catálogo completo",
+  "description": "Streaming de todos los libros (sin el límite de 200) en XML o NDJSON, "
+                 "comprimido con gzip si el cliente lo acepta.",
+  "parameters": [
+    {"name": "format", "in": "query", "schema": {"type": "string", "enum": ["xml", "ndjson"]}}
+  ],
+  "responses": {
+    "200": {"description": "Catálogo completo"}
+  }
+})
+@app.route("/api/books/export", methods=["GET"])
+def export_books():
+    fmt = (request.args.get("format") or "xml").lower()
+    if fmt not in ("xml", "ndjson"):
+        return xml_error("format debe ser xml o ndjson", 400)
+
+    gzip_out = "gzip" in request.headers.get("Accept-Encoding", "").lower()
+    mimetype = "application/xml" if fmt == "xml" else "application/x-ndjson"
+
+    resp = Response(iter_export_chunks(fmt, gzip_out), mimetype=mimetype)
+    resp.headers["Vary"] = "Accept-Encoding"
+    if gzip_out:
+        resp.headers["Content-Encoding"] = "gzip"
+    return resp
+
+
+# -------------------------------------------------------
+# POST /api/books/import
+# -------------------------------------------------------
+class LookupCache:
+    """Nombre -> id de Authors/Genres/Formats en memoria; inserta los que faltan."""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        cursor.execute("SELECT author_id, CONCAT(first_name,' ',last_name) FROM Authors")
+        self.authors = {name: id_ for id_, name in cursor.fetchall()}
+        cursor.execute("SELECT genre_id, name FROM Genres")
+        self.genres = {name: id_ for id_, name in cursor.fetchall()}
+        cursor.execute("SELECT format_id, name FROM Formats")
+        self.formats = {name: id_ for id_, name in cursor.fetchall()}
+
+    def author(self, name):
+        if not name:
+            return None
+        if name not in self.authors:
+            first, _, last = name.partition(" ")
+            self.cursor.execute("INSERT INTO Authors(first_name, last_name) VALUES(%s, %s)",
+                                (first, last))
+            self.authors[name] = self.cursor.lastrowid
+        return self.authors[name]
+
+    def _named(self, table, cache, name):
+        if not name:
+            return None
+        if name not in cache:
+            self.cursor.execute(f"INSERT INTO {table}(name) VALUES(%s)", (name,))
+            cache[name] = self.cursor.lastrowid
+        return cache[name]
+
+    def genre(self, name):
+        return self._named("Genres", self.genres, name)
+
+    def format(self, name):
+        return self._named("Formats", self.formats, name)
+
+
+def flush_import_batch(cursor, batch):
+    """Upsert de un lote con executemany y refresco de catalog_view."""
+    with_id = [row for row in batch if row[0] is not None]
+    new = [row[1:] for row in batch if row[0] is None]
+
+    if with_id:
+        cursor.executemany("""
+            INSERT INTO Books(book_id, title, publisher, year, author_id, genre_id, format_id)
+            VALUES(%s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE title=VALUES(title), publisher=VALUES(publisher),
+                year=VALUES(year), author_id=VALUES(author_id),
+                genre_id=VALUES(genre_id), format_id=VALUES(format_id)
+        """, with_id)
+
+    since_id = None
+    if new:
+        cursor.execute("SELECT COALESCE(MAX(book_id), 0) FROM Books")
+        since_id = cursor.fetchone()[0]
+        cursor.executemany("""
+            INSERT INTO Books(title, publisher, year, author_id, genre_id, format_id)
+            VALUES(%s, %s, %s, %s, %s, %s)
+        """, new)
+
+    book_ids = [row[0] for row in with_id]
+    refresh_catalog(cursor, book_ids, since_id, books_changed=True)
+    return book_ids, since_id
+
+
+def int_or_none(text):
+    text = (text or "").strip()
+    return int(text) if text else None
+
+
+@swag_from({
+  "summary": "Importar un catálogo XML completo",
+  "description": "Procesa el XML en streaming (iterparse) y hace upsert por lotes. "
+                 "Mismo formato que GET /api/books; book_id es opcional.",
+  "requestBody": {
+    "required": True,
+    "content": {
+      "application/xml": {"schema": {"type": "string"}}
+    }
+  },
+  "responses": {
+    "200": {"description": "Resumen de la importación (filas, filas/seg)"},
+    "400": {"description": "XML inválido"}
+  }
+})
+@app.route("/api/books/import", methods=["POST"])
+def import_books():
+    # Se lee el cuerpo sin MAX_CONTENT_LENGTH: los feeds pueden pesar varios GB
+    stream = get_input_stream(request.environ)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    lookups = LookupCache(cursor)
+
+    batch = []
+    imported = skipped = batches = 0
+    t0 = time.time()
+
+    try:
+        for book in iter_xml_elements(stream, "book"):
+            title = (book.findtext("title") or "").strip()
+            try:
+                book_id = int_or_none(book.findtext("book_id"))
+                year = int_or_none(book.findtext("year"))
+            except ValueError:
+                skipped += 1
+                continue
+            if not title:
+                skipped += 1
+                continue
+
+            batch.append((
+                book_id, title,
+                (book.findtext("publisher") or "").strip() or None,
+                year,
+                lookups.author((book.findtext("author") or "").strip()),
+                lookups.genre((book.findtext("genre") or "").strip()),
+                lookups.format((book.findtext("format") or "").strip()),
+            ))
+
+            if len(batch) >= IMPORT_BATCH:
+                book_ids, since_id = flush_import_batch(cursor, batch)
+                conn.commit()
+                update_suggest_index(cursor, book_ids, since_id)
+                imported += len(batch)
+                batches += 1
+                batch = []
+
+        if batch:
+            book_ids, since_id = flush_import_batch(cursor, batch)
+            conn.commit()
+            update_suggest_index(cursor, book_ids, since_id)
+            imported += len(batch)
+            batches += 1
+    except ET.ParseError as e:
+        # Los lotes anteriores ya quedaron confirmados
+        conn.rollback()
+        cursor.close()
+        conn.close()
+        return xml_error(f"XML inválido tras {imported} libros: {e}", 400)
+    except MySQLdb.Error as e:
+        # Se descarta sólo el lote en curso; los anteriores ya se confirmaron
+        conn.rollback()
+        cursor.close()
+        conn.close()
+        log.error("Importación interrumpida tras %d libros: %s", imported, e)
+        return xml_error(f"Error de base de datos tras {imported} libros: {e}", 500)
+
+    cursor.close()
+    conn.close()
+
+    elapsed = time.time() - t0
+    rate = imported / elapsed if elapsed > 0 else 0.0
+    log.info("📥 Importación: %d libros en %.2fs → %.0f filas/seg", imported, elapsed, rate)
+
+    root = ET.Element("import_result")
+    ET.SubElement(root, "imported").text = str(imported)
+    ET.SubElement(root, "skipped").text = str(skipped)
+    ET.SubElement(root, "batches").text = str(batches)
+    ET.SubElement(root, "seconds").text = f"{elapsed:.3f}"
+    ET.SubElement(root, "rows_per_sec").text = f"{rate:.1f}"
+
+    return read_your_writes(xml_response(root))
+
+
 # -------------------------------------------------------
 # POST /api/books/<book_id>/images
 # -------------------------------------------------------
@@ -189,43 +747,73 @@ def upload_images(book_id):
     conn = get_db_connection()
     cursor = conn.cursor(MySQLdb.cursors.DictCursor)
 
-    cursor.execute("SELECT COUNT(*) AS n FROM Images WHERE book_id=%s", (book_id,))
-    existing = cursor.fetchone()["n"]
-
-    if existing + len(files) > MAX_IMAGES_PER_BOOK:
-        return xml_error("Máximo 5 imágenes por libro", 400)
-
     uploaded_urls = []
+    new_blobs = []
+    created = []   # blobs que subió esta petición
+
+    def abort(msg, code):
+        # Los blobs nuevos se borran antes del rollback, mientras la fila de
+        # ImageBlobs sigue bloqueada: otra subida del mismo contenido no
+        # puede haberlos dado por existentes
+        for name in created:
+            try:
+                storage.delete(name)
+            except Exception:
+                pass
+        conn.rollback()
+        cursor.close()
+        conn.close()
+        return xml_error(msg, code)
 
-    for f in files:
-
-        ext = f.filename.rsplit(".", 1)[1].lower()
-        if ext not in ALLOWED_EXT:
-            return xml_error("Formato inválido (solo PNG/JPG/JPEG)", 400)
-
-        if len(f.read()) > MAX_MB:
-            return xml_error("Archivo supera 5MB", 400)
-        f.seek(0)
-
-        safe_name = secure_filename(f.filename)
-        blob_name = f"libros/{book_id}_{safe_name}"
-        blob = bucket.blob(blob_name)
-
-        blob.upload_from_file(f.stream, content_type=f.mimetype)
-
-        url = f"https://storage.googleapis.com/{GCS_BUCKET}/{blob_name}"
-
-        cursor.execute("""
-            INSERT INTO Images(book_id, image_url, is_primary, sort_order)
-            VALUES(%s, %s, %s, %s)
-        """, (book_id, url, 0, existing + len(uploaded_urls) + 1))
-
-        uploaded_urls.append(url)
+    try:
+        cursor.execute("SELECT COUNT(*) AS n FROM Images WHERE book_id=%s", (book_id,))
+        existing = cursor.fetchone()["n"]
+
+        if existing + len(files) > MAX_IMAGES_PER_BOOK:
+            return abort("Máximo 5 imágenes por libro", 400)
+
+        for f in files:
+
+            ext = f.filename.rsplit(".", 1)[-1].lower()
+            if "." not in f.filename or ext not in ALLOWED_EXT:
+                return abort("Formato inválido (solo PNG/JPG/JPEG)", 400)
+
+            # Tamaño y SHA-256 en una pasada por bloques, sin cargar el archivo
+            try:
+                sha256, size_bytes = hash_upload(f.stream, MAX_MB)
+            except FileTooLarge:
+                return abort("Archivo supera 5MB", 400)
+
+            # La misma portada subida N veces ocupa un solo blob
+            blob_name, uploaded = store_blob(cursor, f.stream, sha256, f.mimetype, size_bytes)
+            if uploaded:
+                created.append(blob_name)
+            url = storage.url(blob_name)
+
+            cursor.execute("""
+                INSERT INTO Images(book_id, image_url, is_primary, sort_order, sha256)
+                VALUES(%s, %s, %s, %s, %s)
+            """, (book_id, url, 0, existing + len(uploaded_urls) + 1, sha256))
+
+            uploaded_urls.append(url)
+            new_blobs.append((sha256, blob_name))
+
+        refresh_catalog(cursor, [book_id])
+        conn.commit()
+    except FileTooLarge:
+        # storage.put vuelve a leer el archivo con el mismo límite
+        return abort("Archivo supera 5MB", 400)
+    except Exception as e:
+        # Error del bucket (storage.put) o de la BD: no queda nada a medias
+        return abort(f"No se pudieron guardar las imágenes: {e}", 500)
 
-    conn.commit()
     cursor.close()
     conn.close()
 
+    # Las miniaturas se generan después de responder
+    for sha256, blob_name in new_blobs:
+        thumbnailer.submit(sha256, blob_name)
+
     root = ET.Element("upload_result")
     ET.SubElement(root, "book_id").text = str(book_id)
 
@@ -233,7 +821,7 @@ def upload_images(book_id):
     for u in uploaded_urls:
         ET.SubElement(imgs, "image_url").text = u
 
-    return xml_response(root)
+    return read_your_writes(xml_response(root))
 
 
 # -------------------------------------------------------
@@ -258,28 +846,38 @@ def delete_image(book_id, image_id):
     cursor = conn.cursor(MySQLdb.cursors.DictCursor)
 
     cursor.execute("""
-        SELECT image_url FROM Images WHERE image_id=%s AND book_id=%s
+        SELECT image_url, sha256 FROM Images WHERE image_id=%s AND book_id=%s
     """, (image_id, book_id))
     img = cursor.fetchone()
 
     if not img:
         return xml_error("La imagen no existe", 404)
 
-    url = img["image_url"]
-    blob_name = url.split(f"https://storage.googleapis.com/{GCS_BUCKET}/")[1]
+    # Imágenes previas a la deduplicación: el blob se deduce de la URL
+    if img["sha256"]:
+        blob_name = release_blob(cursor, img["sha256"])
+    else:
+        blob_name = storage.name_from_url(img["image_url"])
 
-    try:
-        bucket.blob(blob_name).delete()
-    except:
-        pass
+    # Sin referencias: se va el original junto con sus miniaturas
+    to_delete = [blob_name] if blob_name else []
+    if blob_name and img["sha256"]:
+        to_delete += thumbnail_names(img["sha256"]).values()
+
+    for name in to_delete:
+        try:
+            storage.delete(name)
+        except:
+            pass
 
     cursor.execute("DELETE FROM Images WHERE image_id=%s", (image_id,))
+    refresh_catalog(cursor, [book_id])
     conn.commit()
 
     root = ET.Element("delete_result")
     ET.SubElement(root, "deleted_image_id").text = str(image_id)
 
-    return xml_response(root)
+    return read_your_writes(xml_response(root))
 
 
 # -------------------------------------------------------
@@ -305,26 +903,35 @@ def delete_image(book_id, image_id):
 def update_images(book_id):
 
     try:
-        xml_data = ET.fromstring(request.data)
-    except:
+        changes = [
+            (int(img.findtext("image_id")),
+             int(img.findtext("sort_order")),
+             int(img.findtext("is_primary")))
+            for img in iter_xml_elements(request.stream, "image")
+        ]
+    except (ET.ParseError, TypeError, ValueError):
         return xml_error("XML inválido", 400)
 
+    # Una sola sentencia: el CASE reordena y elige la principal, y el
+    # ELSE 0 sustituye al reseteo previo de is_primary
+    case_whens = " ".join(["WHEN %s THEN %s"] * len(changes))
+    sql = "UPDATE Images SET is_primary = "
+    params = []
+    if changes:
+        sql += f"CASE image_id {case_whens} ELSE 0 END, sort_order = CASE image_id {case_whens} ELSE sort_order END"
+        for image_id, _, is_primary in changes:
+            params += [image_id, is_primary]
+        for image_id, sort_order, _ in changes:
+            params += [image_id, sort_order]
+    else:
+        sql += "0"
+    sql += " WHERE book_id=%s"
+    params.append(book_id)
+
     conn = get_db_connection()
     cursor = conn.cursor()
-
-    cursor.execute("UPDATE Images SET is_primary=0 WHERE book_id=%s", (book_id,))
-
-    for img in xml_data.findall("image"):
-        image_id   = img.findtext("image_id")
-        sort_order = img.findtext("sort_order")
-        is_primary = img.findtext("is_primary")
-
-        cursor.execute("""
-            UPDATE Images
-            SET sort_order=%s, is_primary=%s
-            WHERE image_id=%s AND book_id=%s
-        """, (sort_order, is_primary, image_id, book_id))
-
+    cursor.execute(sql, params)
+    refresh_catalog(cursor, [book_id])
     conn.commit()
     cursor.close()
     conn.close()
@@ -333,13 +940,84 @@ def update_images(book_id):
     ET.SubElement(root, "book_id").text = str(book_id)
     ET.SubElement(root, "status").text = "updated"
 
+    return read_your_writes(xml_response(root))
+
+
+# -------------------------------------------------------
+# GET /api/db/replicas
+# -------------------------------------------------------
+@swag_from({
+  "summary": "Estado de las réplicas de lectura",
+  "description": "Salud y retraso (segundos) de cada réplica según la última comprobación.",
+  "responses": {
+    "200": {"description": "XML con el estado de cada réplica"}
+  }
+})
+@app.route("/api/db/replicas", methods=["GET"])
+def replicas_status():
+    root = ET.Element("replicas")
+    if db_router is not None:
+        db_router.maybe_check()
+        for r in db_router.status():
+            el = ET.SubElement(root, "replica")
+            ET.SubElement(el, "name").text = r["name"]
+            ET.SubElement(el, "healthy").text = "1" if r["healthy"] else "0"
+            ET.SubElement(el, "lag").text = "" if r["lag"] is None else str(r["lag"])
+            ET.SubElement(el, "error").text = r["error"] or ""
     return xml_response(root)
 
 
+# -------------------------------------------------------
+# GET /storage/<name> (sólo con STORAGE_BACKEND=local)
+# -------------------------------------------------------
+if isinstance(storage, LocalStorage):
+    @app.route("/storage/<path:name>", methods=["GET"])
+    def local_storage_object(name):
+        return send_from_directory(storage.root, name)
+
+
+# -------------------------------------------------------
+# PETICIÓN DEMASIADO GRANDE (MAX_CONTENT_LENGTH)
+# -------------------------------------------------------
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    return xml_error("La petición supera el tamaño máximo permitido", 413)
+
+
+@app.errorhandler(PoolExhausted)
+def pool_exhausted(e):
+    return xml_error("Servicio saturado, intenta de nuevo", 503)
+
+
+# -------------------------------------------------------
+# INICIALIZACIÓN POR WORKER (gunicorn post_fork / modo desarrollo)
+# -------------------------------------------------------
+def init_worker():
+    global db_pool, db_router, storage
+    db_pool = ConnectionPool(connect_db, DB_POOL_SIZE)
+    if DB_REPLICAS:
+        replicas = {}
+        for node in DB_REPLICAS:
+            host, _, port = node.partition(":")
+            factory = functools.partial(connect_db, host, int(port or 3306))
+            replicas[node] = ConnectionPool(factory, DB_POOL_SIZE)
+        db_router = DBRouter(db_pool, replicas, DB_MAX_LAG, DB_CHECK_INTERVAL)
+    # El cliente de GCS (sesión HTTP) no se comparte con el proceso maestro
+    storage = create_storage(STORAGE_BACKEND, bucket=GCS_BUCKET,
+                             root=LOCAL_STORAGE_DIR, base_url=LOCAL_STORAGE_URL)
+    thumbnailer.storage = storage
+    try:
+        ensure_suggest_index()
+    except Exception as e:
+        print(f"⚠️  Índice de autocompletado pendiente: {e}")
+
+
 # -------------------------------------------------------
 # MAIN
 # -------------------------------------------------------
 if __name__ == "__main__":
     print("🔥 Microservicio Libros + Imágenes corriendo en http://0.0.0.0:5001")
     print("📘 Documentación Swagger en: http://localhost:5001/apidocs")
-    app.run(debug=True, port=5001)
+    print("🚀 Producción: gunicorn -c ../gunicorn.conf.py main:app")
+    init_worker()
+    app.run(debug=os.getenv("FLASK_DEBUG") == "1", port=5001, threaded=True)
@@ -0,0 +1,429 @@
+# ------------------------------------------
+# Microservicio Libros + Imágenes — versión ASGI (asíncrona)
+# Descripción: mismas rutas y mismo XML que main.py para el catálogo y las
+#              imágenes, sobre aiomysql y un cliente de almacenamiento
+#              asíncrono. Una petición esperando a MariaDB o a GCS no ocupa
+#              un hilo, así que un solo proceso atiende miles de clientes
+#              lentos a la vez.
+# Autor: Pablo Celedón Cabriales
+#
+#   pip install quart quart-cors aiomysql hypercorn gcloud-aio-storage
+#   hypercorn main_async:app --bind 0.0.0.0:5003
+#
+# Importación/exportación, sugerencias, /metrics y Swagger siguen en main.py.
+# ------------------------------------------
+from quart import Quart, Response, request, send_from_directory
+from quart_cors import cors
+import aiomysql
+import asyncio
+import hashlib
+import os
+import xml.etree.ElementTree as ET
+from contextlib import asynccontextmanager
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from async_storage import create_async_storage
+from storage_backend import create_storage, CHUNK_SIZE
+from thumbnails import ThumbnailWorker, thumbnail_names
+from catalog import catalog_refresh_statements, facets_query, build_books_xml
+from db_pool import PoolExhausted
+
+# -------------------------------------------------------
+# APP
+# -------------------------------------------------------
+app = Quart(__name__)
+app = cors(app, allow_origin="*")
+
+# -------------------------------------------------------
+# CONFIGURACIÓN (mismas variables que main.py)
+# -------------------------------------------------------
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "gcs")
+GCS_BUCKET = os.getenv("GCS_BUCKET", "pablocc23-i")
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "./storage")
+LOCAL_STORAGE_URL = os.getenv("LOCAL_STORAGE_URL", "http://localhost:5003/storage")
+if STORAGE_BACKEND == "gcs":
+    os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS",
+                          "/home/pablocomputer23/Microservices/buckets/libros/pablocc23-i-key.json")
+
+ALLOWED_EXT = {"png", "jpg", "jpeg"}
+MAX_MB = 5 * 1024 * 1024     # 5MB
+MAX_IMAGES_PER_BOOK = 5
+
+app.config["MAX_CONTENT_LENGTH"] = MAX_IMAGES_PER_BOOK * MAX_MB + 1024 * 1024
+
+# Con async las conexiones sólo se ocupan durante la consulta, no durante
+# toda la petición: pocas conexiones alcanzan para muchos clientes
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 20))
+DB_ACQUIRE_TIMEOUT = float(os.getenv("DB_ACQUIRE_TIMEOUT", 5))
+
+db_pool = None
+storage = None
+loop = None
+
+# -------------------------------------------------------
+# ARRANQUE / APAGADO (dentro del event loop)
+# -------------------------------------------------------
+@app.before_serving
+async def startup():
+    global db_pool, storage, loop
+    loop = asyncio.get_running_loop()
+    db_pool = await aiomysql.create_pool(
+        host="localhost",
+        user="libros_user",
+        password="666",
+        db="Libros",
+        charset="utf8",
+        minsize=1,
+        maxsize=DB_POOL_SIZE,
+        pool_recycle=3600
+    )
+    storage = create_async_storage(STORAGE_BACKEND, bucket=GCS_BUCKET,
+                                   root=LOCAL_STORAGE_DIR, base_url=LOCAL_STORAGE_URL)
+
+
+@app.after_serving
+async def shutdown():
+    db_pool.close()
+    await db_pool.wait_closed()
+    await storage.close()
+
+
+@asynccontextmanager
+async def db_cursor():
+    """Cursor de diccionario; si no hubo commit se hace rollback al salir."""
+    try:
+        conn = await asyncio.wait_for(db_pool.acquire(), DB_ACQUIRE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise PoolExhausted(f"Sin conexiones libres tras {DB_ACQUIRE_TIMEOUT}s") from None
+    try:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            yield conn, cursor
+    finally:
+        # aiomysql cierra (en vez de reutilizar) una conexión con transacción abierta
+        if conn.get_transaction_status():
+            await conn.rollback()
+        db_pool.release(conn)
+
+
+async def refresh_catalog(cursor, book_ids=(), since_id=None):
+    for sql, params in catalog_refresh_statements(book_ids, since_id):
+        await cursor.execute(sql, params)
+
+
+# -------------------------------------------------------
+# BLOBS DIRECCIONADOS POR CONTENIDO (SHA-256 + ref_count)
+# -------------------------------------------------------
+class FileTooLarge(Exception):
+    pass
+
+
+def hash_upload(stream, limit):
+    """(sha256, tamaño) leyendo por bloques; se ejecuta en un hilo."""
+    sha256 = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > limit:
+            raise FileTooLarge()
+        sha256.update(chunk)
+    stream.seek(0)
+    return sha256.hexdigest(), size
+
+
+def blob_name_for(sha256):
+    return f"libros/{sha256}"
+
+
+async def add_blob_ref(cursor, sha256, mime, size_bytes):
+    await cursor.execute("""
+        INSERT INTO ImageBlobs(sha256, mime_type, size_bytes, ref_count)
+        VALUES(%s, %s, %s, 1)
+        ON DUPLICATE KEY UPDATE ref_count = ref_count + 1
+    """, (sha256, mime, size_bytes))
+    return blob_name_for(sha256)
+
+
+async def upload_if_missing(name, stream, mime):
+    """True si esta llamada creó el blob; si la subida falla, borra lo parcial."""
+    if await storage.exists(name):
+        return False
+    try:
+        await storage.put(name, stream, content_type=mime)
+    except Exception:
+        try:
+            await storage.delete(name)
+        except Exception:
+            pass
+        raise
+    return True
+
+
+async def release_blob(cursor, sha256):
+    """Resta una referencia; devuelve el blob a borrar si ya nadie lo usa."""
+    await cursor.execute("SELECT ref_count FROM ImageBlobs WHERE sha256=%s FOR UPDATE", (sha256,))
+    row = await cursor.fetchone()
+    if row and row["ref_count"] > 1:
+        await cursor.execute("UPDATE ImageBlobs SET ref_count = ref_count - 1 WHERE sha256=%s", (sha256,))
+        return None
+    await cursor.execute("DELETE FROM ImageBlobs WHERE sha256=%s", (sha256,))
+    return blob_name_for(sha256)
+
+
+# -------------------------------------------------------
+# MINIATURAS (hilos de ThumbnailWorker + registro en el event loop)
+# -------------------------------------------------------
+async def record_thumbnails_async(sha256, urls):
+    async with db_cursor() as (conn, cursor):
+        await cursor.execute("""
+            UPDATE Images SET thumb_url=%s, thumb_webp_url=%s WHERE sha256=%s
+        """, (urls["jpeg"], urls["webp"], sha256))
+        await cursor.execute("SELECT DISTINCT book_id FROM Images WHERE sha256=%s", (sha256,))
+        await refresh_catalog(cursor, [row["book_id"] for row in await cursor.fetchall()])
+        await conn.commit()
+
+
+def record_thumbnails(sha256, urls):
+    # Llamado desde un hilo del worker: la escritura corre en el event loop
+    asyncio.run_coroutine_threadsafe(record_thumbnails_async(sha256, urls), loop).result()
+
+
+# Pillow trabaja en hilos con el cliente síncrono; no bloquea el event loop
+thumbnailer = ThumbnailWorker(
+    create_storage(STORAGE_BACKEND, bucket=GCS_BUCKET,
+                   root=LOCAL_STORAGE_DIR, base_url=LOCAL_STORAGE_URL),
+    record_thumbnails
+)
+
+
+# -------------------------------------------------------
+# UTILIDADES XML
+# -------------------------------------------------------
+def xml_error(msg, code=400):
+    root = ET.Element("error")
+    root.text = msg
+    return Response(ET.tostring(root), mimetype="application/xml", status=code)
+
+
+def xml_response(root):
+    return Response(ET.tostring(root, encoding="utf-8"), mimetype="application/xml")
+
+
+# -------------------------------------------------------
+# GET /api/books
+# -------------------------------------------------------
+@app.route("/api/books", methods=["GET"])
+async def get_books():
+    q = (request.args.get("q") or "").strip()
+
+    sql = """
+        SELECT book_id, title, publisher, year, author_name,
+               genre_name, format_name, images_json
+        FROM catalog_view
+    """
+    where, params = None, ()
+
+    if q:
+        where = "title LIKE %s OR author_first_name LIKE %s OR author_last_name LIKE %s"
+        like = f"%{q}%"
+        params = (like, like, like)
+        sql += " WHERE " + where
+
+    sql += " ORDER BY book_id LIMIT 200"
+
+    async with db_cursor() as (conn, cursor):
+        await cursor.execute(sql, params)
+        rows = await cursor.fetchall()
+        await cursor.execute(*facets_query(where, params))
+        facets = await cursor.fetchall()
+
+    return xml_response(build_books_xml(rows, facets))
+
+
+# -------------------------------------------------------
+# POST /api/books/<book_id>/images
+# -------------------------------------------------------
+@app.route("/api/books/<int:book_id>/images", methods=["POST"])
+async def upload_images(book_id):
+
+    files = (await request.files).getlist("images")
+    if not files:
+        return xml_error("No se enviaron imágenes", 400)
+
+    async with db_cursor() as (conn, cursor):
+        await cursor.execute("SELECT COUNT(*) AS n FROM Images WHERE book_id=%s", (book_id,))
+        existing = (await cursor.fetchone())["n"]
+
+        if existing + len(files) > MAX_IMAGES_PER_BOOK:
+            return xml_error("Máximo 5 imágenes por libro", 400)
+
+        uploaded_urls = []
+        pending = {}   # blob -> (stream, mime): un mismo contenido se sube una vez
+
+        for f in files:
+
+            ext = f.filename.rsplit(".", 1)[-1].lower()
+            if "." not in f.filename or ext not in ALLOWED_EXT:
+                return xml_error("Formato inválido (solo PNG/JPG/JPEG)", 400)
+
+            try:
+                sha256, size_bytes = await asyncio.to_thread(hash_upload, f.stream, MAX_MB)
+            except FileTooLarge:
+                return xml_error("Archivo supera 5MB", 400)
+
+            blob_name = await add_blob_ref(cursor, sha256, f.mimetype, size_bytes)
+            url = storage.url(blob_name)
+
+            await cursor.execute("""
+                INSERT INTO Images(book_id, image_url, is_primary, sort_order, sha256)
+                VALUES(%s, %s, %s, %s, %s)
+            """, (book_id, url, 0, existing + len(uploaded_urls) + 1, sha256))
+
+            uploaded_urls.append(url)
+            pending.setdefault(blob_name, (sha256, f.stream, f.mimetype))
+
+        # Las filas de ImageBlobs quedan bloqueadas hasta el commit; las
+        # subidas de los distintos archivos van en paralelo
+        names = list(pending)
+        results = await asyncio.gather(*(
+            upload_if_missing(name, pending[name][1], pending[name][2])
+            for name in names
+        ), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            # Como en main.py: los blobs nuevos se borran antes del rollback
+            # (al salir de db_cursor), mientras ImageBlobs sigue bloqueada
+            created = [name for name, r in zip(names, results) if r is True]
+            await asyncio.gather(*(storage.delete(name) for name in created),
+                                 return_exceptions=True)
+            return xml_error(f"No se pudieron subir las imágenes: {errors[0]}", 500)
+
+        await refresh_catalog(cursor, [book_id])
+        await conn.commit()
+
+    for blob_name, (sha256, _, _) in pending.items():
+        thumbnailer.submit(sha256, blob_name)
+
+    root = ET.Element("upload_result")
+    ET.SubElement(root, "book_id").text = str(book_id)
+
+    imgs = ET.SubElement(root, "uploaded_images")
+    for u in uploaded_urls:
+        ET.SubElement(imgs, "image_url").text = u
+
+    return xml_response(root)
+
+
+# -------------------------------------------------------
+# DELETE /api/books/<book_id>/images/<image_id>
+# -------------------------------------------------------
+@app.route("/api/books/<int:book_id>/images/<int:image_id>", methods=["DELETE"])
+async def delete_image(book_id, image_id):
+
+    async with db_cursor() as (conn, cursor):
+        await cursor.execute("""
+            SELECT image_url, sha256 FROM Images WHERE image_id=%s AND book_id=%s
+        """, (image_id, book_id))
+        img = await cursor.fetchone()
+
+        if not img:
+            return xml_error("La imagen no existe", 404)
+
+        if img["sha256"]:
+            blob_name = await release_blob(cursor, img["sha256"])
+        else:
+            blob_name = storage.name_from_url(img["image_url"])
+
+        to_delete = [blob_name] if blob_name else []
+        if blob_name and img["sha256"]:
+            to_delete += thumbnail_names(img["sha256"]).values()
+
+        # Original y miniaturas se borran en paralelo; los fallos se ignoran
+        # igual que en main.py
+        await asyncio.gather(*(storage.delete(name) for name in to_delete),
+                             return_exceptions=True)
+
+        await cursor.execute("DELETE FROM Images WHERE image_id=%s", (image_id,))
+        await refresh_catalog(cursor, [book_id])
+        await conn.commit()
+
+    root = ET.Element("delete_result")
+    ET.SubElement(root, "deleted_image_id").text = str(image_id)
+
+    return xml_response(root)
+
+
+# -------------------------------------------------------
+# PUT /api/books/<book_id>/images
+# -------------------------------------------------------
+@app.route("/api/books/<int:book_id>/images", methods=["PUT"])
+async def update_images(book_id):
+
+    try:
+        root = ET.fromstring(await request.get_data())
+        changes = [
+            (int(img.findtext("image_id")),
+             int(img.findtext("sort_order")),
+             int(img.findtext("is_primary")))
+            for img in root.iter("image")
+        ]
+    except (ET.ParseError, TypeError, ValueError):
+        return xml_error("XML inválido", 400)
+
+    case_whens = " ".join(["WHEN %s THEN %s"] * len(changes))
+    sql = "UPDATE Images SET is_primary = "
+    params = []
+    if changes:
+        sql += f"CASE image_id {case_whens} ELSE 0 END, sort_order = CASE image_id {case_whens} ELSE sort_order END"
+        for image_id, _, is_primary in changes:
+            params += [image_id, is_primary]
+        for image_id, sort_order, _ in changes:
+            params += [image_id, sort_order]
+    else:
+        sql += "0"
+    sql += " WHERE book_id=%s"
+    params.append(book_id)
+
+    async with db_cursor() as (conn, cursor):
+        await cursor.execute(sql, params)
+        await refresh_catalog(cursor, [book_id])
+        await conn.commit()
+
+    root = ET.Element("update_result")
+    ET.SubElement(root, "book_id").text = str(book_id)
+    ET.SubElement(root, "status").text = "updated"
+
+    return xml_response(root)
+
+
+# -------------------------------------------------------
+# GET /storage/<name> (sólo con STORAGE_BACKEND=local)
+# -------------------------------------------------------
+if STORAGE_BACKEND == "local":
+    @app.route("/storage/<path:name>", methods=["GET"])
+    async def local_storage_object(name):
+        return await send_from_directory(os.path.abspath(LOCAL_STORAGE_DIR), name)
+
+
+# -------------------------------------------------------
+# ERRORES
+# -------------------------------------------------------
+@app.errorhandler(RequestEntityTooLarge)
+async def request_too_large(e):
+    return xml_error("La petición supera el tamaño máximo permitido", 413)
+
+
+@app.errorhandler(PoolExhausted)
+async def pool_exhausted(e):
+    return xml_error("Servicio saturado, intenta de nuevo", 503)
+
+
+# -------------------------------------------------------
+# MAIN
+# -------------------------------------------------------
+if __name__ == "__main__":
+    print("⚡ Libros (ASGI) corriendo en http://0.0.0.0:5003")
+    print("🚀 Producción: hypercorn main_async:app --bind 0.0.0.0:5003")
+    app.run(host="0.0.0.0", port=5003)
@@ -0,0 +1,122 @@
+# -------------------------------------------------------
+# MÉTRICAS POR FASE
+# Cada petición acumula el tiempo de sus fases (pool, query, fetch,
+# serialize...) y lo devuelve en la cabecera Server-Timing. Los mismos
+# valores se agregan en histogramas que se exponen en /metrics con el
+# formato de texto de Prometheus (contadores por proceso).
+# -------------------------------------------------------
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+
+MS_BUCKETS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # último = +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class PhaseMetrics:
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self._phases = {}   # (endpoint, fase) -> Histogram (ms)
+        self._bytes = {}    # endpoint -> Histogram (bytes enviados)
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, phases, bytes_out):
+        with self._lock:
+            for name, ms in phases.items():
+                key = (endpoint, name)
+                if key not in self._phases:
+                    self._phases[key] = Histogram(MS_BUCKETS)
+                self._phases[key].observe(ms)
+            if bytes_out is not None:
+                if endpoint not in self._bytes:
+                    self._bytes[endpoint] = Histogram(BYTES_BUCKETS)
+                self._bytes[endpoint].observe(bytes_out)
+
+    def render(self):
+        lines = []
+
+        def emit(metric, labels, hist):
+            acc = 0
+            for le, n in zip(list(hist.buckets) + ["+Inf"], hist.counts):
+                acc += n
+                lines.append(f'{metric}_bucket{{{labels},le="{le}"}} {acc}')
+            lines.append(f"{metric}_sum{{{labels}}} {hist.total:.3f}")
+            lines.append(f"{metric}_count{{{labels}}} {hist.count}")
+
+        with self._lock:
+            lines.append(f"# TYPE {self.prefix}_phase_ms histogram")
+            for (endpoint, name), hist in sorted(self._phases.items()):
+                emit(f"{self.prefix}_phase_ms", f'endpoint="{endpoint}",phase="{name}"', hist)
+            lines.append(f"# TYPE {self.prefix}_response_bytes histogram")
+            for endpoint, hist in sorted(self._bytes.items()):
+                emit(f"{self.prefix}_response_bytes", f'endpoint="{endpoint}"', hist)
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def phase(name):
+    """Suma la duración del bloque a la fase `name` de la petición actual.
+
+    Fuera de una petición (hilos en segundo plano) no mide nada.
+    """
+    if not has_request_context():
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases = g.setdefault("phases", {})
+        phases[name] = phases.get(name, 0.0) + (time.perf_counter() - t0) * 1000
+
+
+def init_app(app, metrics):
+    """Registra los hooks de Server-Timing y la ruta /metrics."""
+
+    @app.before_request
+    def _start_timer():
+        g.phases = {}
+        g.t_start = time.perf_counter()
+
+    @app.after_request
+    def _server_timing(resp):
+        if "t_start" not in g or request.path == "/metrics":
+            return resp
+        phases = dict(g.phases)
+        phases["total"] = (time.perf_counter() - g.t_start) * 1000
+        # En respuestas en streaming el tamaño no se conoce aquí
+        bytes_out = None if resp.is_streamed else resp.calculate_content_length()
+
+        parts = [f"{name};dur={ms:.2f}" for name, ms in phases.items()]
+        if bytes_out is not None:
+            parts.append(f'bytes;desc="{bytes_out}"')
+        resp.headers["Server-Timing"] = ", ".join(parts)
+        resp.headers["Timing-Allow-Origin"] = "*"
+
+        endpoint = request.url_rule.rule if request.url_rule else "404"
+        metrics.observe(endpoint, phases, bytes_out)
+        return resp
+
+    @app.route("/metrics", methods=["GET"])
+    def _metrics():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,2 @@
+-- Permiso para que el enrutador lea Seconds_Behind_Master (SHOW SLAVE STATUS)
+GRANT SLAVE MONITOR ON *.* TO 'libros_user'@'%';
@@ -0,0 +1,348 @@
+# ------------------------------------------
+# Backends de almacenamiento de objetos
+# Descripción: interfaz común (put/get/delete/list/url) con implementación
+#              para Google Cloud Storage y para disco local (pruebas offline)
+# Autor: Pablo Celedón Cabriales
+#
+# Copia idéntica en EjercicioGuiado17 y 18: editar la de 17 y ejecutar
+#   python3 ../check_shared_modules.py --sync
+# ------------------------------------------
+
+import hashlib
+import hmac
+import os
+import shutil
+import threading
+import time
+import uuid
+from urllib.parse import urlencode
+
+CHUNK_SIZE = 1024 * 1024  # 1 MB (múltiplo de 256 KB, requisito de GCS)
+RESUMABLE_ALIGN = 256 * 1024  # todo bloque no final de una sesión resumible
+
+
+class ObjectNotFound(Exception):
+    pass
+
+
+class StorageBackend:
+    """Operaciones mínimas que los microservicios usan sobre el bucket."""
+
+    def put(self, name, stream, content_type=None):
+        raise NotImplementedError
+
+    def get(self, name):
+        """Devuelve un objeto tipo archivo de lectura binaria."""
+        raise NotImplementedError
+
+    def delete(self, name):
+        raise NotImplementedError
+
+    def list(self, prefix=""):
+        raise NotImplementedError
+
+    def exists(self, name):
+        raise NotImplementedError
+
+    def stat(self, name):
+        """{"size": bytes, "content_type": str o None}; ObjectNotFound si no existe."""
+        raise NotImplementedError
+
+    def move(self, src, dst):
+        raise NotImplementedError
+
+    def url(self, name, expires=None, content_type=None):
+        """URL pública, o firmada si se indica `expires` (timedelta)."""
+        raise NotImplementedError
+
+    def signed_put_url(self, name, expires, content_type):
+        """URL para que el cliente suba el objeto directamente con PUT."""
+        raise NotImplementedError
+
+    # Subida resumible por bloques: la sesión es un texto que el servicio
+    # guarda en la BD, así cualquier worker puede continuarla
+    def start_resumable(self, name, content_type, size):
+        raise NotImplementedError
+
+    def write_chunk(self, name, session, offset, data, total):
+        """Escribe `data` en [offset, offset + len); el último bloque cierra el objeto.
+
+        Devuelve cuántos bytes del objeto quedaron guardados (puede ser menos
+        que offset + len si el almacenamiento aceptó el bloque sólo en parte).
+        """
+        raise NotImplementedError
+
+    def abort_resumable(self, name, session):
+        raise NotImplementedError
+
+    def name_from_url(self, url):
+        prefix = self.url("")
+        return url[len(prefix):] if url.startswith(prefix) else None
+
+
+# -----------------------------
+# Google Cloud Storage
+# -----------------------------
+class GCSStorage(StorageBackend):
+
+    def __init__(self, bucket_name, chunk_size=CHUNK_SIZE):
+        self.bucket_name = bucket_name
+        self.chunk_size = chunk_size
+        self._client = None
+        self._bucket = None
+        self._lock = threading.Lock()
+
+    @property
+    def bucket(self):
+        # El cliente (import de google.cloud, credenciales y sesión HTTP) se
+        # crea en el primer uso: arrancar el servicio no paga ese costo y
+        # las URLs públicas no lo necesitan
+        if self._bucket is None:
+            with self._lock:
+                if self._bucket is None:
+                    from google.cloud import storage
+
+                    self._client = storage.Client()
+                    self._bucket = self._client.bucket(self.bucket_name)
+        return self._bucket
+
+    @property
+    def client(self):
+        return self.bucket.client
+
+    def put(self, name, stream, content_type=None):
+        # chunk_size fijo: la subida resumible lee bloques de 1 MB en lugar
+        # del bloque por defecto de 100 MB
+        blob = self.bucket.blob(name, chunk_size=self.chunk_size)
+        blob.upload_from_file(stream, content_type=content_type)
+
+    def get(self, name):
+        from google.api_core.exceptions import NotFound
+
+        blob = self.bucket.blob(name, chunk_size=self.chunk_size)
+        # open() es perezoso: sin reload el NotFound saltaría en la primera
+        # lectura, ya lejos de aquí
+        try:
+            blob.reload()
+        except NotFound:
+            raise ObjectNotFound(name)
+        return blob.open("rb")
+
+    def delete(self, name):
+        from google.api_core.exceptions import NotFound
+
+        try:
+            self.bucket.blob(name).delete()
+        except NotFound:
+            raise ObjectNotFound(name)
+
+    def list(self, prefix=""):
+        for blob in self.client.list_blobs(self.bucket_name, prefix=prefix or None):
+            yield blob.name
+
+    def exists(self, name):
+        return self.bucket.blob(name).exists()
+
+    def stat(self, name):
+        blob = self.bucket.get_blob(name)
+        if blob is None:
+            raise ObjectNotFound(name)
+        return {"size": blob.size, "content_type": blob.content_type}
+
+    def move(self, src, dst):
+        # Copia dentro del bucket (sin pasar los bytes por el servidor)
+        source = self.bucket.blob(src)
+        self.bucket.copy_blob(source, self.bucket, dst)
+        source.delete()
+
+    def url(self, name, expires=None, content_type=None):
+        if expires is None:
+            return f"https://storage.googleapis.com/{self.bucket_name}/{name}"
+        return self.bucket.blob(name).generate_signed_url(
+            expiration=expires,
+            version="v4",
+            method="GET",
+            response_type=content_type
+        )
+
+    def signed_put_url(self, name, expires, content_type):
+        # El cliente debe enviar exactamente este Content-Type
+        return self.bucket.blob(name).generate_signed_url(
+            expiration=expires,
+            version="v4",
+            method="PUT",
+            content_type=content_type
+        )
+
+    def start_resumable(self, name, content_type, size):
+        # La URL de la sesión es la credencial: vale una semana
+        return self.bucket.blob(name).create_resumable_upload_session(
+            content_type=content_type, size=size)
+
+    def write_chunk(self, name, session, offset, data, total):
+        import requests
+
+        end = offset + len(data) - 1
+        resp = requests.put(session, data=data, timeout=60, headers={
+            "Content-Range": f"bytes {offset}-{end}/{total}"
+        })
+        # 308 = bloque recibido, faltan más; 200/201 = objeto completo
+        if resp.status_code not in (200, 201, 308):
+            raise IOError(f"GCS rechazó el bloque ({resp.status_code}): {resp.text[:200]}")
+        if resp.status_code != 308:
+            return total
+        # Range: bytes=0-N es lo que GCS ya persistió; sin cabecera, nada
+        persisted = resp.headers.get("Range")
+        return int(persisted.rsplit("-", 1)[1]) + 1 if persisted else 0
+
+    def abort_resumable(self, name, session):
+        import requests
+
+        requests.delete(session, timeout=10)
+
+
+# -----------------------------
+# Disco local
+# -----------------------------
+class LocalStorage(StorageBackend):
+    """Guarda los objetos como archivos bajo `root`.
+
+    Las URLs apuntan a `base_url`, que el microservicio sirve con la ruta
+    /storage/<name>. Las URLs de subida se firman con HMAC usando `secret`
+    (el equivalente local a las URLs firmadas de GCS).
+    """
+
+    def __init__(self, root, base_url, secret=None):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/")
+        self.secret = (secret or uuid.uuid4().hex).encode()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, name):
+        path = os.path.abspath(os.path.join(self.root, name))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Nombre de objeto inválido: {name}")
+        return path
+
+    def put(self, name, stream, content_type=None):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Se escribe a un temporal y se renombra: un lector nunca ve un
+        # archivo a medias y una subida abortada no deja basura visible
+        tmp = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            with open(tmp, "wb") as out:
+                shutil.copyfileobj(stream, out, CHUNK_SIZE)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def get(self, name):
+        try:
+            return open(self._path(name), "rb")
+        except FileNotFoundError:
+            raise ObjectNotFound(name)
+
+    def delete(self, name):
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            raise ObjectNotFound(name)
+
+    def list(self, prefix=""):
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(".part"):
+                    continue
+                name = os.path.relpath(os.path.join(dirpath, filename), self.root)
+                name = name.replace(os.sep, "/")
+                if name.startswith(prefix):
+                    yield name
+
+    def exists(self, name):
+        return os.path.isfile(self._path(name))
+
+    def stat(self, name):
+        try:
+            return {"size": os.path.getsize(self._path(name)), "content_type": None}
+        except FileNotFoundError:
+            raise ObjectNotFound(name)
+
+    def move(self, src, dst):
+        path = self._path(dst)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.replace(self._path(src), path)
+        except FileNotFoundError:
+            raise ObjectNotFound(src)
+
+    def url(self, name, expires=None, content_type=None):
+        return f"{self.base_url}/{name}"
+
+    def _session_path(self, name, session):
+        if not session.isalnum():
+            raise ValueError(f"Sesión inválida: {session}")
+        return f"{self._path(name)}.{session}.part"
+
+    def start_resumable(self, name, content_type, size):
+        session = uuid.uuid4().hex
+        path = self._session_path(name, session)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "wb").close()
+        return session
+
+    def write_chunk(self, name, session, offset, data, total):
+        path = self._session_path(name, session)
+        try:
+            with open(path, "r+b") as out:
+                out.seek(offset)
+                out.write(data)
+                out.truncate()
+        except FileNotFoundError:
+            raise ObjectNotFound(name)
+        if offset + len(data) >= total:
+            os.replace(path, self._path(name))
+        return offset + len(data)
+
+    def abort_resumable(self, name, session):
+        try:
+            os.remove(self._session_path(name, session))
+        except FileNotFoundError:
+            pass
+
+    def _put_signature(self, name, expires_at, content_type):
+        msg = f"PUT\n{name}\n{expires_at}\n{content_type or ''}".encode()
+        return hmac.new(self.secret, msg, hashlib.sha256).hexdigest()
+
+    def signed_put_url(self, name, expires, content_type):
+        expires_at = int(time.time() + expires.total_seconds())
+        query = urlencode({
+            "expires": expires_at,
+            "signature": self._put_signature(name, expires_at, content_type)
+        })
+        return f"{self.base_url}/{name}?{query}"
+
+    def verify_put(self, name, expires_at, signature, content_type):
+        """Valida una URL de signed_put_url (firma, vigencia y Content-Type)."""
+        try:
+            expires_at = int(expires_at)
+        except (TypeError, ValueError):
+            return False
+        if expires_at < time.time():
+            return False
+        expected = self._put_signature(name, expires_at, content_type)
+        return hmac.compare_digest(expected, signature or "")
+
+
+# -----------------------------
+# Selección por configuración
+# -----------------------------
+def create_storage(kind, bucket=None, root=None, base_url=None, secret=None):
+    """kind: "gcs" (por defecto) o "local"."""
+    kind = (kind or "gcs").lower()
+    if kind == "local":
+        return LocalStorage(root or "./storage", base_url or "/storage", secret)
+    if kind == "gcs":
+        return GCSStorage(bucket)
+    raise ValueError(f"STORAGE_BACKEND desconocido: {kind}")
@@ -0,0 +1,89 @@
+# -------------------------------------------------------
+# ÍNDICE DE AUTOCOMPLETADO EN MEMORIA
+# Arreglo ordenado de claves sin acentos (títulos y autores) con búsqueda
+# por prefijo mediante bisect: O(log n + k) por consulta, sin tocar la BD.
+# -------------------------------------------------------
+import bisect
+import threading
+import time
+import unicodedata
+
+
+def fold(text):
+    """Minúsculas y sin acentos: 'Cortázar' -> 'cortazar'."""
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in text if not unicodedata.combining(c)).casefold().strip()
+
+
+def word_keys(text):
+    """Una clave por cada inicio de palabra: 'cien anos', 'anos'."""
+    words = fold(text).split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+class SuggestIndex:
+
+    def __init__(self):
+        self._entries = []   # (clave, book_id) ordenado
+        self._books = {}     # book_id -> (title, author, claves)
+        self._lock = threading.Lock()
+        self.built_at = 0.0
+
+    @staticmethod
+    def _keys(title, author):
+        return sorted(set(word_keys(title) + word_keys(author)))
+
+    def build(self, rows):
+        """rows: iterable de (book_id, title, author)."""
+        entries, books = [], {}
+        for book_id, title, author in rows:
+            keys = self._keys(title, author)
+            books[book_id] = (title or "", author or "", keys)
+            entries.extend((key, book_id) for key in keys)
+        entries.sort()
+        with self._lock:
+            self._entries, self._books = entries, books
+            self.built_at = time.time()
+
+    def _remove_locked(self, book_id):
+        old = self._books.pop(book_id, None)
+        if not old:
+            return
+        for key in old[2]:
+            i = bisect.bisect_left(self._entries, (key, book_id))
+            if i < len(self._entries) and self._entries[i] == (key, book_id):
+                del self._entries[i]
+
+    def upsert(self, book_id, title, author):
+        keys = self._keys(title, author)
+        with self._lock:
+            self._remove_locked(book_id)
+            self._books[book_id] = (title or "", author or "", keys)
+            for key in keys:
+                bisect.insort(self._entries, (key, book_id))
+
+    def remove(self, book_id):
+        with self._lock:
+            self._remove_locked(book_id)
+
+    def search(self, prefix, limit=10):
+        """Primeros `limit` libros cuyo título o autor tiene una palabra con ese prefijo."""
+        prefix = fold(prefix)
+        if not prefix:
+            return []
+        out, seen = [], set()
+        with self._lock:
+            i = bisect.bisect_left(self._entries, (prefix,))
+            while i < len(self._entries) and len(out) < limit:
+                key, book_id = self._entries[i]
+                if not key.startswith(prefix):
+                    break
+                if book_id not in seen:
+                    seen.add(book_id)
+                    title, author, _ = self._books[book_id]
+                    out.append({"book_id": book_id, "title": title, "author": author})
+                i += 1
+        return out
+
+    def __len__(self):
+        return len(self._books)
@@ -0,0 +1,115 @@
+# -------------------------------------------------------
+# MINIATURAS EN SEGUNDO PLANO
+# Genera derivados WebP/JPEG de cada imagen subida sin bloquear la petición.
+# Requiere Pillow (pip install pillow); sin Pillow las subidas siguen
+# funcionando y el catálogo sólo anuncia la imagen original.
+# -------------------------------------------------------
+import io
+import logging
+import os
+import queue
+import threading
+
+from storage_backend import ObjectNotFound
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+log = logging.getLogger(__name__)
+
+THUMB_WIDTH = 320
+JPEG_QUALITY = 80
+WEBP_QUALITY = 75
+
+
+def thumbnail_names(sha256, width=THUMB_WIDTH):
+    """Nombres de los derivados; dependen sólo del contenido del original."""
+    return {
+        "jpeg": f"thumbs/{sha256}_{width}.jpg",
+        "webp": f"thumbs/{sha256}_{width}.webp",
+    }
+
+
+def render_thumbnails(src, width=THUMB_WIDTH):
+    """Lee la imagen de `src` y devuelve {"jpeg": bytes, "webp": bytes}."""
+    img = Image.open(src)
+    # draft() permite al decodificador JPEG escalar al leer (1/2, 1/4, 1/8)
+    img.draft("RGB", (width, width * 4))
+    img = img.convert("RGB")
+    img.thumbnail((width, width * 4))
+
+    out = {}
+    for fmt, quality in (("jpeg", JPEG_QUALITY), ("webp", WEBP_QUALITY)):
+        buf = io.BytesIO()
+        img.save(buf, format=fmt.upper(), quality=quality)
+        out[fmt] = buf.getvalue()
+    return out
+
+
+class ThumbnailWorker:
+    """Cola + hilos daemon que generan miniaturas a través del backend de almacenamiento.
+
+    `on_done(sha256, urls)` recibe las URLs de los derivados para guardarlas
+    en la base de datos. Los hilos arrancan con el primer trabajo del
+    proceso, así un servidor pre-fork no pierde los hilos al hacer fork.
+    """
+
+    def __init__(self, storage, on_done, workers=2, width=THUMB_WIDTH):
+        self.storage = storage
+        self.on_done = on_done
+        self.workers = workers
+        self.width = width
+        self.queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def submit(self, sha256, blob_name):
+        if Image is None:
+            return
+        self._ensure_started()
+        self.queue.put((sha256, blob_name))
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            for i in range(self.workers):
+                threading.Thread(target=self._run, name=f"thumbs-{i}", daemon=True).start()
+
+    def _run(self):
+        while True:
+            sha256, blob_name = self.queue.get()
+            try:
+                self.process(sha256, blob_name)
+            except Exception:
+                log.exception("Miniatura de %s falló", blob_name)
+            finally:
+                self.queue.task_done()
+
+    def process(self, sha256, blob_name):
+        names = thumbnail_names(sha256, self.width)
+
+        # La imagen pudo borrarse mientras el trabajo esperaba en la cola
+        if not self.storage.exists(blob_name):
+            log.info("Miniatura de %s omitida: el blob ya no existe", blob_name)
+            return
+
+        # Contenido deduplicado: si los derivados ya existen sólo se registran
+        if not all(self.storage.exists(name) for name in names.values()):
+            try:
+                with self.storage.get(blob_name) as src:
+                    rendered = render_thumbnails(src, self.width)
+            except ObjectNotFound:
+                log.info("Miniatura de %s omitida: el blob ya no existe", blob_name)
+                return
+            # Se vuelve a mirar tras renderizar, que es lo que más tarda
+            if not self.storage.exists(blob_name):
+                log.info("Miniatura de %s omitida: el blob ya no existe", blob_name)
+                return
+            for fmt, name in names.items():
+                self.storage.put(name, io.BytesIO(rendered[fmt]), content_type=f"image/{fmt}")
+
+        self.on_done(sha256, {fmt: self.storage.url(name) for fmt, name in names.items()})
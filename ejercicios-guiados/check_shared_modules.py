@@ -0,0 +1,57 @@
+# ------------------------------------------
+# Verificación de módulos compartidos entre ejercicios
+# Descripción: cada ejercicio se despliega como carpeta independiente, así
+#              que algunos módulos viven copiados en varias carpetas. Este
+#              script comprueba que todas las copias sean idénticas a la
+#              canónica (la primera de cada grupo) y con --sync las iguala.
+# Autor: Pablo Celedón Cabriales
+#
+# Uso (desde ejercicios-guiados/):
+#   python3 check_shared_modules.py          # código de salida 1 si difieren
+#   python3 check_shared_modules.py --sync   # copia la canónica sobre las demás
+# ------------------------------------------
+
+import argparse
+import filecmp
+import os
+import shutil
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# módulo -> carpetas que lo contienen (la primera es la canónica)
+SHARED = {
+    "storage_backend.py": ["EjercicioGuiado17", "EjercicioGuiado18"],
+    "libros_client.py": ["EjercicioGuiado18", "EjercicioGuiado04", "EjercicioGuiado06",
+                         "EjercicioGuiado07"],
+    "books_cache.py": ["EjercicioGuiado18", "EjercicioGuiado07"],
+    "token_cache.py": ["EjercicioGuiado18", "EjercicioGuiado07"],
+}
+
+
+def check(sync=False):
+    stale = []
+    for module, folders in SHARED.items():
+        canonical = os.path.join(HERE, folders[0], module)
+        for folder in folders[1:]:
+            copy = os.path.join(HERE, folder, module)
+            if os.path.exists(copy) and filecmp.cmp(canonical, copy, shallow=False):
+                continue
+            if sync:
+                shutil.copyfile(canonical, copy)
+                print(f"🔄 {folder}/{module} ← {folders[0]}/{module}")
+            else:
+                stale.append(f"{folder}/{module}")
+    return stale
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sync", action="store_true", help="igualar las copias a la canónica")
+    args = parser.parse_args()
+
+    stale = check(args.sync)
+    if stale:
+        print("❌ Copias distintas de la canónica:", ", ".join(stale))
+        sys.exit(1)
+    print("✅ Módulos compartidos idénticos")
@@ -0,0 +1,65 @@
+# ------------------------------------------
+# Lanzador de producción para los microservicios Flask
+# Descripción: gunicorn pre-fork (workers × hilos) con la app precargada en
+#              el proceso maestro y pools de BD/Redis creados en cada worker
+# Autor: Pablo Celedón Cabriales
+#
+# Uso (desde la carpeta del servicio):
+#   pip install gunicorn
+#   gunicorn -c ../gunicorn.conf.py main:app             # Libros (18)
+#   BIND=0.0.0.0:5000 gunicorn -c ../gunicorn.conf.py app:app
+#
+# Variables de entorno:
+#   BIND             dirección (por defecto 0.0.0.0:5001)
+#   WEB_CONCURRENCY  número de workers (por defecto 2 × CPUs + 1)
+#   THREADS          hilos por worker (por defecto 4); también tamaño de pool
+#   PRELOAD          1 = importar la app una sola vez en el maestro
+#   TIMEOUT          segundos antes de reiniciar un worker bloqueado
+#
+# Recarga sin cortar conexiones:
+#   kill -HUP <pid maestro>      reinicia los workers de forma ordenada
+#                                (con PRELOAD=1 no relee el código)
+#   kill -USR2 <pid maestro>     arranca un maestro nuevo con el código nuevo;
+#   kill -WINCH <pid viejo>      luego se drenan los workers del anterior
+#   kill -TERM <pid viejo>
+# ------------------------------------------
+import multiprocessing
+import os
+import sys
+
+bind = os.getenv("BIND", "0.0.0.0:5001")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("THREADS", 4))
+worker_class = "gthread"
+preload_app = os.getenv("PRELOAD", "1") == "1"
+
+timeout = int(os.getenv("TIMEOUT", 30))
+graceful_timeout = 30
+keepalive = 5
+backlog = 2048
+
+# Reciclar workers de vez en cuando limita fugas de memoria
+max_requests = 2000
+max_requests_jitter = 200
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+# El tamaño de los pools por worker sigue al número de hilos
+os.environ.setdefault("DB_POOL_SIZE", str(threads))
+
+
+def post_fork(server, worker):
+    """Inicializa los recursos propios del worker después del fork.
+
+    Las conexiones (sockets) abiertas en el maestro no deben compartirse
+    entre procesos; cada módulo de servicio puede definir `init_worker()`
+    para crear ahí sus pools.
+    """
+    wsgi = server.app.wsgi()
+    module = sys.modules.get(getattr(wsgi, "import_name", ""))
+    init_worker = getattr(module, "init_worker", None)
+    if init_worker:
+        init_worker()
+        server.log.info(f"Worker {worker.pid}: pools inicializados ({module.__name__})")